@@ -1,9 +1,12 @@
 from django.contrib import admin
 from django.utils.html import format_html
 from django.utils import timezone
+from django.db import transaction
 from django.db.models import Q
 from django.core.exceptions import ValidationError
-from .models import Visitor, VisitRequest, VisitLog
+from .models import Visitor, VisitRequest, VisitLog, VisitEvent, JobWatermark, OutboundEmail
+from .transitions import bulk_status_change
+from .search import search_visits
 
 
 @admin.register(Visitor)
@@ -60,6 +63,12 @@ class VisitRequestAdmin(admin.ModelAdmin):
     ordering = ('-created_at',)
     # Temporarily disable date_hierarchy to avoid timezone issues
     # date_hierarchy = 'scheduled_time'
+
+    def get_search_results(self, request, queryset, search_term):
+        # Full-text indexes instead of one leading-wildcard LIKE per search field
+        if not search_term.strip():
+            return queryset, False
+        return search_visits(queryset, search_term), False
     
     fieldsets = (
         ('Visit Information', {
@@ -117,27 +126,43 @@ class VisitRequestAdmin(admin.ModelAdmin):
         return format_html('<span style="color: gray;">Not Checked In</span>')
     is_checked_out_display.short_description = 'Check-out Status'
     
+    def apply_status(self, request, queryset, from_status, to_status):
+        """Move the selected visits in from_status to to_status and log each change"""
+        ids = list(queryset.values_list('id', flat=True))
+        return len(bulk_status_change(ids, from_status, to_status, request.user, scope=queryset).moved)
+
+    def delete_model(self, request, obj):
+        with transaction.atomic():
+            # Tombstone for delta-sync clients; the event outlives the visit
+            VisitEvent.record(obj, 'deleted', actor=request.user)
+            super().delete_model(request, obj)
+
+    def delete_queryset(self, request, queryset):
+        with transaction.atomic():
+            VisitEvent.record_many(queryset.values_list('id', 'employee_id'), 'deleted', actor=request.user)
+            super().delete_queryset(request, queryset)
+
     def approve_visits(self, request, queryset):
         """Approve selected visit requests"""
-        updated = queryset.filter(status='pending').update(status='approved')
+        updated = self.apply_status(request, queryset, 'pending', 'approved')
         self.message_user(request, f'{updated} visit requests have been approved.')
     approve_visits.short_description = 'Approve selected visit requests'
     
     def reject_visits(self, request, queryset):
         """Reject selected visit requests"""
-        updated = queryset.filter(status='pending').update(status='rejected')
+        updated = self.apply_status(request, queryset, 'pending', 'rejected')
         self.message_user(request, f'{updated} visit requests have been rejected.')
     reject_visits.short_description = 'Reject selected visit requests'
     
     def expire_visits(self, request, queryset):
         """Expire selected visit requests"""
-        updated = queryset.filter(status='pending').update(status='expired')
+        updated = self.apply_status(request, queryset, 'pending', 'expired')
         self.message_user(request, f'{updated} visit requests have been expired.')
     expire_visits.short_description = 'Expire selected visit requests'
     
     def mark_no_show(self, request, queryset):
         """Mark selected visit requests as no show"""
-        updated = queryset.filter(status='approved').update(status='no_show')
+        updated = self.apply_status(request, queryset, 'approved', 'no_show')
         self.message_user(request, f'{updated} visit requests have been marked as no show.')
     mark_no_show.short_description = 'Mark selected visit requests as no show'
     
@@ -164,6 +189,12 @@ class VisitLogAdmin(admin.ModelAdmin):
     ordering = ('-created_at',)
     # Temporarily disable date_hierarchy to avoid timezone issues
     # date_hierarchy = 'check_in_time'
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term.strip():
+            return queryset, False
+        visits = search_visits(VisitRequest.objects.all(), search_term)
+        return queryset.filter(visit_request__in=visits.values('id')), False
     
     fieldsets = (
         ('Visit Information', {
@@ -224,6 +255,51 @@ class VisitLogAdmin(admin.ModelAdmin):
             raise e
 
 
+@admin.register(VisitEvent)
+class VisitEventAdmin(admin.ModelAdmin):
+    list_display = ('visit_id', 'event_type', 'actor', 'host', 'created_at')
+    list_filter = ('event_type', 'created_at')
+    search_fields = ('actor__username', 'host__username')
+    readonly_fields = ('visit', 'event_type', 'actor', 'host', 'created_at')
+    raw_id_fields = ('visit', 'actor', 'host')
+    ordering = ('-created_at',)
+
+    def has_add_permission(self, request):
+        # The event log is append-only and written by the application
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(JobWatermark)
+class JobWatermarkAdmin(admin.ModelAdmin):
+    list_display = ('name', 'last_run_at', 'last_processed', 'updated_at')
+    readonly_fields = ('name', 'last_run_at', 'last_processed', 'updated_at')
+    ordering = ('name',)
+
+
+@admin.register(OutboundEmail)
+class OutboundEmailAdmin(admin.ModelAdmin):
+    list_display = ('subject', 'status', 'attempts', 'next_attempt_at', 'created_at', 'sent_at')
+    list_filter = ('status', 'created_at')
+    search_fields = ('subject',)
+    readonly_fields = ('created_at', 'sent_at', 'last_error')
+    ordering = ('-created_at',)
+
+    actions = ['requeue_emails']
+
+    def requeue_emails(self, request, queryset):
+        """Send dead-lettered emails again on the next dispatcher run"""
+        updated = queryset.filter(status='dead').update(
+            status='pending',
+            attempts=0,
+            next_attempt_at=timezone.now()
+        )
+        self.message_user(request, f'{updated} emails have been requeued.')
+    requeue_emails.short_description = 'Requeue selected dead-letter emails'
+
+
 # Customize admin site
 admin.site.site_header = "GatePassPro Administration"
 admin.site.site_title = "GatePassPro Admin"
@@ -0,0 +1,64 @@
+from django.contrib.auth.models import User
+from django.utils.functional import cached_property
+from rest_framework.authentication import SessionAuthentication
+from rest_framework.exceptions import PermissionDenied
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.settings import api_settings
+from .tokens import PROFILE_CLAIMS
+
+
+class ClaimsUser(TokenUser):
+    """
+    Request user built from the access token claims, without a database hit.
+
+    Exposes id, username, names and (through the roles claim) roles. Filter
+    querysets by `user.id`, not the object itself; views that need the model
+    instance use `user.user`, which loads it on first access.
+    """
+
+    @cached_property
+    def first_name(self):
+        return self.token.get('first_name', '')
+
+    @cached_property
+    def last_name(self):
+        return self.token.get('last_name', '')
+
+    def get_full_name(self):
+        return f"{self.first_name} {self.last_name}".strip()
+
+    @cached_property
+    def user(self):
+        return User.objects.get(pk=self.id)
+
+
+class StatelessJWTAuthentication(JWTAuthentication):
+    """
+    Opt-in JWT authentication that trusts the token instead of loading the
+    user row on every request.
+
+    A user deactivated or renamed after login keeps the token's view of
+    themselves until the access token expires, so it refuses any unsafe
+    method. Tokens issued before the profile claims existed fall back to
+    the regular database lookup.
+    """
+
+    def authenticate(self, request):
+        # A token-only user may be stale or deactivated: never let it write
+        if request.method not in SAFE_METHODS:
+            raise PermissionDenied('Stateless authentication only allows read-only requests.')
+        return super().authenticate(request)
+
+    def get_user(self, validated_token):
+        if api_settings.USER_ID_CLAIM not in validated_token:
+            raise InvalidToken('Token contained no recognizable user identification')
+        if any(claim not in validated_token for claim in PROFILE_CLAIMS):
+            return super().get_user(validated_token)
+        return ClaimsUser(validated_token)
+
+
+# Authentication classes of read-only endpoints that never need the user row
+STATELESS_AUTHENTICATION = [StatelessJWTAuthentication, SessionAuthentication]
@@ -0,0 +1,179 @@
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+import asyncio
+import itertools
+import json
+import logging
+import threading
+
+
+logger = logging.getLogger(__name__)
+
+# Visit event types pushed to lobby clients ('created' only for walk-ins)
+LOBBY_EVENT_TYPES = {'approved', 'checked_in', 'checked_out', 'no_show', 'canceled', 'converted', 'walkin', 'deleted'}
+
+# Events a slow client may fall behind by before it is told to resync
+SUBSCRIBER_QUEUE_SIZE = 100
+
+
+class Subscription:
+    """One connected client: an asyncio queue bound to the loop serving it"""
+
+    def __init__(self, loop):
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self.overflowed = False
+
+    def offer(self, message):
+        # Runs on the subscriber's loop via call_soon_threadsafe
+        if self.overflowed:
+            return
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            # Drop the backlog and ask the client to refetch its board
+            self.overflowed = True
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait({'type': 'resync'})
+
+    async def get(self):
+        message = await self.queue.get()
+        if message.get('type') == 'resync':
+            self.overflowed = False
+        return message
+
+
+class BroadcastHub:
+    """
+    In-process fan-out of lobby events to connected SSE clients.
+
+    Publishing is thread-safe: sync views publish from worker threads and each
+    message is handed to the subscriber's own event loop. With no subscribers
+    a publish is a no-op.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscriptions = set()
+        self._sequence = itertools.count(1)
+
+    def subscribe(self):
+        subscription = Subscription(asyncio.get_running_loop())
+        with self._lock:
+            self._subscriptions.add(subscription)
+        get_fanout().start(self)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscriptions.discard(subscription)
+
+    @property
+    def subscriber_count(self):
+        return len(self._subscriptions)
+
+    def deliver(self, message):
+        """Hand a message to every local subscriber"""
+        with self._lock:
+            subscriptions = list(self._subscriptions)
+        if not subscriptions:
+            return
+        message = dict(message, id=next(self._sequence))
+        for subscription in subscriptions:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.offer, message)
+            except RuntimeError:
+                # The client's loop is closed; it will unsubscribe on its own
+                pass
+
+
+hub = BroadcastHub()
+
+
+class LocalFanout:
+    """Deliver events to the subscribers of this process only (single worker)"""
+
+    def start(self, hub):
+        pass
+
+    def publish(self, message):
+        hub.deliver(message)
+
+
+class RedisFanout:
+    """
+    Relay events between workers over a Redis pub/sub channel.
+
+    Every worker publishes to the channel and a listener thread, started with
+    the first local subscriber, delivers what it receives to the local hub.
+    Requires the optional `redis` package and LOBBY_BROADCAST_REDIS_URL.
+    """
+    channel = 'gpp.lobby-events'
+
+    def __init__(self):
+        try:
+            import redis
+        except ImportError:
+            raise ImproperlyConfigured('RedisFanout requires the "redis" package')
+        url = getattr(settings, 'LOBBY_BROADCAST_REDIS_URL', None)
+        if not url:
+            raise ImproperlyConfigured('RedisFanout requires LOBBY_BROADCAST_REDIS_URL')
+        self.client = redis.Redis.from_url(url)
+        self._listener = None
+        self._lock = threading.Lock()
+
+    def start(self, hub):
+        with self._lock:
+            if self._listener is None or not self._listener.is_alive():
+                self._listener = threading.Thread(target=self.listen, args=(hub,), daemon=True)
+                self._listener.start()
+
+    def listen(self, hub):
+        pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(self.channel)
+        for item in pubsub.listen():
+            try:
+                hub.deliver(json.loads(item['data']))
+            except (TypeError, ValueError):
+                logger.warning('Ignoring malformed lobby event from Redis')
+
+    def publish(self, message):
+        try:
+            self.client.publish(self.channel, json.dumps(message))
+        except Exception as e:
+            # Push is best effort; clients still converge on their next fetch
+            logger.error(f"Failed to publish lobby event: {str(e)}")
+
+
+_fanout = None
+_fanout_lock = threading.Lock()
+
+
+def get_fanout():
+    global _fanout
+    with _fanout_lock:
+        if _fanout is None:
+            backend = getattr(settings, 'LOBBY_BROADCAST_BACKEND', 'core.broadcast.LocalFanout')
+            _fanout = import_string(backend)()
+        return _fanout
+
+
+def publish_visit_events(event_type, visit_ids, at=None):
+    """
+    Push a compact lobby event once the current transaction commits.
+
+    Clients receive {"type", "visit_ids", "at"} and patch or refetch only the
+    affected rows.
+    """
+    if event_type not in LOBBY_EVENT_TYPES or not visit_ids:
+        return
+    message = {
+        'type': event_type,
+        'visit_ids': list(visit_ids),
+        'at': (at or timezone.now()).isoformat(),
+    }
+    transaction.on_commit(lambda: get_fanout().publish(message))
@@ -0,0 +1,82 @@
+from datetime import datetime
+from functools import wraps
+from django.db.models import Count, Max
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, parse_etags
+from rest_framework import status
+from rest_framework.response import Response
+import hashlib
+import json
+
+
+def visit_state(queryset):
+    """
+    Validator state of a visit list: row count plus the latest visit and
+    visit log update, read in one aggregate query.
+    """
+    return queryset.aggregate(
+        rows=Count('id'),
+        visit_updated=Max('updated_at'),
+        log_updated=Max('visitlog__updated_at'),
+    )
+
+
+def make_etag(request, state):
+    """Weak ETag over the validator state, the user and the full request path"""
+    payload = json.dumps([request.user.id, request.get_full_path(), state], sort_keys=True, default=str)
+    return f'W/"{hashlib.sha1(payload.encode("utf-8")).hexdigest()}"'
+
+
+def etag_matches(request, etag):
+    header = request.META.get('HTTP_IF_NONE_MATCH')
+    if not header:
+        return False
+    # If-None-Match uses the weak comparison function
+    opaque = etag.removeprefix('W/')
+    return any(tag == '*' or tag.removeprefix('W/') == opaque for tag in parse_etags(header))
+
+
+def last_modified(state):
+    timestamps = [value for value in state.values() if isinstance(value, datetime)]
+    return max(timestamps) if timestamps else None
+
+
+def apply_validators(response, etag, modified):
+    response['ETag'] = etag
+    if modified is not None:
+        response['Last-Modified'] = http_date(modified.timestamp())
+    # Per-user payloads: let the browser store them, but always revalidate
+    patch_cache_control(response, private=True, no_cache=True)
+    patch_vary_headers(response, ('Authorization',))
+
+
+def conditional_get(validator):
+    """
+    Decorate an APIView.get so unchanged payloads are answered with 304.
+
+    `validator(view, request)` returns a small dict describing the data behind
+    the response (e.g. visit_state() of the filtered queryset). It is hashed
+    into an ETag before the payload is built, and when the client's
+    If-None-Match still matches, nothing is queried or serialized further.
+
+    Last-Modified is sent for information only: deletions do not move it, so
+    revalidation always goes through the ETag.
+    """
+    def decorator(method):
+        @wraps(method)
+        def wrapper(self, request, *args, **kwargs):
+            state = validator(self, request)
+            etag = make_etag(request, state)
+            modified = last_modified(state)
+
+            if etag_matches(request, etag):
+                response = Response(status=status.HTTP_304_NOT_MODIFIED)
+                apply_validators(response, etag, modified)
+                return response
+
+            response = method(self, request, *args, **kwargs)
+            if response.status_code == status.HTTP_200_OK:
+                apply_validators(response, etag, modified)
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,74 @@
+from datetime import timedelta, timezone as dt_timezone
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from .models import VisitLog, VisitEvent
+
+
+# Rows are re-sent if they changed this long before the client's watermark.
+# A transaction that stamps updated_at just before another request reads the
+# clock may commit just after it; the overlap makes sure it is not missed.
+WATERMARK_OVERLAP = timedelta(seconds=5)
+
+WATERMARK_HEADER = 'X-Watermark'
+
+
+def new_watermark():
+    """Watermark for the response being built; read it before querying"""
+    return timezone.now()
+
+
+def format_watermark(value):
+    return value.astimezone(dt_timezone.utc).isoformat()
+
+
+def parse_watermark(value):
+    """
+    Parse a watermark from a query string; raises ValueError when invalid.
+
+    An unencoded '+' in the UTC offset arrives as a space, so it is restored.
+    """
+    parsed = parse_datetime(value.strip().replace(' ', '+'))
+    if parsed is None or timezone.is_naive(parsed):
+        raise ValueError(f"'{value}' is not a timezone-aware ISO 8601 timestamp")
+    return parsed
+
+
+def changed_since(queryset, since):
+    """
+    Restrict a visit queryset to rows whose request or visit log changed after
+    `since`. Each side is answered from its updated_at index.
+    """
+    since = since - WATERMARK_OVERLAP
+    return queryset.filter(
+        Q(updated_at__gt=since) |
+        Q(id__in=VisitLog.objects.filter(updated_at__gt=since).values('visit_request_id'))
+    )
+
+
+def visit_delta(scope, matching, since, render, key='visit_id', host=None):
+    """
+    Build a delta-sync payload for a list endpoint.
+
+    `scope` holds every visit the client may see and `matching` the subset the
+    list shows. Visits that changed since the watermark are returned rendered
+    in `changed` when they still match, and their ids in `removed` when they
+    no longer do (status moved on, rescheduled out of range) or were deleted.
+    `render` turns a visit queryset into the list's row dicts, each identified
+    by `key`; pass `host` to limit deletion tombstones to one host's visits.
+    """
+    changed_ids = set(changed_since(scope, since).values_list('id', flat=True))
+    changed = render(matching.filter(id__in=changed_ids)) if changed_ids else []
+
+    tombstones = VisitEvent.objects.filter(
+        event_type='deleted',
+        created_at__gt=since - WATERMARK_OVERLAP
+    )
+    if host is not None:
+        tombstones = tombstones.filter(host=host)
+    removed = (changed_ids - {row[key] for row in changed}) | set(tombstones.values_list('visit_id', flat=True))
+
+    return {
+        'changed': changed,
+        'removed': sorted(removed),
+    }
@@ -0,0 +1,63 @@
+def approval_email(visit_request):
+    subject = f"Visit Approved - {visit_request.visitor.full_name}"
+    message = f"""
+Dear {visit_request.visitor.full_name},
+
+Your visit request has been approved!
+
+Visit Details:
+- Host: {visit_request.employee.get_full_name() or visit_request.employee.username}
+- Purpose: {visit_request.purpose}
+- Scheduled Time: {visit_request.scheduled_time.strftime('%Y-%m-%d %H:%M')}
+- Status: Approved
+
+Please check in at the reception desk when you arrive. You will need to provide your name and the purpose of your visit.
+
+Your check-in code: {visit_request.token}
+
+Thank you for your cooperation.
+
+Best regards,
+{visit_request.employee.get_full_name() or visit_request.employee.username}
+        """
+    return subject, message, [visit_request.visitor.email]
+
+
+def rejection_email(visit_request):
+    subject = f"Visit Request Update - {visit_request.visitor.full_name}"
+    message = f"""
+Dear {visit_request.visitor.full_name},
+
+We regret to inform you that your visit request has been declined.
+
+Visit Details:
+- Host: {visit_request.employee.get_full_name() or visit_request.employee.username}
+- Purpose: {visit_request.purpose}
+- Scheduled Time: {visit_request.scheduled_time.strftime('%Y-%m-%d %H:%M')}
+- Status: Rejected
+
+Please contact {visit_request.employee.get_full_name() or visit_request.employee.username} for more information.
+
+Thank you for your understanding.
+
+Best regards,
+{visit_request.employee.get_full_name() or visit_request.employee.username}
+        """
+    return subject, message, [visit_request.visitor.email]
+
+
+def no_show_email(visit, marked_by='the lobby attendant'):
+    subject = f"Visit Marked as No Show - {visit.purpose}"
+    message = f"""
+Dear {visit.employee.get_full_name() or visit.employee.username},
+
+The visit scheduled for {visit.scheduled_time.strftime('%Y-%m-%d %H:%M')} with visitor {visit.visitor.full_name if visit.visitor else 'Unknown'} was marked as 'No Show' by {marked_by}.
+
+If this is a mistake, please contact the lobby desk.
+
+Thank you.
+        """
+    recipients = [visit.employee.email]
+    if visit.visitor:
+        recipients.append(visit.visitor.email)
+    return subject, message, recipients
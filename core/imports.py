@@ -0,0 +1,224 @@
+from collections import defaultdict, deque
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+from rest_framework import serializers
+from .emails import approval_email
+from .locks import advisory_lock
+from .models import Visitor, VisitRequest, VisitEvent
+from .outbox import enqueue_emails
+from .rollups import mark_visits_dirty
+from .serializers import VisitorSerializer
+import csv
+import email_validator
+import io
+import logging
+
+
+logger = logging.getLogger(__name__)
+
+# Largest number of visitors accepted in one import
+IMPORT_MAX_ROWS = 10000
+
+# Rows per INSERT statement
+IMPORT_CHUNK_SIZE = 500
+
+IMPORT_COLUMNS = ['full_name', 'email', 'contact', 'address', 'scheduled_time', 'purpose']
+
+# Seconds to wait for another import by the same host to finish
+IMPORT_LOCK_TIMEOUT = 30
+
+CHECKIN_HEADER = ['Row', 'Visit ID', 'Visitor Name', 'Email', 'Scheduled Time', 'Check-in Token']
+
+
+class ImportInProgress(Exception):
+    """Another import for the same host holds the import lock"""
+
+
+class ImportRowSerializer(VisitorSerializer):
+    """One import row: the visitor fields plus the visit's time and purpose"""
+    scheduled_time = serializers.DateTimeField()
+    purpose = serializers.CharField()
+
+    class Meta(VisitorSerializer.Meta):
+        fields = VisitorSerializer.Meta.fields + ['scheduled_time', 'purpose']
+
+    def validate_scheduled_time(self, value):
+        if value < timezone.now():
+            raise serializers.ValidationError('Cannot pre-register a visit for a time that has already passed.')
+        return value
+
+
+def read_csv_rows(uploaded_file):
+    """Read import rows from an uploaded CSV file with a header line"""
+    text = io.TextIOWrapper(uploaded_file, encoding='utf-8-sig', newline='')
+    reader = csv.DictReader(text)
+    if not reader.fieldnames or not {'full_name', 'email'} <= {name.strip().lower() for name in reader.fieldnames}:
+        raise ValueError('The CSV header must contain at least full_name and email columns.')
+    return [
+        {key.strip().lower(): (value or '').strip() for key, value in row.items() if key}
+        for row in reader
+    ]
+
+
+def undeliverable_domains(emails):
+    """
+    Check mail deliverability once per distinct domain instead of once per
+    row. Returns {domain: reason} for the domains that failed.
+    """
+    failed = {}
+    for domain in {email.rsplit('@', 1)[-1] for email in emails}:
+        try:
+            email_validator.validate_email(f'postmaster@{domain}')
+        except email_validator.EmailNotValidError as e:
+            failed[domain] = str(e)
+    return failed
+
+
+def validate_import(rows, defaults=None):
+    """
+    Validate import rows with the visitor form rules.
+
+    `defaults` fills in columns missing from a row (typically the event's
+    scheduled_time and purpose). Returns (validated rows, errors), where each
+    error is {"row": 1-based row number, "errors": {field: [messages]}}.
+    """
+    defaults = {key: value for key, value in (defaults or {}).items() if value not in (None, '')}
+    data = [
+        {**defaults, **{key: value for key, value in row.items() if key in IMPORT_COLUMNS and value not in (None, '')}}
+        for row in rows
+    ]
+    serializer = ImportRowSerializer(data=data, many=True, context={'check_deliverability': False})
+    serializer.is_valid()
+
+    errors = [
+        {'row': number, 'errors': row_errors}
+        for number, row_errors in enumerate(serializer.errors or [{}] * len(data), start=1)
+        if row_errors
+    ]
+    if errors:
+        return [], errors
+
+    validated = serializer.validated_data
+    failed = undeliverable_domains(row['email'] for row in validated)
+    for number, row in enumerate(validated, start=1):
+        reason = failed.get(row['email'].rsplit('@', 1)[-1])
+        if reason:
+            errors.append({'row': number, 'errors': {'email': [f'Please provide a valid email address: {reason}']}})
+    return (validated if not errors else []), errors
+
+
+def insert_visitors(visitors, host):
+    """
+    INSERT visitors in chunks and make sure every instance has its id.
+
+    MySQL does not report the ids of a multi-row INSERT, so there they are read
+    back from the rows this host just created, paired in insertion order. The
+    caller holds the host's import lock, so no other import adds rows between
+    the INSERT and the read-back.
+    """
+    returns_ids = connection.features.can_return_rows_from_bulk_insert
+    for start in range(0, len(visitors), IMPORT_CHUNK_SIZE):
+        chunk = visitors[start:start + IMPORT_CHUNK_SIZE]
+        last_id = Visitor.objects.aggregate(last_id=Max('id'))['last_id'] or 0
+        Visitor.objects.bulk_create(chunk)
+        if returns_ids:
+            continue
+        created = defaultdict(deque)
+        for visitor_id, email, full_name in (
+            Visitor.objects.filter(created_by=host, id__gt=last_id)
+            .order_by('id')
+            .values_list('id', 'email', 'full_name')
+        ):
+            created[(email, full_name)].append(visitor_id)
+        for visitor in chunk:
+            visitor.id = created[(visitor.email, visitor.full_name)].popleft()
+
+
+def import_visitors(rows, host, send_invitations=False):
+    """
+    Pre-register validated rows as approved visits hosted by `host`.
+
+    Visitors and visits are inserted with bulk_create in chunks inside one
+    transaction, with their events appended the same way. Returns one dict per
+    row with the visit id and its check-in token.
+
+    The visits are created with their visitor, so they skip the visitor form;
+    the token is what the guest presents at the lobby. Raises ImportInProgress
+    when another import for the host does not finish in time.
+    """
+    visitors = [
+        Visitor(
+            full_name=row['full_name'],
+            email=row['email'],
+            contact=row.get('contact') or '',
+            address=row.get('address') or '',
+            created_by=host
+        )
+        for row in rows
+    ]
+    with advisory_lock(f'gpp.import_visitors.{host.id}', timeout=IMPORT_LOCK_TIMEOUT) as acquired:
+        if not acquired:
+            raise ImportInProgress(f'Another import for {host.username} is still running.')
+        with transaction.atomic():
+            insert_visitors(visitors, host)
+            visits = [
+                VisitRequest(
+                    visitor_id=visitor.id,
+                    employee=host,
+                    purpose=row['purpose'],
+                    scheduled_time=row['scheduled_time'],
+                    status='approved',
+                    visit_type='scheduled'
+                )
+                for row, visitor in zip(rows, visitors)
+            ]
+            VisitRequest.objects.bulk_create(visits, batch_size=IMPORT_CHUNK_SIZE)
+            if not connection.features.can_return_rows_from_bulk_insert:
+                # Tokens are generated in Python, so they identify the new rows
+                ids = {}
+                tokens = [visit.token for visit in visits]
+                for start in range(0, len(tokens), IMPORT_CHUNK_SIZE):
+                    ids.update(VisitRequest.objects.filter(token__in=tokens[start:start + IMPORT_CHUNK_SIZE]).values_list('token', 'id'))
+                for visit in visits:
+                    visit.id = ids[visit.token]
+
+            now = timezone.now()
+            for event_type in ('created', 'approved'):
+                VisitEvent.record_many(((visit.id, host.id) for visit in visits), event_type, actor=host, at=now)
+            # bulk_create bypasses post_save, so refresh the rollup explicitly
+            mark_visits_dirty((visit.scheduled_time, host.id) for visit in visits)
+
+            if send_invitations:
+                for visit, visitor in zip(visits, visitors):
+                    visit.visitor = visitor
+                for start in range(0, len(visits), IMPORT_CHUNK_SIZE):
+                    enqueue_emails([approval_email(visit) for visit in visits[start:start + IMPORT_CHUNK_SIZE]])
+
+    logger.info(f"Imported {len(visits)} pre-registered visitors for {host.username}")
+    return [
+        {
+            'row': number,
+            'visit_id': visit.id,
+            'visitor_name': visitor.full_name,
+            'email': visitor.email,
+            'scheduled_time': visit.scheduled_time,
+            'checkin_token': str(visit.token),
+        }
+        for number, (visit, visitor) in enumerate(zip(visits, visitors), start=1)
+    ]
+
+
+def write_checkin_csv(results, stream):
+    """Write the check-in tokens of an import as CSV"""
+    writer = csv.writer(stream)
+    writer.writerow(CHECKIN_HEADER)
+    for result in results:
+        writer.writerow([
+            result['row'],
+            result['visit_id'],
+            result['visitor_name'],
+            result['email'],
+            timezone.localtime(result['scheduled_time']).strftime('%Y-%m-%d %H:%M'),
+            result['checkin_token'],
+        ])
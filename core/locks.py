@@ -0,0 +1,37 @@
+from contextlib import contextmanager
+from django.db import connection
+import logging
+
+
+logger = logging.getLogger(__name__)
+
+
+@contextmanager
+def advisory_lock(name, timeout=0):
+    """
+    Hold a named, cluster-wide advisory lock for the duration of the block.
+
+    On MySQL this uses GET_LOCK/RELEASE_LOCK so only one node runs a given
+    background job at a time. Other backends have no equivalent, so the lock
+    is always granted there (single-node development setups).
+
+    Yields True when the lock was acquired and False otherwise.
+    """
+    if connection.vendor != 'mysql':
+        yield True
+        return
+
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT GET_LOCK(%s, %s)", [name, timeout])
+        acquired = cursor.fetchone()[0] == 1
+
+    if not acquired:
+        logger.info(f"Advisory lock '{name}' is held by another node")
+        yield False
+        return
+
+    try:
+        yield True
+    finally:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT RELEASE_LOCK(%s)", [name])
@@ -0,0 +1,62 @@
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from core.outbox import dispatch_outbox
+import time
+
+
+class Command(BaseCommand):
+    help = 'Deliver queued outbound emails with retry and dead-lettering'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Drain the currently due emails and exit',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=50,
+            help='Number of emails sent per mail connection',
+        )
+        parser.add_argument(
+            '--max-attempts',
+            type=int,
+            default=5,
+            help='Attempts before an email is moved to the dead-letter state',
+        )
+        parser.add_argument(
+            '--backoff',
+            type=int,
+            default=30,
+            help='Base retry delay in seconds, doubled after every failure',
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=2.0,
+            help='Seconds to sleep when the outbox is empty',
+        )
+
+    def handle(self, *args, **options):
+        if not options['once']:
+            self.stdout.write(self.style.SUCCESS('Outbox dispatcher started'))
+
+        try:
+            while True:
+                close_old_connections()
+                sent, failed = dispatch_outbox(
+                    batch_size=options['batch_size'],
+                    max_attempts=options['max_attempts'],
+                    backoff_seconds=options['backoff'],
+                )
+                if sent or failed:
+                    self.stdout.write(f'Sent {sent} emails, {failed} failed')
+
+                if sent + failed >= options['batch_size']:
+                    continue
+                if options['once']:
+                    break
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            self.stdout.write(self.style.WARNING('Outbox dispatcher stopped'))
@@ -1,6 +1,13 @@
 from django.core.management.base import BaseCommand
-from core.models import VisitRequest
+from django.db import close_old_connections
+from core.locks import advisory_lock
+from core.models import VisitRequest, JobWatermark
 from django.utils import timezone
+import time
+
+
+WATERMARK_NAME = 'expire_visit_requests'
+LOCK_NAME = 'gpp.expire_visit_requests'
 
 
 class Command(BaseCommand):
@@ -12,31 +19,102 @@ class Command(BaseCommand):
             action='store_true',
             help='Show what would be expired without actually expiring them',
         )
+        parser.add_argument(
+            '--daemon',
+            action='store_true',
+            help='Keep running and wake up on the next scheduled_time boundary',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Maximum number of rows expired per UPDATE statement',
+        )
+        parser.add_argument(
+            '--max-sleep',
+            type=int,
+            default=60,
+            help='Upper bound in seconds between sweeps in daemon mode',
+        )
+        parser.add_argument(
+            '--status',
+            action='store_true',
+            help='Print the last-run watermark and exit',
+        )
 
     def handle(self, *args, **options):
-        now = timezone.now()
-        expired_requests = VisitRequest.objects.filter(
-            status='pending',
-            scheduled_time__lt=now
-        )
+        if options['status']:
+            self.show_status()
+            return
 
         if options['dry_run']:
-            self.stdout.write(
-                self.style.WARNING(
-                    f'DRY RUN: Would expire {expired_requests.count()} visit requests'
-                )
-            )
-            for request in expired_requests:
+            self.dry_run()
+            return
+
+        if not options['daemon']:
+            self.sweep(options['batch_size'])
+            return
+
+        self.stdout.write(self.style.SUCCESS('Expiry sweeper started'))
+        try:
+            while True:
+                close_old_connections()
+                self.sweep(options['batch_size'])
+                time.sleep(self.seconds_until_next_sweep(options['max_sleep']))
+        except KeyboardInterrupt:
+            self.stdout.write(self.style.WARNING('Expiry sweeper stopped'))
+
+    def sweep(self, batch_size):
+        """Expire overdue requests once, guarded by the cluster-wide lock"""
+        with advisory_lock(LOCK_NAME) as acquired:
+            if not acquired:
                 self.stdout.write(
-                    f'  - {request.visitor.full_name if request.visitor else "Unknown"} '
-                    f'(scheduled: {request.scheduled_time}, employee: {request.employee.username})'
+                    self.style.WARNING('Another node is running the expiry sweeper, skipping')
                 )
-        else:
-            count = expired_requests.count()
-            expired_requests.update(status='expired')
-            
+                return 0
+
+            now = timezone.now()
+            count = VisitRequest.expire_pending_requests(batch_size=batch_size, now=now)
+            JobWatermark.record(WATERMARK_NAME, count, run_at=now)
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Successfully expired {count} visit requests'
+            )
+        )
+        return count
+
+    def seconds_until_next_sweep(self, max_sleep):
+        """Sleep until the next pending scheduled_time passes, capped by max_sleep"""
+        next_deadline = VisitRequest.next_pending_deadline()
+        if next_deadline is None:
+            return max_sleep
+        seconds = (next_deadline - timezone.now()).total_seconds() + 1
+        return max(1, min(max_sleep, seconds))
+
+    def show_status(self):
+        watermark = JobWatermark.objects.filter(name=WATERMARK_NAME).first()
+        if not watermark or not watermark.last_run_at:
+            self.stdout.write(self.style.WARNING('Expiry sweeper has never run'))
+            return
+        self.stdout.write(
+            f'Last run: {watermark.last_run_at} '
+            f'(expired {watermark.last_processed} visit requests)'
+        )
+
+    def dry_run(self):
+        expired_requests = VisitRequest.objects.filter(
+            status='pending',
+            scheduled_time__lt=timezone.now()
+        ).select_related('visitor', 'employee')
+
+        self.stdout.write(
+            self.style.WARNING(
+                f'DRY RUN: Would expire {expired_requests.count()} visit requests'
+            )
+        )
+        for request in expired_requests:
             self.stdout.write(
-                self.style.SUCCESS(
-                    f'Successfully expired {count} visit requests'
-                )
-            ) 
\ No newline at end of file
+                f'  - {request.visitor.full_name if request.visitor else "Unknown"} '
+                f'(scheduled: {request.scheduled_time}, employee: {request.employee.username})'
+            )
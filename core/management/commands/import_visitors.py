@@ -0,0 +1,63 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from core.imports import IMPORT_MAX_ROWS, ImportInProgress, read_csv_rows, validate_import, import_visitors, write_checkin_csv
+import time
+
+
+class Command(BaseCommand):
+    help = 'Pre-register visitors from a CSV file as approved visits of one host'
+
+    def add_arguments(self, parser):
+        parser.add_argument('file', help='CSV file with a full_name,email[,contact,address,scheduled_time,purpose] header')
+        parser.add_argument('--host', required=True, help='Username of the hosting employee')
+        parser.add_argument('--scheduled-time', help='ISO 8601 time for rows without a scheduled_time column')
+        parser.add_argument('--purpose', help='Purpose for rows without a purpose column')
+        parser.add_argument('--output', help='Write the check-in tokens CSV here (defaults to stdout)')
+        parser.add_argument(
+            '--send-invitations',
+            action='store_true',
+            help='Queue the approval email, with the check-in code, for every imported visitor',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            host = User.objects.get(username=options['host'])
+        except User.DoesNotExist:
+            raise CommandError(f"User '{options['host']}' does not exist")
+
+        try:
+            with open(options['file'], 'rb') as uploaded_file:
+                rows = read_csv_rows(uploaded_file)
+        except (OSError, ValueError, UnicodeDecodeError) as e:
+            raise CommandError(f'Could not read {options["file"]}: {e}')
+        if not rows:
+            raise CommandError('The file contains no rows')
+        if len(rows) > IMPORT_MAX_ROWS:
+            raise CommandError(f'At most {IMPORT_MAX_ROWS} visitors can be imported at once')
+
+        started = time.monotonic()
+        validated, errors = validate_import(rows, {
+            'scheduled_time': options['scheduled_time'],
+            'purpose': options['purpose'],
+        })
+        if errors:
+            for error in errors[:50]:
+                self.stderr.write(f"  row {error['row']}: {error['errors']}")
+            raise CommandError(f'{len(errors)} invalid rows, nothing imported')
+
+        try:
+            results = import_visitors(validated, host, send_invitations=options['send_invitations'])
+        except ImportInProgress as e:
+            raise CommandError(str(e))
+
+        if options['output']:
+            with open(options['output'], 'w', newline='', encoding='utf-8') as stream:
+                write_checkin_csv(results, stream)
+        else:
+            write_checkin_csv(results, self.stdout)
+
+        self.stderr.write(
+            self.style.SUCCESS(
+                f'Imported {len(results)} visitors for {host.username} in {time.monotonic() - started:.1f}s'
+            )
+        )
@@ -0,0 +1,159 @@
+from datetime import timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+from core.locks import advisory_lock
+from core.models import JobWatermark
+from core.transitions import no_show_grace, overdue_visits, mark_no_shows, next_no_show_deadline
+from django.utils import timezone
+import time
+
+
+WATERMARK_NAME = 'mark_no_shows'
+LOCK_NAME = 'gpp.mark_no_shows'
+
+# Each sweep re-checks visits that became overdue this long before the
+# previous run, which covers rows skipped while a check-in held their lock
+SWEEP_OVERLAP = timedelta(hours=1)
+
+
+class Command(BaseCommand):
+    help = 'Mark approved visits that were never checked in as no-shows once their grace period has passed'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Show what would be marked without actually marking it',
+        )
+        parser.add_argument(
+            '--daemon',
+            action='store_true',
+            help='Keep running and wake up when the next visit passes its grace period',
+        )
+        parser.add_argument(
+            '--grace-minutes',
+            type=int,
+            help='Minutes after the scheduled time before a visit is a no-show (default: NO_SHOW_GRACE_MINUTES)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Maximum number of rows marked per UPDATE statement',
+        )
+        parser.add_argument(
+            '--max-sleep',
+            type=int,
+            default=60,
+            help='Upper bound in seconds between sweeps in daemon mode',
+        )
+        parser.add_argument(
+            '--full',
+            action='store_true',
+            help='Scan all overdue visits instead of those since the last run',
+        )
+        parser.add_argument(
+            '--no-notify',
+            action='store_true',
+            help='Do not queue no-show emails to hosts and visitors',
+        )
+        parser.add_argument(
+            '--status',
+            action='store_true',
+            help='Print the last-run watermark and exit',
+        )
+
+    def handle(self, *args, **options):
+        if options['status']:
+            self.show_status()
+            return
+
+        if options['grace_minutes'] is not None and options['grace_minutes'] < 0:
+            raise CommandError('--grace-minutes must not be negative')
+        grace = timedelta(minutes=options['grace_minutes']) if options['grace_minutes'] is not None else no_show_grace()
+
+        if options['dry_run']:
+            self.dry_run(grace, options['full'])
+            return
+
+        if not options['daemon']:
+            self.sweep(grace, options)
+            return
+
+        self.stdout.write(self.style.SUCCESS('No-show sweeper started'))
+        try:
+            while True:
+                close_old_connections()
+                self.sweep(grace, options)
+                time.sleep(self.seconds_until_next_sweep(grace, options['max_sleep']))
+        except KeyboardInterrupt:
+            self.stdout.write(self.style.WARNING('No-show sweeper stopped'))
+
+    def since(self, grace, full):
+        """Oldest scheduled_time worth scanning: just before the previous run's cutoff"""
+        if full:
+            return None
+        watermark = JobWatermark.objects.filter(name=WATERMARK_NAME).first()
+        if not watermark or not watermark.last_run_at:
+            return None
+        return watermark.last_run_at - grace - SWEEP_OVERLAP
+
+    def sweep(self, grace, options):
+        """Mark overdue visits once, guarded by the cluster-wide lock"""
+        with advisory_lock(LOCK_NAME) as acquired:
+            if not acquired:
+                self.stdout.write(
+                    self.style.WARNING('Another node is running the no-show sweeper, skipping')
+                )
+                return 0
+
+            now = timezone.now()
+            count = mark_no_shows(
+                batch_size=options['batch_size'],
+                now=now,
+                grace=grace,
+                since=self.since(grace, options['full']),
+                notify=not options['no_notify']
+            )
+            JobWatermark.record(WATERMARK_NAME, count, run_at=now)
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Successfully marked {count} visits as no-shows'
+            )
+        )
+        return count
+
+    def seconds_until_next_sweep(self, grace, max_sleep):
+        """Sleep until the next approved visit becomes overdue, capped by max_sleep"""
+        next_deadline = next_no_show_deadline(grace=grace)
+        if next_deadline is None:
+            return max_sleep
+        seconds = (next_deadline - timezone.now()).total_seconds() + 1
+        return max(1, min(max_sleep, seconds))
+
+    def show_status(self):
+        watermark = JobWatermark.objects.filter(name=WATERMARK_NAME).first()
+        if not watermark or not watermark.last_run_at:
+            self.stdout.write(self.style.WARNING('No-show sweeper has never run'))
+            return
+        self.stdout.write(
+            f'Last run: {watermark.last_run_at} '
+            f'(marked {watermark.last_processed} visits as no-shows)'
+        )
+
+    def dry_run(self, grace, full):
+        overdue = overdue_visits(
+            timezone.now(), grace, self.since(grace, full)
+        ).select_related('visitor', 'employee').order_by('scheduled_time')
+
+        self.stdout.write(
+            self.style.WARNING(
+                f'DRY RUN: Would mark {overdue.count()} visits as no-shows'
+            )
+        )
+        for visit in overdue:
+            self.stdout.write(
+                f'  - {visit.visitor.full_name if visit.visitor else "Unknown"} '
+                f'(scheduled: {visit.scheduled_time}, employee: {visit.employee.username})'
+            )
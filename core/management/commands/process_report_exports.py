@@ -0,0 +1,117 @@
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+from core.models import ReportExport
+from core.reports import EXPORT_LEASE_TIMEOUT, generate_export, export_path, stale_export_cutoff
+import logging
+import os
+import time
+
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Generate queued report exports out of band'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Process the currently queued exports and exit',
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=2.0,
+            help='Seconds to sleep when no export is queued',
+        )
+        parser.add_argument(
+            '--retention-days',
+            type=int,
+            default=7,
+            help='Delete export files and jobs older than this many days',
+        )
+
+    def handle(self, *args, **options):
+        if not options['once']:
+            self.stdout.write(self.style.SUCCESS('Report export worker started'))
+
+        try:
+            while True:
+                close_old_connections()
+                job = self.claim_next_job()
+                if job is not None:
+                    self.run_job(job)
+                    continue
+
+                self.purge_expired(options['retention_days'])
+                if options['once']:
+                    break
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            self.stdout.write(self.style.WARNING('Report export worker stopped'))
+
+    def claim_next_job(self):
+        """Mark the oldest queued job as running and return it"""
+        self.fail_stale_jobs()
+        with transaction.atomic():
+            job = ReportExport.objects.select_for_update(skip_locked=True).filter(
+                status='queued'
+            ).order_by('created_at').first()
+            if job is None:
+                return None
+            job.status = 'running'
+            job.started_at = timezone.now()
+            job.save(update_fields=['status', 'started_at'])
+        return job
+
+    def fail_stale_jobs(self):
+        """Fail running jobs whose worker died before finishing them"""
+        now = timezone.now()
+        stale = ReportExport.objects.filter(status='running', started_at__lt=stale_export_cutoff(now)).update(
+            status='failed',
+            error=f'The export worker stopped before finishing within {EXPORT_LEASE_TIMEOUT.total_seconds() // 60:.0f} minutes.',
+            finished_at=now
+        )
+        if stale:
+            logger.warning(f"Failed {stale} report exports abandoned by their worker")
+        return stale
+
+    def run_job(self, job):
+        try:
+            job.row_count = generate_export(job)
+        except Exception as e:
+            logger.error(f"Report export {job.id} failed: {str(e)}", exc_info=True)
+            job.status = 'failed'
+            job.error = str(e)
+            job.finished_at = timezone.now()
+            job.save(update_fields=['status', 'error', 'finished_at'])
+            self.stdout.write(self.style.ERROR(f'Export {job.id} failed: {e}'))
+            return
+
+        job.status = 'done'
+        job.finished_at = timezone.now()
+        job.save(update_fields=['status', 'file_name', 'row_count', 'finished_at'])
+        self.stdout.write(
+            self.style.SUCCESS(f'Export {job.id} finished with {job.row_count} rows')
+        )
+
+    def purge_expired(self, retention_days):
+        """Remove old jobs and any artifact no longer referenced by a newer job"""
+        cutoff = timezone.now() - timedelta(days=retention_days)
+        expired = ReportExport.objects.filter(created_at__lt=cutoff)
+        file_names = set(expired.exclude(file_name=None).values_list('file_name', flat=True))
+        if not file_names and not expired.exists():
+            return
+
+        still_used = set(
+            ReportExport.objects.filter(created_at__gte=cutoff, file_name__in=file_names)
+            .values_list('file_name', flat=True)
+        )
+        for file_name in file_names - still_used:
+            path = export_path(file_name)
+            if os.path.exists(path):
+                os.remove(path)
+        expired.delete()
@@ -0,0 +1,74 @@
+from datetime import datetime, timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Max, Min
+from django.utils import timezone
+from core.models import VisitRequest
+from core.rollups import rebuild_daily_stats
+
+
+class Command(BaseCommand):
+    help = 'Backfill or reconcile the DailyVisitStats rollup from the raw visit tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--start',
+            help='First local date to rebuild (YYYY-MM-DD), defaults to the earliest visit',
+        )
+        parser.add_argument(
+            '--end',
+            help='Last local date to rebuild (YYYY-MM-DD), defaults to the latest visit',
+        )
+        parser.add_argument(
+            '--days',
+            type=int,
+            help='Only reconcile the last N days (ignores --start/--end)',
+        )
+        parser.add_argument(
+            '--chunk-days',
+            type=int,
+            default=31,
+            help='Number of days rebuilt per transaction',
+        )
+
+    def handle(self, *args, **options):
+        start_date, end_date = self.resolve_range(options)
+        if start_date is None:
+            self.stdout.write(self.style.WARNING('No visits found, nothing to rebuild'))
+            return
+
+        total_cells = 0
+        chunk_start = start_date
+        while chunk_start <= end_date:
+            chunk_end = min(end_date, chunk_start + timedelta(days=options['chunk_days'] - 1))
+            cells = rebuild_daily_stats(chunk_start, chunk_end)
+            total_cells += cells
+            self.stdout.write(f'  {chunk_start} to {chunk_end}: {cells} cells')
+            chunk_start = chunk_end + timedelta(days=1)
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Successfully rebuilt {total_cells} rollup cells from {start_date} to {end_date}'
+            )
+        )
+
+    def resolve_range(self, options):
+        today = timezone.localdate()
+        if options['days']:
+            return today - timedelta(days=options['days']), today
+
+        try:
+            start_date = datetime.strptime(options['start'], '%Y-%m-%d').date() if options['start'] else None
+            end_date = datetime.strptime(options['end'], '%Y-%m-%d').date() if options['end'] else None
+        except ValueError as e:
+            raise CommandError(f'Invalid date format: {e}')
+
+        if start_date is None or end_date is None:
+            bounds = VisitRequest.objects.aggregate(first=Min('scheduled_time'), last=Max('scheduled_time'))
+            if bounds['first'] is None:
+                return None, None
+            start_date = start_date or timezone.localdate(bounds['first'])
+            end_date = end_date or timezone.localdate(bounds['last'])
+
+        if end_date < start_date:
+            raise CommandError('--end must not be before --start')
+        return start_date, end_date
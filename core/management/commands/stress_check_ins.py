@@ -0,0 +1,204 @@
+from collections import Counter
+from datetime import timedelta
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection, transaction
+from django.db.models import Count
+from django.utils import timezone
+from core.imports import insert_visitors
+from core.models import Visitor, VisitRequest, VisitLog, VisitEvent
+from core.transitions import OK, TransitionRefused, check_in, check_out
+import queue
+import random
+import threading
+import time
+
+
+STRESS_USERNAME = 'stress_check_ins'
+
+# Tries of one call that hits a lock timeout, deadlock or (on SQLite, whose
+# deferred transactions cannot wait to upgrade to a write lock) "database is
+# locked" before it is counted as an error
+LOCK_RETRIES = 20
+
+ERROR = 'error'
+
+
+class Command(BaseCommand):
+    help = (
+        'Fire concurrent check-ins and check-outs at the configured database and '
+        'verify that each visit is checked in and out exactly once'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--visits', type=int, default=200, help='Number of test visits to create')
+        parser.add_argument(
+            '--attempts',
+            type=int,
+            default=3,
+            help='Concurrent check-in (and check-out) attempts per visit',
+        )
+        parser.add_argument('--workers', type=int, default=32, help='Number of concurrent threads')
+        parser.add_argument('--keep', action='store_true', help='Keep the test visits afterwards')
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Run even though DEBUG is off (writes test visits to that database)',
+        )
+
+    def handle(self, *args, **options):
+        if not settings.DEBUG and not options['force']:
+            raise CommandError('DEBUG is off; pass --force to write test visits to this database')
+        if options['visits'] < 1 or options['attempts'] < 1 or options['workers'] < 1:
+            raise CommandError('--visits, --attempts and --workers must be positive')
+
+        actor, _ = User.objects.get_or_create(username=STRESS_USERNAME)
+        visit_ids = self.create_visits(actor, options['visits'])
+        self.stdout.write(
+            f"Created {len(visit_ids)} visits; {options['attempts']} attempts each on {options['workers']} threads"
+        )
+
+        try:
+            checked_in = self.run_phase(
+                'check-in', lambda visit_id: check_in(actor, id=visit_id), visit_ids, options
+            )
+            checked_out = self.run_phase(
+                'check-out', lambda visit_id: check_out(visit_id, actor), visit_ids, options
+            )
+            failures = self.verify(visit_ids, checked_in, checked_out)
+        finally:
+            if not options['keep']:
+                self.delete_visits(visit_ids)
+
+        if failures:
+            for failure in failures[:50]:
+                self.stderr.write(f'  {failure}')
+            raise CommandError(f'{len(failures)} exactly-once violations')
+        self.stdout.write(self.style.SUCCESS('Every visit was checked in and out exactly once'))
+
+    def create_visits(self, actor, count):
+        scheduled_time = timezone.now() + timedelta(minutes=10)
+        visitors = [
+            Visitor(full_name=f'Stress Visitor {number}', email=f'stress{number}@example.com', created_by=actor)
+            for number in range(count)
+        ]
+        with transaction.atomic():
+            insert_visitors(visitors, actor)
+            visits = [
+                VisitRequest(
+                    visitor_id=visitor.id,
+                    employee=actor,
+                    purpose='Check-in stress test',
+                    scheduled_time=scheduled_time,
+                    status='approved',
+                    visit_type='scheduled'
+                )
+                for visitor in visitors
+            ]
+            VisitRequest.objects.bulk_create(visits)
+        return list(
+            VisitRequest.objects.filter(token__in=[visit.token for visit in visits]).values_list('id', flat=True)
+        )
+
+    def run_phase(self, name, operation, visit_ids, options):
+        """
+        Run `attempts` calls of `operation` per visit in shuffled order on
+        `workers` threads. Returns {visit_id: successful calls}.
+        """
+        jobs = queue.Queue()
+        attempts = [visit_id for visit_id in visit_ids for _ in range(options['attempts'])]
+        random.shuffle(attempts)
+        for visit_id in attempts:
+            jobs.put(visit_id)
+
+        lock = threading.Lock()
+        outcomes = Counter()
+        successes = Counter()
+
+        def worker():
+            try:
+                while True:
+                    try:
+                        visit_id = jobs.get_nowait()
+                    except queue.Empty:
+                        return
+                    result = self.attempt(operation, visit_id)
+                    with lock:
+                        outcomes[result] += 1
+                        if result == OK:
+                            successes[visit_id] += 1
+            finally:
+                # Each thread has its own connection
+                connection.close()
+
+        started = time.monotonic()
+        threads = [threading.Thread(target=worker) for _ in range(options['workers'])]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.monotonic() - started
+
+        summary = ', '.join(f'{result}: {count}' for result, count in outcomes.most_common())
+        self.stdout.write(
+            f'{name}: {len(attempts)} attempts in {elapsed:.2f}s '
+            f'({len(attempts) / elapsed:.0f}/s) - {summary}'
+        )
+        return successes
+
+    def attempt(self, operation, visit_id):
+        for retry in range(LOCK_RETRIES):
+            try:
+                operation(visit_id)
+                return OK
+            except TransitionRefused as e:
+                return str(e)
+            except OperationalError:
+                # Jittered exponential backoff so retries do not collide again
+                time.sleep(random.uniform(0, 0.005 * 2 ** min(retry, 6)))
+        return ERROR
+
+    def verify(self, visit_ids, checked_in, checked_out):
+        """Compare call outcomes with the stored logs and events"""
+        failures = []
+        logs = dict(
+            VisitLog.objects.filter(visit_request_id__in=visit_ids)
+            .values_list('visit_request_id')
+            .annotate(count=Count('id'))
+        )
+        events = Counter()
+        for visit_id, event_type, count in (
+            VisitEvent.objects.filter(visit_id__in=visit_ids, event_type__in=['checked_in', 'checked_out'])
+            .values_list('visit_id', 'event_type')
+            .annotate(count=Count('id'))
+        ):
+            events[visit_id, event_type] = count
+        stamped = set(
+            VisitLog.objects.filter(
+                visit_request_id__in=visit_ids,
+                check_in_time__isnull=False,
+                check_out_time__isnull=False
+            ).values_list('visit_request_id', flat=True)
+        )
+
+        for visit_id in visit_ids:
+            if checked_in[visit_id] != 1:
+                failures.append(f'visit {visit_id}: {checked_in[visit_id]} successful check-ins')
+            if checked_out[visit_id] != 1:
+                failures.append(f'visit {visit_id}: {checked_out[visit_id]} successful check-outs')
+            if logs.get(visit_id) != 1:
+                failures.append(f'visit {visit_id}: {logs.get(visit_id, 0)} visit logs')
+            if visit_id not in stamped:
+                failures.append(f'visit {visit_id}: log not stamped with both times')
+            for event_type in ('checked_in', 'checked_out'):
+                if events[visit_id, event_type] != 1:
+                    failures.append(f'visit {visit_id}: {events[visit_id, event_type]} {event_type} events')
+        return failures
+
+    def delete_visits(self, visit_ids):
+        with transaction.atomic():
+            visitor_ids = list(VisitRequest.objects.filter(id__in=visit_ids).values_list('visitor_id', flat=True))
+            VisitEvent.objects.filter(visit_id__in=visit_ids).delete()
+            VisitRequest.objects.filter(id__in=visit_ids).delete()
+            Visitor.objects.filter(id__in=visitor_ids).delete()
@@ -0,0 +1,80 @@
+# Generated by Django 5.2.3 on 2026-10-17 07:09
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, DurationField, ExpressionWrapper, F, Q, Sum
+from django.db.models.functions import TruncDate
+
+
+def backfill_daily_stats(apps, schema_editor):
+    """Build the cells for every existing visit, as rebuild_daily_stats does"""
+    VisitRequest = apps.get_model('core', 'VisitRequest')
+    DailyVisitStats = apps.get_model('core', 'DailyVisitStats')
+    dwell = ExpressionWrapper(
+        F('visitlog__check_out_time') - F('visitlog__check_in_time'),
+        output_field=DurationField()
+    )
+    rows = VisitRequest.objects.annotate(
+        day=TruncDate('scheduled_time')
+    ).values('day', 'employee_id', 'visit_type', 'status').annotate(
+        visit_count=Count('id'),
+        checked_in_count=Count('id', filter=Q(visitlog__check_in_time__isnull=False)),
+        checked_out_count=Count('id', filter=Q(visitlog__check_out_time__isnull=False)),
+        dwell=Sum(dwell, filter=Q(visitlog__check_in_time__isnull=False, visitlog__check_out_time__isnull=False)),
+    ).order_by()
+    DailyVisitStats.objects.bulk_create([
+        DailyVisitStats(
+            date=row['day'],
+            employee_id=row['employee_id'],
+            visit_type=row['visit_type'],
+            status=row['status'],
+            visit_count=row['visit_count'],
+            checked_in_count=row['checked_in_count'],
+            checked_out_count=row['checked_out_count'],
+            dwell_seconds=int(row['dwell'].total_seconds()) if row['dwell'] else 0,
+        )
+        for row in rows
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_report_export'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyVisitStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('visit_type', models.CharField(max_length=10)),
+                ('status', models.CharField(max_length=10)),
+                ('visit_count', models.PositiveIntegerField(default=0)),
+                ('checked_in_count', models.PositiveIntegerField(default=0)),
+                ('checked_out_count', models.PositiveIntegerField(default=0)),
+                ('dwell_seconds', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['-date'],
+            },
+        ),
+        migrations.AddField(
+            model_name='dailyvisitstats',
+            name='employee',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='dailyvisitstats',
+            index=models.Index(fields=['employee', 'date'], name='core_dailyv_employe_6d2b8e_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailyvisitstats',
+            constraint=models.UniqueConstraint(fields=('date', 'employee', 'visit_type', 'status'), name='core_dailyvisitstats_cell_uniq'),
+        ),
+        migrations.RunPython(backfill_daily_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.3 on 2026-10-17 07:14
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_daily_visit_stats'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='visitlog',
+            index=models.Index(fields=['checked_in_by', 'check_in_time'], name='core_visitl_checked_5a1e93_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='visitlog',
+            index=models.Index(fields=['checked_out_by', 'check_out_time'], name='core_visitl_checked_b84f20_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='visitrequest',
+            index=models.Index(fields=['employee', 'created_at'], name='core_visitr_employe_c2a7d1_idx'),
+        ),
+    ]
@@ -0,0 +1,121 @@
+# Generated by Django 5.2.3 on 2026-10-17 07:15
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+# Statuses whose transition time is approximated by the visit's updated_at
+STATUS_EVENTS = ('approved', 'rejected', 'canceled', 'no_show', 'expired')
+
+
+def backfill_events(apps, schema_editor):
+    """
+    Reconstruct the history of existing visits from their current state.
+
+    Status changes were overwritten in place before this table existed, so
+    their time is taken from updated_at and their actor is unknown, except
+    for creation, which is attributed to the host.
+    """
+    VisitRequest = apps.get_model('core', 'VisitRequest')
+    VisitLog = apps.get_model('core', 'VisitLog')
+    VisitEvent = apps.get_model('core', 'VisitEvent')
+
+    events = []
+
+    def flush(force=False):
+        if events and (force or len(events) >= 1000):
+            VisitEvent.objects.bulk_create(events)
+            events.clear()
+
+    visits = VisitRequest.objects.values_list(
+        'id', 'employee_id', 'status', 'created_at', 'updated_at', 'visitor__created_at'
+    ).order_by('id').iterator(chunk_size=1000)
+    for visit_id, host_id, status, created_at, updated_at, registered_at in visits:
+        events.append(VisitEvent(visit_id=visit_id, event_type='created', actor_id=host_id, host_id=host_id, created_at=created_at))
+        if registered_at:
+            events.append(VisitEvent(visit_id=visit_id, event_type='registered', host_id=host_id, created_at=registered_at))
+        if status in STATUS_EVENTS:
+            events.append(VisitEvent(visit_id=visit_id, event_type=status, host_id=host_id, created_at=updated_at))
+        flush()
+
+    logs = VisitLog.objects.values_list(
+        'visit_request_id', 'visit_request__employee_id',
+        'check_in_time', 'checked_in_by_id', 'check_out_time', 'checked_out_by_id'
+    ).order_by('id').iterator(chunk_size=1000)
+    for visit_id, host_id, check_in_time, checked_in_by, check_out_time, checked_out_by in logs:
+        if check_in_time:
+            events.append(VisitEvent(visit_id=visit_id, event_type='checked_in', actor_id=checked_in_by, host_id=host_id, created_at=check_in_time))
+        if check_out_time:
+            events.append(VisitEvent(visit_id=visit_id, event_type='checked_out', actor_id=checked_out_by, host_id=host_id, created_at=check_out_time))
+        flush()
+
+    flush(force=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_activity_timeline_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VisitEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('event_type', models.CharField(choices=[('created', 'Created'), ('registered', 'Visitor Registered'), ('approved', 'Approved'), ('rejected', 'Rejected'), ('canceled', 'Canceled'), ('no_show', 'No Show'), ('expired', 'Expired'), ('checked_in', 'Checked In'), ('checked_out', 'Checked Out'), ('converted', 'Converted to Walk-In')], max_length=12)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.AddField(
+            model_name='visitevent',
+            name='actor',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='visit_events', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='visitevent',
+            name='host',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='hosted_visit_events', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='visitevent',
+            name='visit',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='events', to='core.visitrequest'),
+        ),
+        migrations.AddIndex(
+            model_name='visitevent',
+            index=models.Index(fields=['actor', 'event_type', 'created_at'], name='core_visite_actor_i_3f9a2c_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='visitevent',
+            index=models.Index(fields=['host', 'event_type', 'created_at'], name='core_visite_host_id_8c41d7_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='visitevent',
+            index=models.Index(fields=['visit', 'created_at'], name='core_visite_visit_i_5b7e10_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='visitevent',
+            index=models.Index(fields=['created_at'], name='core_visite_created_e2d694_idx'),
+        ),
+        # The activity feed no longer reads VisitLog or VisitRequest
+        migrations.RemoveIndex(
+            model_name='visitlog',
+            name='core_visitl_checked_5a1e93_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='visitlog',
+            name='core_visitl_checked_b84f20_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='visitrequest',
+            name='core_visitr_employe_c2a7d1_idx',
+        ),
+        migrations.RunPython(backfill_events, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.3 on 2026-10-17 07:19
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_visit_event'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='visitevent',
+            name='event_type',
+            field=models.CharField(choices=[('created', 'Created'), ('registered', 'Visitor Registered'), ('approved', 'Approved'), ('rejected', 'Rejected'), ('canceled', 'Canceled'), ('no_show', 'No Show'), ('expired', 'Expired'), ('checked_in', 'Checked In'), ('checked_out', 'Checked Out'), ('converted', 'Converted to Walk-In'), ('deleted', 'Deleted')], max_length=12),
+        ),
+        migrations.AddIndex(
+            model_name='visitevent',
+            index=models.Index(fields=['event_type', 'created_at'], name='core_visite_event_t_71c3a5_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='visitlog',
+            index=models.Index(fields=['updated_at', 'visit_request'], name='core_visitl_updated_a62f17_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='visitrequest',
+            index=models.Index(fields=['updated_at'], name='core_visitr_updated_4d9b2e_idx'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.3 on 2026-10-17 07:32
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_delta_sync_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='visitor',
+            index=models.Index(fields=['contact'], name='core_visito_contact_7e2c1f_idx'),
+        ),
+    ]
@@ -0,0 +1,73 @@
+from django.db import migrations
+
+
+# MySQL: FULLTEXT indexes used by MATCH ... AGAINST in core.search
+MYSQL_FORWARD = [
+    "CREATE FULLTEXT INDEX core_visitr_purpose_ft ON core_visitrequest (purpose)",
+    "CREATE FULLTEXT INDEX core_visito_name_email_ft ON core_visitor (full_name, email)",
+]
+MYSQL_REVERSE = [
+    "DROP INDEX core_visitr_purpose_ft ON core_visitrequest",
+    "DROP INDEX core_visito_name_email_ft ON core_visitor",
+]
+
+# SQLite (development and test runs): FTS5 tables over the same columns,
+# kept in sync by triggers. A later migration that remakes either base table
+# on SQLite drops its triggers and has to recreate them.
+SQLITE_FORWARD = [
+    "CREATE VIRTUAL TABLE core_visitrequest_fts USING fts5(purpose, content='core_visitrequest', content_rowid='id')",
+    "CREATE TRIGGER core_visitrequest_fts_ai AFTER INSERT ON core_visitrequest BEGIN "
+    "INSERT INTO core_visitrequest_fts(rowid, purpose) VALUES (new.id, new.purpose); END",
+    "CREATE TRIGGER core_visitrequest_fts_ad AFTER DELETE ON core_visitrequest BEGIN "
+    "INSERT INTO core_visitrequest_fts(core_visitrequest_fts, rowid, purpose) VALUES ('delete', old.id, old.purpose); END",
+    "CREATE TRIGGER core_visitrequest_fts_au AFTER UPDATE OF purpose ON core_visitrequest BEGIN "
+    "INSERT INTO core_visitrequest_fts(core_visitrequest_fts, rowid, purpose) VALUES ('delete', old.id, old.purpose); "
+    "INSERT INTO core_visitrequest_fts(rowid, purpose) VALUES (new.id, new.purpose); END",
+    "INSERT INTO core_visitrequest_fts(core_visitrequest_fts) VALUES ('rebuild')",
+
+    "CREATE VIRTUAL TABLE core_visitor_fts USING fts5(full_name, email, content='core_visitor', content_rowid='id')",
+    "CREATE TRIGGER core_visitor_fts_ai AFTER INSERT ON core_visitor BEGIN "
+    "INSERT INTO core_visitor_fts(rowid, full_name, email) VALUES (new.id, new.full_name, new.email); END",
+    "CREATE TRIGGER core_visitor_fts_ad AFTER DELETE ON core_visitor BEGIN "
+    "INSERT INTO core_visitor_fts(core_visitor_fts, rowid, full_name, email) VALUES ('delete', old.id, old.full_name, old.email); END",
+    "CREATE TRIGGER core_visitor_fts_au AFTER UPDATE OF full_name, email ON core_visitor BEGIN "
+    "INSERT INTO core_visitor_fts(core_visitor_fts, rowid, full_name, email) VALUES ('delete', old.id, old.full_name, old.email); "
+    "INSERT INTO core_visitor_fts(rowid, full_name, email) VALUES (new.id, new.full_name, new.email); END",
+    "INSERT INTO core_visitor_fts(core_visitor_fts) VALUES ('rebuild')",
+]
+SQLITE_REVERSE = [
+    "DROP TRIGGER IF EXISTS core_visitrequest_fts_ai",
+    "DROP TRIGGER IF EXISTS core_visitrequest_fts_ad",
+    "DROP TRIGGER IF EXISTS core_visitrequest_fts_au",
+    "DROP TABLE IF EXISTS core_visitrequest_fts",
+    "DROP TRIGGER IF EXISTS core_visitor_fts_ai",
+    "DROP TRIGGER IF EXISTS core_visitor_fts_ad",
+    "DROP TRIGGER IF EXISTS core_visitor_fts_au",
+    "DROP TABLE IF EXISTS core_visitor_fts",
+]
+
+STATEMENTS = {
+    'mysql': (MYSQL_FORWARD, MYSQL_REVERSE),
+    'sqlite': (SQLITE_FORWARD, SQLITE_REVERSE),
+}
+
+
+def run(direction):
+    def operation(apps, schema_editor):
+        # Other backends fall back to LIKE matching in core.search
+        statements = STATEMENTS.get(schema_editor.connection.vendor)
+        if statements:
+            for statement in statements[direction]:
+                schema_editor.execute(statement)
+    return operation
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_visitor_contact_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(run(0), run(1)),
+    ]
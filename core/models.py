@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import User
 from django.utils import timezone
 import uuid
@@ -23,6 +23,8 @@ class Visitor(models.Model):
             models.Index(fields=['email'], name='core_visito_email_4b1d47_idx'),
             models.Index(fields=['full_name'], name='core_visito_full_na_e17917_idx'),
             models.Index(fields=['created_at'], name='core_visito_created_568fc0_idx'),
+            # Prefix lookups of returning visitors by phone number
+            models.Index(fields=['contact'], name='core_visito_contact_7e2c1f_idx'),
         ]
 
     def __str__(self):
@@ -85,11 +87,29 @@ class VisitRequest(models.Model):
             models.Index(fields=['created_at'], name='core_visitr_created_0e9203_idx'),
             models.Index(fields=['original_employee', 'status'], name='core_visitr_origina_5c49d7_idx'),
             models.Index(fields=['original_employee', 'scheduled_time'], name='core_visitr_origina_042bc0_idx'),
+            models.Index(fields=['updated_at'], name='core_visitr_updated_4d9b2e_idx'),
         ]
 
     def __str__(self):
         return f"{self.visitor.full_name if self.visitor else 'Unknown'} - {self.employee.username}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the rollup cell this row was counted in, so a reschedule or
+        # host change can refresh both the old and the new cell.
+        instance._loaded_rollup_key = instance.rollup_key
+        return instance
+
+    @property
+    def rollup_key(self):
+        """(local date, host id) of the DailyVisitStats cells covering this visit"""
+        scheduled_time = self.__dict__.get('scheduled_time')
+        employee_id = self.__dict__.get('employee_id')
+        if scheduled_time is None or employee_id is None:
+            return None
+        return timezone.localdate(scheduled_time), employee_id
+
     @property
     def is_expired(self):
         """Check if the visit request has expired"""
@@ -128,17 +148,52 @@ class VisitRequest(models.Model):
             return None
 
     @classmethod
-    def expire_pending_requests(cls):
-        """Expire pending requests that are past their scheduled time"""
-        now = timezone.now()
-        expired_requests = cls.objects.filter(
+    def expire_pending_requests(cls, batch_size=500, now=None):
+        """
+        Expire pending requests that are past their scheduled time.
+
+        Rows are expired in bounded batches of primary keys so a large backlog
+        never turns into a single table-wide UPDATE holding row locks.
+        """
+        from .rollups import mark_visits_dirty
+
+        now = now or timezone.now()
+        total = 0
+        while True:
+            with transaction.atomic():
+                # Lock the batch so exactly these rows are expired and logged
+                batch = list(
+                    cls.objects.select_for_update(skip_locked=True)
+                    .filter(status='pending', scheduled_time__lt=now)
+                    .order_by('scheduled_time')
+                    .values_list('id', 'scheduled_time', 'employee_id')[:batch_size]
+                )
+                if not batch:
+                    break
+                expired_at = timezone.now()
+                total += cls.objects.filter(id__in=[row[0] for row in batch]).update(
+                    status='expired',
+                    updated_at=expired_at
+                )
+                VisitEvent.record_many(
+                    ((visit_id, employee_id) for visit_id, _, employee_id in batch),
+                    'expired',
+                    at=expired_at
+                )
+                # Bulk UPDATEs bypass post_save, so refresh the rollup explicitly
+                mark_visits_dirty(row[1:] for row in batch)
+            if len(batch) < batch_size:
+                break
+        return total
+
+    @classmethod
+    def next_pending_deadline(cls, now=None):
+        """Return the earliest future scheduled_time among pending requests"""
+        now = now or timezone.now()
+        return cls.objects.filter(
             status='pending',
-            scheduled_time__lt=now
-        )
-        count = expired_requests.count()
-        if count > 0:
-            expired_requests.update(status='expired')
-        return count
+            scheduled_time__gte=now
+        ).order_by('scheduled_time').values_list('scheduled_time', flat=True).first()
 
 
 class VisitLog(models.Model):
@@ -173,6 +228,7 @@ class VisitLog(models.Model):
             models.Index(fields=['check_out_time'], name='core_visitl_check_o_fbf400_idx'),
             models.Index(fields=['checked_in_by'], name='core_visitl_checked_e31dd8_idx'),
             models.Index(fields=['created_at'], name='core_visitl_created_57350e_idx'),
+            models.Index(fields=['updated_at', 'visit_request'], name='core_visitl_updated_a62f17_idx'),
         ]
 
     def __str__(self):
@@ -185,4 +241,227 @@ class VisitLog(models.Model):
             return self.check_out_time - self.check_in_time
         elif self.check_in_time:
             return timezone.now() - self.check_in_time
-        return None 
\ No newline at end of file
+        return None 
+
+class JobWatermark(models.Model):
+    """Last-run bookkeeping for background jobs such as the expiry sweeper."""
+    name = models.CharField(max_length=50, unique=True)
+    last_run_at = models.DateTimeField(blank=True, null=True)
+    last_processed = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} @ {self.last_run_at}"
+
+    @classmethod
+    def record(cls, name, processed, run_at=None):
+        """Store the completion time and processed row count of a job run"""
+        run_at = run_at or timezone.now()
+        watermark, _ = cls.objects.update_or_create(
+            name=name,
+            defaults={'last_run_at': run_at, 'last_processed': processed}
+        )
+        return watermark
+
+
+class OutboundEmail(models.Model):
+    """Transactional outbox row for an email that still has to be delivered."""
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('sent', 'Sent'),
+        ('dead', 'Dead Letter')
+    ]
+
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    from_email = models.CharField(max_length=254, blank=True, null=True)
+    recipients = models.JSONField(default=list)
+    status = models.CharField(
+        max_length=10,
+        choices=STATUS_CHOICES,
+        default='pending'
+    )
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='core_outbou_status_4e2a91_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} ({self.status})"
+
+
+class ReportExport(models.Model):
+    """An asynchronous report export job and its cached file artifact."""
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed')
+    ]
+
+    FORMAT_CHOICES = [
+        ('csv', 'CSV'),
+        ('xlsx', 'Excel')
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    requested_by = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        blank=True,
+        null=True
+    )
+    filters = models.JSONField(default=dict)
+    format = models.CharField(max_length=4, choices=FORMAT_CHOICES, default='csv')
+    cache_key = models.CharField(max_length=64)
+    status = models.CharField(
+        max_length=10,
+        choices=STATUS_CHOICES,
+        default='queued'
+    )
+    file_name = models.CharField(max_length=255, blank=True, null=True)
+    row_count = models.PositiveIntegerField(blank=True, null=True)
+    error = models.TextField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(blank=True, null=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['cache_key', 'status'], name='core_report_cache_k_0b6f2e_idx'),
+            models.Index(fields=['status', 'created_at'], name='core_report_status_93c1d4_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.format} export {self.id} ({self.status})"
+
+
+class DailyVisitStats(models.Model):
+    """
+    Rollup cube of visits per local day, host, visit type and status.
+
+    Maintained by core.rollups whenever a visit or its log changes, and rebuilt
+    from the raw tables by the rebuild_daily_stats command.
+    """
+    date = models.DateField()
+    employee = models.ForeignKey(User, on_delete=models.CASCADE)
+    visit_type = models.CharField(max_length=10)
+    status = models.CharField(max_length=10)
+    visit_count = models.PositiveIntegerField(default=0)
+    checked_in_count = models.PositiveIntegerField(default=0)
+    checked_out_count = models.PositiveIntegerField(default=0)
+    dwell_seconds = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-date']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['date', 'employee', 'visit_type', 'status'],
+                name='core_dailyvisitstats_cell_uniq'
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['employee', 'date'], name='core_dailyv_employe_6d2b8e_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.date} {self.employee_id} {self.visit_type}/{self.status}: {self.visit_count}"
+
+
+class VisitEvent(models.Model):
+    """
+    Append-only log of visit state transitions.
+
+    One narrow row per transition, written in the same transaction as the
+    change itself. `host` is the visit's employee at the time of the event,
+    denormalized so per-host feeds never join back to VisitRequest. The visit
+    reference has no database constraint so the history of a deleted visit
+    is kept.
+    """
+    EVENT_CHOICES = [
+        ('created', 'Created'),
+        ('registered', 'Visitor Registered'),
+        ('approved', 'Approved'),
+        ('rejected', 'Rejected'),
+        ('canceled', 'Canceled'),
+        ('no_show', 'No Show'),
+        ('expired', 'Expired'),
+        ('checked_in', 'Checked In'),
+        ('checked_out', 'Checked Out'),
+        ('converted', 'Converted to Walk-In'),
+        ('deleted', 'Deleted')
+    ]
+
+    visit = models.ForeignKey(
+        VisitRequest,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        related_name='events'
+    )
+    event_type = models.CharField(max_length=12, choices=EVENT_CHOICES)
+    actor = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        blank=True,
+        null=True,
+        related_name='visit_events'
+    )
+    host = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='hosted_visit_events'
+    )
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['actor', 'event_type', 'created_at'], name='core_visite_actor_i_3f9a2c_idx'),
+            models.Index(fields=['host', 'event_type', 'created_at'], name='core_visite_host_id_8c41d7_idx'),
+            models.Index(fields=['visit', 'created_at'], name='core_visite_visit_i_5b7e10_idx'),
+            models.Index(fields=['created_at'], name='core_visite_created_e2d694_idx'),
+            models.Index(fields=['event_type', 'created_at'], name='core_visite_event_t_71c3a5_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.event_type} visit {self.visit_id} @ {self.created_at}"
+
+    @classmethod
+    def record(cls, visit, event_type, actor=None, at=None):
+        """Append one event for a visit instance and push it to lobby clients"""
+        from .broadcast import publish_visit_events
+
+        event = cls.objects.create(
+            visit_id=visit.id,
+            event_type=event_type,
+            actor=actor,
+            host_id=visit.employee_id,
+            created_at=at or timezone.now()
+        )
+        if event_type == 'created' and visit.visit_type == 'walkin':
+            event_type = 'walkin'
+        publish_visit_events(event_type, [visit.id], at=event.created_at)
+        return event
+
+    @classmethod
+    def record_many(cls, rows, event_type, actor=None, at=None):
+        """Append one event per (visit id, host id) pair with a single INSERT"""
+        from .broadcast import publish_visit_events
+
+        at = at or timezone.now()
+        actor_id = actor.id if actor else None
+        events = cls.objects.bulk_create([
+            cls(visit_id=visit_id, event_type=event_type, actor_id=actor_id, host_id=host_id, created_at=at)
+            for visit_id, host_id in rows
+        ], batch_size=500)
+        publish_visit_events(event_type, [event.visit_id for event in events], at=at)
+        return events
@@ -0,0 +1,116 @@
+from datetime import timedelta
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.utils import timezone
+from .models import OutboundEmail
+import logging
+
+
+logger = logging.getLogger(__name__)
+
+# How long a dispatcher owns a claimed row before another worker may retry it
+CLAIM_LEASE = timedelta(minutes=5)
+
+
+def enqueue_email(subject, message, recipients, from_email=None):
+    """
+    Queue an email for background delivery.
+
+    Call this inside the same transaction as the state change it announces,
+    so the email is only sent if that change is committed.
+    """
+    return OutboundEmail.objects.create(
+        subject=subject,
+        body=message,
+        from_email=from_email or settings.DEFAULT_FROM_EMAIL,
+        recipients=[r for r in recipients if r],
+    )
+
+
+def enqueue_emails(messages):
+    """Queue several (subject, message, recipients) emails with one INSERT"""
+    return OutboundEmail.objects.bulk_create([
+        OutboundEmail(
+            subject=subject,
+            body=message,
+            from_email=settings.DEFAULT_FROM_EMAIL,
+            recipients=[r for r in recipients if r],
+        )
+        for subject, message, recipients in messages
+    ])
+
+
+def claim_batch(batch_size):
+    """Lease up to batch_size due emails to this worker and return them"""
+    now = timezone.now()
+    with transaction.atomic():
+        batch = list(
+            OutboundEmail.objects.select_for_update(skip_locked=True)
+            .filter(status='pending', next_attempt_at__lte=now)
+            .order_by('next_attempt_at')[:batch_size]
+        )
+        if batch:
+            OutboundEmail.objects.filter(id__in=[email.id for email in batch]).update(
+                next_attempt_at=now + CLAIM_LEASE
+            )
+    return batch
+
+
+def record_failure(email, error, max_attempts, backoff_seconds):
+    """Schedule a retry with exponential backoff, or dead-letter the email"""
+    email.attempts += 1
+    email.last_error = str(error)
+    if email.attempts >= max_attempts:
+        email.status = 'dead'
+        logger.error(f"Outbound email {email.id} dead-lettered after {email.attempts} attempts: {error}")
+    else:
+        delay = backoff_seconds * (2 ** (email.attempts - 1))
+        email.next_attempt_at = timezone.now() + timedelta(seconds=delay)
+        logger.warning(f"Outbound email {email.id} failed (attempt {email.attempts}), retrying in {delay}s: {error}")
+    email.save(update_fields=['attempts', 'last_error', 'status', 'next_attempt_at'])
+
+
+def dispatch_outbox(batch_size=50, max_attempts=5, backoff_seconds=30):
+    """
+    Deliver one batch of due emails over a single reused mail connection.
+
+    Returns a (sent, failed) tuple.
+    """
+    batch = claim_batch(batch_size)
+    if not batch:
+        return 0, 0
+
+    sent = failed = 0
+    connection = get_connection(fail_silently=False)
+    try:
+        connection.open()
+    except Exception as e:
+        for email in batch:
+            record_failure(email, e, max_attempts, backoff_seconds)
+        return 0, len(batch)
+
+    try:
+        for email in batch:
+            try:
+                EmailMessage(
+                    email.subject,
+                    email.body,
+                    email.from_email or settings.DEFAULT_FROM_EMAIL,
+                    email.recipients,
+                    connection=connection,
+                ).send()
+            except Exception as e:
+                record_failure(email, e, max_attempts, backoff_seconds)
+                failed += 1
+                continue
+
+            email.status = 'sent'
+            email.sent_at = timezone.now()
+            email.attempts += 1
+            email.save(update_fields=['status', 'sent_at', 'attempts'])
+            sent += 1
+    finally:
+        connection.close()
+
+    return sent, failed
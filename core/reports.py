@@ -0,0 +1,290 @@
+from datetime import datetime, timedelta
+from django.conf import settings
+from django.db.models import Count, Max
+from django.utils import timezone
+from openpyxl import Workbook
+from .models import VisitRequest, DailyVisitStats
+from .search import search_visits
+import csv
+import hashlib
+import json
+import logging
+import os
+
+
+logger = logging.getLogger(__name__)
+
+CSV_HEADER = [
+    'Visitor Name',
+    'Employee Name',
+    'Scheduled Time',
+    'Status',
+    'Check-in Time',
+    'Check-out Time',
+    'Purpose',
+    'Visit Type'
+]
+
+EXPORT_CHUNK_SIZE = 2000
+
+# A running export whose worker has not finished it within this long is
+# assumed lost (worker crashed or was killed) and is failed, so identical
+# requests queue a fresh job instead of waiting on it
+EXPORT_LEASE_TIMEOUT = timedelta(minutes=30)
+
+
+def report_filters(params):
+    """Read the report filter query parameters shared by the report endpoints"""
+    return {
+        'start_date': params.get('start_date') or None,
+        'end_date': params.get('end_date') or None,
+        'status': params.get('status', 'all') or 'all',
+        'employee': params.get('employee', 'all') or 'all',
+        'visit_type': params.get('visit_type', 'all') or 'all',
+        'search': (params.get('search') or '').strip() or None,
+    }
+
+
+def report_queryset(filters):
+    """
+    Build the filtered VisitRequest queryset for a report.
+
+    Raises ValueError when a date is not in YYYY-MM-DD format.
+    """
+    # Convert dates with timezone awareness
+    if filters['start_date']:
+        start_datetime = timezone.make_aware(datetime.strptime(filters['start_date'], '%Y-%m-%d'))
+    else:
+        start_datetime = timezone.now() - timedelta(days=7)
+
+    if filters['end_date']:
+        end_datetime = timezone.make_aware(datetime.strptime(filters['end_date'], '%Y-%m-%d') + timedelta(days=1))
+    else:
+        end_datetime = timezone.now()
+
+    # Base queryset
+    queryset = VisitRequest.objects.filter(
+        scheduled_time__gte=start_datetime,
+        scheduled_time__lte=end_datetime
+    )
+
+    # Apply filters
+    status_filter = filters['status']
+    if status_filter != 'all':
+        if status_filter == 'checked_in':
+            queryset = queryset.filter(visitlog__check_in_time__isnull=False, visitlog__check_out_time__isnull=True)
+        elif status_filter == 'checked_out':
+            queryset = queryset.filter(visitlog__check_out_time__isnull=False)
+        else:
+            queryset = queryset.filter(status=status_filter)
+
+    if filters['employee'] != 'all':
+        queryset = queryset.filter(employee__username=filters['employee'])
+
+    if filters['visit_type'] != 'all':
+        queryset = queryset.filter(visit_type=filters['visit_type'])
+
+    # Export jobs stored before the search filter existed lack the key
+    if filters.get('search'):
+        queryset = search_visits(queryset, filters['search'])
+
+    return queryset
+
+
+def report_rollup_cells(filters):
+    """
+    Return the DailyVisitStats cells matching the report filters.
+
+    Returns None when the rollup cannot answer the filters exactly: open-ended
+    date ranges (which end at the current time rather than a day boundary),
+    the check-in based statuses and text searches, which are not dimensions
+    of the cube.
+    """
+    if not filters['start_date'] or not filters['end_date']:
+        return None
+    if filters.get('search'):
+        return None
+    if filters['status'] in ('checked_in', 'checked_out'):
+        return None
+
+    cells = DailyVisitStats.objects.filter(
+        date__gte=datetime.strptime(filters['start_date'], '%Y-%m-%d').date(),
+        date__lte=datetime.strptime(filters['end_date'], '%Y-%m-%d').date()
+    )
+    if filters['status'] != 'all':
+        cells = cells.filter(status=filters['status'])
+    if filters['employee'] != 'all':
+        cells = cells.filter(employee__username=filters['employee'])
+    if filters['visit_type'] != 'all':
+        cells = cells.filter(visit_type=filters['visit_type'])
+    return cells
+
+
+def export_rows(queryset):
+    """
+    Yield one tuple per visit for file exports.
+
+    Visitor, host and visit log are joined into a single query that is read
+    in chunks, so exports never hold the whole result set in memory.
+    """
+    visits = queryset.select_related('visitor', 'employee', 'visitlog').iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    for visit in visits:
+        yield (
+            visit.visitor.full_name if visit.visitor else 'Unknown',
+            visit.employee.username,
+            visit.scheduled_time,
+            visit.status,
+            visit.check_in_time,
+            visit.check_out_time,
+            visit.purpose,
+            visit.visit_type
+        )
+
+
+def format_csv_time(value):
+    return value.strftime('%Y-%m-%d %H:%M:%S') if value else ''
+
+
+class Echo:
+    """Pseudo-buffer whose write() hands the formatted line back to the caller"""
+
+    def write(self, value):
+        return value
+
+
+def stream_csv(queryset, label='report'):
+    """Yield the CSV export line by line and log a row/byte trailer at the end"""
+    writer = csv.writer(Echo())
+    row_count = 0
+    byte_count = 0
+
+    line = writer.writerow(CSV_HEADER)
+    byte_count += len(line.encode('utf-8'))
+    yield line
+
+    for name, employee, scheduled, status, check_in, check_out, purpose, visit_type in export_rows(queryset):
+        line = writer.writerow([
+            name,
+            employee,
+            format_csv_time(scheduled),
+            status,
+            format_csv_time(check_in),
+            format_csv_time(check_out),
+            purpose,
+            visit_type
+        ])
+        row_count += 1
+        byte_count += len(line.encode('utf-8'))
+        yield line
+
+    logger.info(f"CSV export {label} finished: {row_count} rows, {byte_count} bytes")
+
+
+def excel_time(value):
+    """Excel has no timezone support, so cells hold naive local datetimes"""
+    return timezone.localtime(value).replace(tzinfo=None) if value else None
+
+
+def write_xlsx(queryset, fileobj, label='report'):
+    """
+    Write the export as an XLSX workbook into fileobj.
+
+    Uses openpyxl's write-only mode, which flushes rows to disk as they are
+    appended, so memory stays near-constant regardless of the row count.
+    Returns the number of data rows written.
+    """
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet('Visitor Report')
+    sheet.append(CSV_HEADER)
+
+    row_count = 0
+    for name, employee, scheduled, status, check_in, check_out, purpose, visit_type in export_rows(queryset):
+        sheet.append([
+            name,
+            employee,
+            excel_time(scheduled),
+            status,
+            excel_time(check_in),
+            excel_time(check_out),
+            purpose,
+            visit_type
+        ])
+        row_count += 1
+
+    workbook.save(fileobj)
+    logger.info(f"XLSX export {label} finished: {row_count} rows")
+    return row_count
+
+
+def normalize_report_filters(filters):
+    """
+    Pin open-ended date filters to concrete dates.
+
+    Export jobs run later than they are requested, and identical requests must
+    map to the same cache key, so "last 7 days" is resolved at submission time.
+    """
+    normalized = dict(filters)
+    today = timezone.localdate()
+    if not normalized['start_date']:
+        normalized['start_date'] = (today - timedelta(days=7)).isoformat()
+    if not normalized['end_date']:
+        normalized['end_date'] = today.isoformat()
+    return normalized
+
+
+def export_cache_key(filters, format_type):
+    """
+    Hash the normalized filters together with a watermark of the matching data.
+
+    The watermark (row count plus latest visit and visit log update) is read
+    in one aggregate query; any change to the exported rows yields a new key.
+    """
+    watermark = report_queryset(filters).aggregate(
+        rows=Count('id'),
+        visit_updated=Max('updated_at'),
+        log_updated=Max('visitlog__updated_at'),
+    )
+    payload = json.dumps({
+        'filters': filters,
+        'format': format_type,
+        'watermark': watermark,
+    }, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def stale_export_cutoff(now=None):
+    """Running jobs started before this time have lost their worker"""
+    return (now or timezone.now()) - EXPORT_LEASE_TIMEOUT
+
+
+def export_path(file_name):
+    return os.path.join(settings.REPORT_EXPORT_DIR, file_name)
+
+
+def generate_export(job):
+    """Write the artifact for a ReportExport job and return its row count"""
+    os.makedirs(settings.REPORT_EXPORT_DIR, exist_ok=True)
+    file_name = f"{job.cache_key}.{job.format}"
+    final_path = export_path(file_name)
+    partial_path = f"{final_path}.{job.id}.part"
+    queryset = report_queryset(job.filters)
+
+    try:
+        if job.format == 'xlsx':
+            with open(partial_path, 'wb') as fileobj:
+                row_count = write_xlsx(queryset, fileobj, label=file_name)
+        else:
+            row_count = 0
+            with open(partial_path, 'w', newline='', encoding='utf-8') as fileobj:
+                for line in stream_csv(queryset, label=file_name):
+                    fileobj.write(line)
+                    row_count += 1
+            row_count -= 1  # header line
+        # Publish the artifact atomically so readers never see a partial file
+        os.replace(partial_path, final_path)
+    finally:
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+
+    job.file_name = file_name
+    return row_count
@@ -0,0 +1,131 @@
+from datetime import datetime, time, timedelta
+from django.db import IntegrityError, transaction
+from django.db.models import Count, DurationField, ExpressionWrapper, F, Q, Sum
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+from .models import VisitRequest, DailyVisitStats
+import logging
+
+
+logger = logging.getLogger(__name__)
+
+
+def local_day_bounds(day):
+    """Aware [start, end) datetimes covering a local calendar date"""
+    start = timezone.make_aware(datetime.combine(day, time.min))
+    return start, start + timedelta(days=1)
+
+
+def cell_aggregates():
+    """Per-cell counters shared by the incremental refresh and the backfill"""
+    dwell = ExpressionWrapper(
+        F('visitlog__check_out_time') - F('visitlog__check_in_time'),
+        output_field=DurationField()
+    )
+    return {
+        'visit_count': Count('id'),
+        'checked_in_count': Count('id', filter=Q(visitlog__check_in_time__isnull=False)),
+        'checked_out_count': Count('id', filter=Q(visitlog__check_out_time__isnull=False)),
+        'dwell': Sum(dwell, filter=Q(visitlog__check_in_time__isnull=False, visitlog__check_out_time__isnull=False)),
+    }
+
+
+def build_cell(day, employee_id, row):
+    dwell = row['dwell']
+    return DailyVisitStats(
+        date=day,
+        employee_id=employee_id,
+        visit_type=row['visit_type'],
+        status=row['status'],
+        visit_count=row['visit_count'],
+        checked_in_count=row['checked_in_count'],
+        checked_out_count=row['checked_out_count'],
+        dwell_seconds=int(dwell.total_seconds()) if dwell else 0,
+    )
+
+
+def refresh_daily_stats(keys):
+    """
+    Recompute the rollup cells for the given (local date, host id) keys.
+
+    Each key is a small indexed slice of one host's visits on one day, so this
+    stays cheap enough to run after every state transition.
+    """
+    for day, employee_id in set(keys):
+        start, end = local_day_bounds(day)
+        rows = VisitRequest.objects.filter(
+            employee_id=employee_id,
+            scheduled_time__gte=start,
+            scheduled_time__lt=end
+        ).values('visit_type', 'status').annotate(**cell_aggregates()).order_by()
+
+        try:
+            with transaction.atomic():
+                DailyVisitStats.objects.filter(date=day, employee_id=employee_id).delete()
+                DailyVisitStats.objects.bulk_create([build_cell(day, employee_id, row) for row in rows])
+        except IntegrityError:
+            # A concurrent refresh of the same cell won the race and wrote
+            # equally fresh numbers; rebuild_daily_stats reconciles anything left.
+            logger.warning(f"Concurrent rollup refresh for {day} / host {employee_id}, skipped")
+
+
+def rebuild_daily_stats(start_date, end_date):
+    """Rebuild every rollup cell between two local dates (inclusive)"""
+    start, _ = local_day_bounds(start_date)
+    _, end = local_day_bounds(end_date)
+    rows = VisitRequest.objects.filter(
+        scheduled_time__gte=start,
+        scheduled_time__lt=end
+    ).annotate(
+        day=TruncDate('scheduled_time')
+    ).values('day', 'employee_id', 'visit_type', 'status').annotate(**cell_aggregates()).order_by()
+
+    cells = [build_cell(row['day'], row['employee_id'], row) for row in rows]
+    with transaction.atomic():
+        DailyVisitStats.objects.filter(date__gte=start_date, date__lte=end_date).delete()
+        DailyVisitStats.objects.bulk_create(cells, batch_size=1000)
+    return len(cells)
+
+
+def mark_dirty(keys):
+    """Refresh the given rollup cells once the current transaction commits"""
+    keys = {key for key in keys if key is not None}
+    if keys:
+        # The visit change is already committed; a failed refresh is logged
+        # rather than raised, and rebuild_daily_stats reconciles the cell
+        transaction.on_commit(lambda: refresh_daily_stats(keys), robust=True)
+
+
+def mark_visits_dirty(visits):
+    """Queue the cells of visit rows given as (scheduled_time, employee_id) pairs"""
+    mark_dirty(
+        (timezone.localdate(scheduled_time), employee_id)
+        for scheduled_time, employee_id in visits
+    )
+
+
+def rollup_counters(cells):
+    """
+    Sum rollup cells into the counters reported by the dashboards.
+
+    Returns the same keys as the raw-table aggregate: total, checked_in (inside
+    right now), checked_out, no_show and pending (approved, not checked in),
+    plus dwell_seconds.
+    """
+    totals = cells.aggregate(
+        total=Coalesce(Sum('visit_count'), 0),
+        checked_in_total=Coalesce(Sum('checked_in_count'), 0),
+        checked_out=Coalesce(Sum('checked_out_count'), 0),
+        no_show=Coalesce(Sum('visit_count', filter=Q(status='no_show')), 0),
+        approved=Coalesce(Sum('visit_count', filter=Q(status='approved')), 0),
+        approved_checked_in=Coalesce(Sum('checked_in_count', filter=Q(status='approved')), 0),
+        dwell_seconds=Coalesce(Sum('dwell_seconds'), 0),
+    )
+    return {
+        'total': totals['total'],
+        'checked_in': totals['checked_in_total'] - totals['checked_out'],
+        'checked_out': totals['checked_out'],
+        'no_show': totals['no_show'],
+        'pending': totals['approved'] - totals['approved_checked_in'],
+        'dwell_seconds': totals['dwell_seconds'],
+    }
@@ -0,0 +1,168 @@
+from django.contrib.auth.models import User
+from django.db import connection
+from django.db.models import FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+from .models import Visitor, VisitRequest
+import re
+
+
+# Shortest query worth a lookup; one character matches a large index range
+MIN_QUERY_LENGTH = 2
+
+SEARCH_LIMIT = 10
+
+# Visitor rows fetched per column before returning visitors are collapsed.
+# Each visit used to create its own Visitor row, so frequent guests repeat.
+OVERFETCH = 5
+
+VISITOR_FIELDS = ('id', 'full_name', 'email', 'contact', 'address', 'created_at')
+
+
+def prefix_queries(query):
+    """
+    One prefix lookup per searchable column, each a sargable LIKE 'query%'
+    served by that column's index (case-insensitive through the MySQL
+    collation). Contact is only searched for queries containing digits.
+    """
+    lookups = [('full_name', 'full_name__istartswith')]
+    if ' ' not in query:
+        lookups.append(('email', 'email__istartswith'))
+    if re.search(r'\d', query):
+        lookups.append(('contact', 'contact__startswith'))
+    return [
+        Visitor.objects.filter(**{lookup: query}).order_by(column)
+        for column, lookup in lookups
+    ]
+
+
+def search_visitors(query, limit=SEARCH_LIMIT):
+    """
+    Find returning visitors whose name, email or contact starts with `query`.
+
+    Rows for the same person (same email and name) are collapsed to the most
+    recent one, so the lobby form is prefilled with their latest details.
+    """
+    query = query.strip()
+    if len(query) < MIN_QUERY_LENGTH:
+        return []
+
+    latest = {}
+    for queryset in prefix_queries(query):
+        for row in queryset.values(*VISITOR_FIELDS)[:limit * OVERFETCH]:
+            key = (row['email'].lower(), row['full_name'].lower())
+            if key not in latest or row['id'] > latest[key]['id']:
+                latest[key] = row
+
+    folded = query.lower()
+    ranked = sorted(
+        latest.values(),
+        # Name matches first, then alphabetical
+        key=lambda row: (not row['full_name'].lower().startswith(folded), row['full_name'].lower(), -row['id'])
+    )
+    return ranked[:limit]
+
+
+# Words of a full-text query that are matched; extra words are ignored
+MAX_SEARCH_TERMS = 8
+
+
+# MySQL FULLTEXT indexes skip words shorter than innodb_ft_min_token_size and
+# the words of the default InnoDB stopword list. Such words can never match in
+# boolean mode, so they are matched with LIKE instead (see DEPLOYMENT.md).
+MYSQL_FT_MIN_TOKEN_SIZE = 3
+MYSQL_FT_STOPWORDS = frozenset((
+    'a', 'about', 'an', 'are', 'as', 'at', 'be', 'by', 'com', 'de', 'en', 'for',
+    'from', 'how', 'i', 'in', 'is', 'it', 'la', 'of', 'on', 'or', 'that', 'the',
+    'this', 'to', 'was', 'what', 'when', 'where', 'who', 'will', 'with', 'und', 'www',
+))
+
+
+def search_terms(query):
+    return re.findall(r'\w+', query.lower())[:MAX_SEARCH_TERMS]
+
+
+def fulltext_indexed(term):
+    """Whether the backend's full-text index can match `term` at all"""
+    if connection.vendor == 'mysql':
+        return len(term) >= MYSQL_FT_MIN_TOKEN_SIZE and term not in MYSQL_FT_STOPWORDS
+    return True
+
+
+def fulltext_sql(terms):
+    """
+    Per-backend SQL matching visit purposes and visitor name/email as a
+    prefix: (purpose ids, visitor ids, relevance, term expression, any-term
+    expression). The id queries take one term's expression each; relevance
+    takes the any-term expression twice.
+
+    MySQL answers from the FULLTEXT indexes and SQLite from the FTS5 tables
+    created by migration 0015; other backends return None.
+    """
+    visits = VisitRequest._meta.db_table
+    visitors = Visitor._meta.db_table
+    if connection.vendor == 'mysql':
+        purpose_ids = f"SELECT id FROM {visits} WHERE MATCH(purpose) AGAINST (%s IN BOOLEAN MODE)"
+        visitor_ids = f"SELECT id FROM {visitors} WHERE MATCH(full_name, email) AGAINST (%s IN BOOLEAN MODE)"
+        relevance = (
+            f"MATCH({visits}.purpose) AGAINST (%s IN BOOLEAN MODE) + COALESCE(("
+            f"SELECT MATCH(v.full_name, v.email) AGAINST (%s IN BOOLEAN MODE) "
+            f"FROM {visitors} v WHERE v.id = {visits}.visitor_id), 0)"
+        )
+        # Boolean mode without operators scores rows matching any term
+        return purpose_ids, visitor_ids, relevance, '{}*'.format, ' '.join(f'{term}*' for term in terms)
+    if connection.vendor == 'sqlite':
+        purpose_ids = f"SELECT rowid FROM {visits}_fts WHERE {visits}_fts MATCH %s"
+        visitor_ids = f"SELECT rowid FROM {visitors}_fts WHERE {visitors}_fts MATCH %s"
+        # bm25() is lower for better matches
+        relevance = (
+            f"COALESCE((SELECT -bm25({visits}_fts) FROM {visits}_fts "
+            f"WHERE {visits}_fts MATCH %s AND rowid = {visits}.id), 0) + "
+            f"COALESCE((SELECT -bm25({visitors}_fts) FROM {visitors}_fts "
+            f"WHERE {visitors}_fts MATCH %s AND rowid = {visits}.visitor_id), 0)"
+        )
+        return purpose_ids, visitor_ids, relevance, '"{}"*'.format, ' OR '.join(f'"{term}"*' for term in terms)
+    return None
+
+
+def host_ids(term):
+    return User.objects.filter(
+        Q(username__istartswith=term) | Q(first_name__istartswith=term) | Q(last_name__istartswith=term)
+    )
+
+
+def search_visits(queryset, query, rank=False):
+    """
+    Restrict a visit queryset to visits where every word of `query` matches
+    the purpose, the visitor name or email, or the host name as a prefix.
+    Words may match different fields: "john meeting" finds John's meeting.
+
+    With rank=True the rows are annotated with `relevance` and ordered by it,
+    most relevant and then most recent first. Hosts are few, so they are
+    matched with plain prefix lookups on the user table. Words the full-text
+    index cannot match (no index, or too short or a stopword on MySQL) fall
+    back to LIKE and do not count towards relevance.
+    """
+    terms = search_terms(query)
+    if not terms:
+        return queryset.none()
+
+    indexed = [term for term in terms if fulltext_indexed(term)]
+    sql = fulltext_sql(indexed) if indexed else None
+    for term in terms:
+        if sql is not None and term in indexed:
+            purpose_ids, visitor_ids, _, term_expression, _ = sql
+            expression = term_expression(term)
+            text_match = Q(id__in=RawSQL(purpose_ids, [expression])) | Q(visitor_id__in=RawSQL(visitor_ids, [expression]))
+        else:
+            text_match = Q(purpose__icontains=term) | Q(visitor__full_name__icontains=term) | Q(visitor__email__icontains=term)
+        queryset = queryset.filter(Q(employee__in=host_ids(term)) | text_match)
+
+    if sql is None:
+        relevance = Value(0.0, output_field=FloatField())
+    else:
+        _, _, relevance_sql, _, any_term = sql
+        relevance = RawSQL(relevance_sql, [any_term, any_term], output_field=FloatField())
+
+    if rank:
+        queryset = queryset.annotate(relevance=relevance).order_by('-relevance', '-scheduled_time')
+    return queryset
@@ -17,8 +17,12 @@ class VisitorSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError("Email address is required.")
         
         try:
-            # Use email-validator library for comprehensive validation
-            email_validator.validate_email(value.strip())
+            # Use email-validator library for comprehensive validation. Bulk
+            # imports skip the DNS lookup here and check each domain once.
+            email_validator.validate_email(
+                value.strip(),
+                check_deliverability=self.context.get('check_deliverability', True)
+            )
         except email_validator.EmailNotValidError as e:
             raise serializers.ValidationError(f"Please provide a valid email address: {str(e)}")
         
@@ -0,0 +1,27 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .models import VisitRequest, VisitLog
+from .rollups import mark_dirty
+
+
+@receiver(post_save, sender=VisitRequest)
+@receiver(post_delete, sender=VisitRequest)
+def refresh_visit_rollup(sender, instance, **kwargs):
+    """Keep DailyVisitStats in step with visit changes made through save()"""
+    keys = {instance.rollup_key, getattr(instance, '_loaded_rollup_key', None)}
+    mark_dirty(keys)
+    instance._loaded_rollup_key = instance.rollup_key
+
+
+@receiver(post_save, sender=VisitLog)
+@receiver(post_delete, sender=VisitLog)
+def refresh_visit_log_rollup(sender, instance, **kwargs):
+    """Check-ins and check-outs change the counters of the visit's cell"""
+    if VisitLog.visit_request.is_cached(instance):
+        visit = instance.visit_request
+    else:
+        visit = VisitRequest.objects.filter(pk=instance.visit_request_id).only(
+            'scheduled_time', 'employee_id'
+        ).first()
+    if visit is not None:
+        mark_dirty([visit.rollup_key])
@@ -0,0 +1,116 @@
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.core import signing
+from django.core.handlers.asgi import ASGIRequest
+from django.http import JsonResponse, StreamingHttpResponse
+from django.utils import timezone
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from .broadcast import hub
+from .tokens import LOBBY_ATTENDANT, roles_for_user_id
+import asyncio
+import json
+import logging
+
+
+logger = logging.getLogger(__name__)
+
+# Comment line sent when the channel is idle, so proxies keep it open
+HEARTBEAT_SECONDS = 15
+
+# Client reconnect delay advertised to EventSource
+RETRY_MILLISECONDS = 3000
+
+
+# Seconds a stream ticket can be redeemed after it was issued
+STREAM_TICKET_MAX_AGE = 60
+
+# Ties tickets to this endpoint, so no other signed value is accepted
+STREAM_TICKET_SALT = 'core.streams.lobby_events'
+
+
+def issue_stream_ticket(user):
+    """Sign a short-lived ticket that opens the lobby event stream for `user`"""
+    return signing.TimestampSigner(salt=STREAM_TICKET_SALT).sign(str(user.pk))
+
+
+def authenticate_stream(request):
+    """
+    Resolve the lobby attendant behind an SSE request.
+
+    EventSource cannot send headers, so the client presents a ticket from
+    POST /api/lobby/events/ticket/ as ?ticket=. Access tokens are never
+    accepted in the URL, where proxies and browser history would keep them.
+    Returns (user, stream expiry) or raises AuthenticationFailed.
+    """
+    ticket = request.GET.get('ticket')
+    if not ticket:
+        raise AuthenticationFailed('A stream ticket is required.')
+
+    try:
+        user_id = signing.TimestampSigner(salt=STREAM_TICKET_SALT).unsign(ticket, max_age=STREAM_TICKET_MAX_AGE)
+    except signing.BadSignature:
+        raise AuthenticationFailed('Stream ticket is invalid or expired.')
+    user = get_user_model().objects.filter(pk=user_id, is_active=True).first()
+    if user is None:
+        raise AuthenticationFailed('Stream ticket is invalid or expired.')
+    if LOBBY_ATTENDANT not in roles_for_user_id(user.pk):
+        return None, None
+    # Reauthorize as often as an access token would be refreshed
+    return user, timezone.now() + jwt_settings.ACCESS_TOKEN_LIFETIME
+
+
+def format_event(message):
+    data = {key: value for key, value in message.items() if key not in ('id', 'type')}
+    return f"id: {message.get('id', '')}\nevent: {message['type']}\ndata: {json.dumps(data)}\n\n"
+
+
+async def event_stream(expires_at):
+    """
+    Yield lobby events as they are published, with heartbeats while idle.
+
+    The stream ends after one access token lifetime; the client then asks
+    for a new ticket and reconnects.
+    """
+    subscription = hub.subscribe()
+    try:
+        yield f"retry: {RETRY_MILLISECONDS}\n\n"
+        while True:
+            remaining = (expires_at - timezone.now()).total_seconds()
+            if remaining <= 0:
+                yield "event: ticket_expired\ndata: {}\n\n"
+                return
+            try:
+                message = await asyncio.wait_for(subscription.get(), timeout=min(HEARTBEAT_SECONDS, remaining))
+            except asyncio.TimeoutError:
+                yield ": keep-alive\n\n"
+                continue
+            yield format_event(message)
+    finally:
+        hub.unsubscribe(subscription)
+
+
+async def lobby_events(request):
+    """
+    Server-Sent Events channel pushing visit changes to lobby boards.
+
+    Events: approved, checked_in, checked_out, no_show, canceled, converted,
+    walkin, each carrying the affected visit ids; and resync when a client
+    fell too far behind and should refetch its board.
+    """
+    if not isinstance(request, ASGIRequest):
+        # A sync worker would have to buffer the endless stream
+        return JsonResponse({'error': 'Event streams require an ASGI server.'}, status=501)
+
+    try:
+        user, expires_at = await sync_to_async(authenticate_stream)(request)
+    except AuthenticationFailed as e:
+        return JsonResponse({'error': str(e.detail)}, status=401)
+    if user is None:
+        return JsonResponse({'error': 'You do not have permission to perform this action.'}, status=403)
+
+    logger.info(f"Lobby event stream opened by {user.username} ({hub.subscriber_count + 1} connected)")
+    response = StreamingHttpResponse(event_stream(expires_at), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
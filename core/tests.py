@@ -1,3 +1,1083 @@
-from django.test import TestCase
+from datetime import timedelta
+from django.apps import apps as django_apps
+from django.contrib.auth.models import User, Group
+from django.core import mail, signing
+from django.core.management import call_command
+from django.db import OperationalError, connection
+from django.db.models import QuerySet
+from django.test import AsyncClient, RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+from openpyxl import load_workbook
+from .models import Visitor, VisitRequest, VisitLog, VisitEvent, JobWatermark, OutboundEmail, ReportExport, DailyVisitStats
+from .deltas import format_watermark
+from .imports import IMPORT_LOCK_TIMEOUT
+from .outbox import dispatch_outbox, enqueue_email
+from .reports import EXPORT_LEASE_TIMEOUT
+from .rollups import rebuild_daily_stats
+from .search import fulltext_indexed, search_visits
+from .streams import STREAM_TICKET_MAX_AGE, authenticate_stream, issue_stream_ticket
+from .tokens import RoleRefreshToken
+from .transitions import BULK_MAX_IDS, NOT_FOUND, TransitionRefused, check_in, check_out, transition
+from collections import Counter
+import csv
+import email_validator
+import importlib
+import io
+import json
+import random
+import tempfile
+import threading
+import time
+from unittest import mock
 
-# Create your tests here.
+
+class VisitTestCase(TestCase):
+    """Users, API clients and visit factories shared by the API tests"""
+
+    def setUp(self):
+        self.host = User.objects.create_user('host', 'host@example.com', 'pw', first_name='Hannah', last_name='Host')
+        self.attendant = User.objects.create_user('attendant', 'attendant@example.com', 'pw')
+        self.attendant.groups.add(Group.objects.create(name='lobby_attendant'))
+        self.host_client = APIClient()
+        self.host_client.force_authenticate(self.host)
+        self.lobby_client = APIClient()
+        self.lobby_client.force_authenticate(self.attendant)
+
+    def create_visits(self, count, scheduled_time=None, host=None, purpose='Business meeting', status='approved', **fields):
+        visits = []
+        for number in range(count):
+            visitor = Visitor.objects.create(full_name=f'Visitor {number}', email=f'visitor{number}@example.com')
+            visits.append(VisitRequest.objects.create(
+                visitor=visitor,
+                employee=host or self.host,
+                purpose=purpose,
+                scheduled_time=scheduled_time or timezone.now() + timedelta(minutes=10),
+                status=status,
+                **fields
+            ))
+        return visits
+
+    def check_in(self, visit, check_out=False):
+        now = timezone.now()
+        return VisitLog.objects.create(
+            visitor=visit.visitor,
+            visit_request=visit,
+            check_in_time=now,
+            check_out_time=now if check_out else None
+        )
+
+    def skip_email_dns(self):
+        """Validate email syntax only; deliverability checks need DNS"""
+        validate_email = email_validator.validate_email
+
+        def skip_dns(email, **kwargs):
+            return validate_email(email, check_deliverability=False)
+
+        patcher = mock.patch('email_validator.validate_email', skip_dns)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def assertConstantQueries(self, client, url, grow):
+        """Request `url`, call grow() to add rows, and request it again with the same query count"""
+        with CaptureQueriesContext(connection) as first:
+            client.get(url)
+        grow()
+        with self.assertNumQueries(len(first)):
+            return client.get(url)
+
+
+class ExpirySweeperTests(VisitTestCase):
+    def test_sweep_expires_overdue_pending_requests_in_batches(self):
+        overdue = self.create_visits(5, scheduled_time=timezone.now() - timedelta(hours=1), status='pending')
+        upcoming = self.create_visits(1, status='pending')[0]
+        approved = self.create_visits(1, scheduled_time=timezone.now() - timedelta(hours=1))[0]
+
+        with CaptureQueriesContext(connection) as queries:
+            call_command('expire_visit_requests', '--batch-size', '2', stdout=io.StringIO())
+        update = f'UPDATE {connection.ops.quote_name(VisitRequest._meta.db_table)}'
+        updates = [query for query in queries if query['sql'].startswith(update)]
+        self.assertEqual(len(updates), 3)
+
+        self.assertEqual(VisitRequest.objects.filter(id__in=[visit.id for visit in overdue], status='expired').count(), 5)
+        upcoming.refresh_from_db()
+        approved.refresh_from_db()
+        self.assertEqual((upcoming.status, approved.status), ('pending', 'approved'))
+
+        watermark = JobWatermark.objects.get(name='expire_visit_requests')
+        self.assertEqual(watermark.last_processed, 5)
+        out = io.StringIO()
+        call_command('expire_visit_requests', '--status', stdout=out)
+        self.assertIn('expired 5 visit requests', out.getvalue())
+
+    def test_reading_visit_requests_does_not_expire_them(self):
+        overdue = self.create_visits(1, scheduled_time=timezone.now() - timedelta(hours=1), status='pending')[0]
+
+        response = self.host_client.get('/api/visit-requests/')
+        self.assertEqual(response.status_code, 200)
+        overdue.refresh_from_db()
+        self.assertEqual(overdue.status, 'pending')
+
+    def test_dry_run_changes_nothing(self):
+        self.create_visits(2, scheduled_time=timezone.now() - timedelta(hours=1), status='pending')
+
+        out = io.StringIO()
+        call_command('expire_visit_requests', '--dry-run', stdout=out)
+        self.assertIn('Would expire 2 visit requests', out.getvalue())
+        self.assertEqual(VisitRequest.objects.filter(status='pending').count(), 2)
+        self.assertFalse(JobWatermark.objects.exists())
+
+
+class OutboxTests(VisitTestCase):
+    def test_approval_email_is_queued_and_delivered_by_the_dispatcher(self):
+        visit = self.create_visits(1, status='pending')[0]
+
+        response = self.host_client.post(f'/api/visit-requests/{visit.id}/approve/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(mail.outbox), 0)
+        queued = OutboundEmail.objects.get()
+        self.assertEqual((queued.status, queued.recipients), ('pending', ['visitor0@example.com']))
+
+        call_command('dispatch_outbox', '--once', stdout=io.StringIO())
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ['visitor0@example.com'])
+        queued.refresh_from_db()
+        self.assertEqual((queued.status, queued.attempts), ('sent', 1))
+
+    def test_failed_delivery_is_retried_with_backoff_then_dead_lettered(self):
+        email = enqueue_email('Subject', 'Body', ['guest@example.com'])
+
+        with mock.patch('core.outbox.EmailMessage.send', side_effect=OSError('connection refused')):
+            self.assertEqual(dispatch_outbox(max_attempts=2, backoff_seconds=60), (0, 1))
+            email.refresh_from_db()
+            self.assertEqual((email.status, email.attempts), ('pending', 1))
+            self.assertGreater(email.next_attempt_at, timezone.now() + timedelta(seconds=50))
+            # Not due yet, so the next run leaves it alone
+            self.assertEqual(dispatch_outbox(max_attempts=2, backoff_seconds=60), (0, 0))
+
+            OutboundEmail.objects.filter(pk=email.pk).update(next_attempt_at=timezone.now())
+            self.assertEqual(dispatch_outbox(max_attempts=2, backoff_seconds=60), (0, 1))
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.attempts, email.last_error), ('dead', 2, 'connection refused'))
+        self.assertEqual(dispatch_outbox(), (0, 0))
+        self.assertEqual(len(mail.outbox), 0)
+
+
+class LobbyBoardQueryTests(VisitTestCase):
+    def test_today_visitors_query_count_is_constant(self):
+        self.create_visits(1, scheduled_time=timezone.now())
+
+        def grow():
+            visits = self.create_visits(10, scheduled_time=timezone.now())
+            self.check_in(visits[0])
+            self.check_in(visits[1], check_out=True)
+
+        response = self.assertConstantQueries(self.lobby_client, '/api/lobby/today-visitors/', grow)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()), 11)
+        self.assertEqual(sum(row['is_checked_in'] for row in response.json()), 2)
+
+    def test_my_visitors_query_count_is_constant(self):
+        self.create_visits(1)
+
+        def grow():
+            visits = self.create_visits(10)
+            self.check_in(visits[0])
+            self.check_in(visits[1], check_out=True)
+
+        response = self.assertConstantQueries(self.host_client, '/api/my-visitors/', grow)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()), 11)
+        self.assertEqual(sum(row['is_checked_in'] for row in response.json()), 2)
+
+
+class TodayAllVisitsTests(VisitTestCase):
+    url = '/api/lobby/today-all-visits/'
+
+    def test_query_count_is_constant(self):
+        self.create_visits(1, scheduled_time=timezone.now())
+
+        def grow():
+            visits = self.create_visits(10, scheduled_time=timezone.now())
+            self.check_in(visits[0], check_out=True)
+            VisitRequest.objects.create(employee=self.host, purpose='Form not sent back', scheduled_time=timezone.now())
+
+        response = self.assertConstantQueries(self.lobby_client, self.url, grow)
+        self.assertEqual(len(response.json()), 12)
+        self.assertIn('', [row['visitor_name'] for row in response.json()])
+
+    def test_wide_range_is_streamed_as_the_same_json_array(self):
+        today = timezone.localdate()
+        for days in (-9, 0, 9):
+            self.create_visits(2, scheduled_time=timezone.now() + timedelta(days=days))
+        params = {'start_date': str(today - timedelta(days=10)), 'end_date': str(today + timedelta(days=10))}
+
+        response = self.lobby_client.get(self.url, params)
+        self.assertTrue(response.streaming)
+        rows = json.loads(b''.join(response.streaming_content))
+        self.assertEqual(len(rows), 6)
+        self.assertEqual(set(rows[0]), {
+            'visit_id', 'visitor_id', 'visitor_name', 'visitor_email', 'employee_name', 'purpose',
+            'scheduled_time', 'visit_type', 'status', 'is_checked_in', 'check_in_time',
+            'is_checked_out', 'check_out_time', 'mark_no_show_after', 'no_show_at',
+        })
+
+        response = self.lobby_client.get(self.url, {'start_date': str(today), 'end_date': str(today)})
+        self.assertFalse(response.streaming)
+        # Visits created today are listed whatever their scheduled day
+        self.assertEqual(len(response.json()), 6)
+
+    def test_invalid_date_is_rejected(self):
+        response = self.lobby_client.get(self.url, {'start_date': '2024-13-01'})
+        self.assertEqual(response.status_code, 400)
+
+
+class ReportCounterTests(VisitTestCase):
+    def test_counters_and_hourly_histogram(self):
+        ten = timezone.localtime().replace(hour=10, minute=0, second=0, microsecond=0)
+        # The counters are read from the daily rollup, refreshed on commit
+        with self.captureOnCommitCallbacks(execute=True):
+            inside, left, waiting = self.create_visits(3, scheduled_time=ten)
+            self.check_in(inside)
+            self.check_in(left, check_out=True)
+            self.create_visits(1, scheduled_time=ten.replace(hour=14), status='no_show')
+        today = str(ten.date())
+        url = f'/api/generate-reports/?start_date={today}&end_date={today}'
+
+        def grow():
+            with self.captureOnCommitCallbacks(execute=True):
+                self.create_visits(5, scheduled_time=ten.replace(hour=16), status='rejected')
+
+        data = self.assertConstantQueries(self.lobby_client, url, grow).json()
+        self.assertEqual(
+            [data[key] for key in ('totalVisitors', 'checkedInVisitors', 'checkedOutVisitors', 'noShowVisitors', 'pendingVisitors')],
+            [9, 1, 1, 1, 1]
+        )
+        histogram = {row['hour']: row['count'] for row in data['hourlyDistribution']}
+        self.assertEqual(len(histogram), 24)
+        self.assertEqual((histogram[10], histogram[14], histogram[16], histogram[9]), (3, 1, 5, 0))
+        self.assertEqual(data['peakHours'], '16:00')
+        self.assertEqual(len(data['visitors']), 9)
+
+
+class ReportDownloadTests(VisitTestCase):
+    def download(self, **params):
+        response = self.lobby_client.get('/api/download-reports/', {'start_date': str(timezone.localdate()), **params})
+        self.assertTrue(response.streaming)
+        return list(csv.reader(io.StringIO(b''.join(response.streaming_content).decode())))
+
+    def test_csv_is_streamed_from_one_joined_query(self):
+        now = timezone.now()
+        visits = self.create_visits(3, scheduled_time=now)
+        log = self.check_in(visits[0], check_out=True)
+
+        with CaptureQueriesContext(connection) as queries:
+            rows = self.download(format='csv')
+        self.assertEqual(len([query for query in queries if VisitRequest._meta.db_table in query['sql']]), 1)
+        self.assertEqual(rows[0][:2], ['Visitor Name', 'Employee Name'])
+        self.assertEqual(len(rows), 4)
+        checked_out = [row for row in rows[1:] if row[0] == 'Visitor 0'][0]
+        self.assertEqual(checked_out[1:4], ['host', now.strftime('%Y-%m-%d %H:%M:%S'), 'approved'])
+        self.assertEqual(checked_out[5], log.check_out_time.strftime('%Y-%m-%d %H:%M:%S'))
+        self.assertEqual([row[4] for row in rows[1:] if row[0] != 'Visitor 0'], ['', ''])
+
+    def test_csv_applies_report_filters(self):
+        visits = self.create_visits(3, scheduled_time=timezone.now())
+        self.check_in(visits[1])
+
+        rows = self.download(format='csv', status='checked_in')
+        self.assertEqual([row[0] for row in rows[1:]], ['Visitor 1'])
+
+    def test_xlsx_is_written_in_write_only_mode_with_local_times(self):
+        now = timezone.now().replace(microsecond=0)
+        visits = self.create_visits(2, scheduled_time=now)
+        self.check_in(visits[1])
+
+        response = self.lobby_client.get('/api/download-reports/', {'start_date': str(timezone.localdate()), 'format': 'xlsx'})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('visitor_report_', response['Content-Disposition'])
+        sheet = load_workbook(io.BytesIO(b''.join(response.streaming_content)))['Visitor Report']
+        rows = list(sheet.values)
+        self.assertEqual(rows[0][0], 'Visitor Name')
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(rows[1][2], timezone.localtime(now).replace(tzinfo=None))
+        self.assertEqual(sorted(row[4] is not None for row in rows[1:]), [False, True])
+
+
+@override_settings(REPORT_EXPORT_DIR=tempfile.mkdtemp())
+class ReportExportLeaseTests(VisitTestCase):
+    def test_abandoned_running_export_is_failed_and_not_joined(self):
+        self.create_visits(2, scheduled_time=timezone.now() - timedelta(hours=1))
+        response = self.lobby_client.post('/api/report-exports/', {'format': 'csv'}, format='json')
+        abandoned = ReportExport.objects.get(pk=response.json()['job_id'])
+        # A worker claimed the job and died
+        ReportExport.objects.filter(pk=abandoned.pk).update(
+            status='running',
+            started_at=timezone.now() - EXPORT_LEASE_TIMEOUT - timedelta(minutes=1)
+        )
+
+        response = self.lobby_client.post('/api/report-exports/', {'format': 'csv'}, format='json')
+        self.assertEqual(response.status_code, 202)
+        self.assertNotEqual(response.json()['job_id'], str(abandoned.pk))
+
+        call_command('process_report_exports', '--once', stdout=io.StringIO())
+        abandoned.refresh_from_db()
+        self.assertEqual(abandoned.status, 'failed')
+        fresh = ReportExport.objects.get(pk=response.json()['job_id'])
+        self.assertEqual((fresh.status, fresh.row_count), ('done', 2))
+
+    def test_running_export_within_lease_is_joined(self):
+        response = self.lobby_client.post('/api/report-exports/', {'format': 'csv'}, format='json')
+        ReportExport.objects.filter(pk=response.json()['job_id']).update(status='running', started_at=timezone.now())
+        again = self.lobby_client.post('/api/report-exports/', {'format': 'csv'}, format='json')
+        self.assertEqual(again.json()['job_id'], response.json()['job_id'])
+
+    def test_export_jobs_are_only_visible_to_their_requester(self):
+        other = User.objects.create_user('other', 'other@example.com', 'pw')
+        other.groups.add(Group.objects.get(name='lobby_attendant'))
+        other_client = APIClient()
+        other_client.force_authenticate(other)
+        self.create_visits(1, scheduled_time=timezone.now() - timedelta(hours=1))
+        job_id = self.lobby_client.post('/api/report-exports/', {'format': 'csv', 'employee': 'host'}, format='json').json()['job_id']
+        call_command('process_report_exports', '--once', stdout=io.StringIO())
+
+        self.assertEqual(self.lobby_client.get(f'/api/report-exports/{job_id}/download/').status_code, 200)
+        self.assertEqual(other_client.get(f'/api/report-exports/{job_id}/').status_code, 404)
+        self.assertEqual(other_client.get(f'/api/report-exports/{job_id}/download/').status_code, 404)
+        # The same export by another attendant is their own job, not the cached one
+        response = other_client.post('/api/report-exports/', {'format': 'csv', 'employee': 'host'}, format='json')
+        self.assertEqual(response.status_code, 202)
+        self.assertNotEqual(response.json()['job_id'], job_id)
+
+
+class DailyVisitStatsTests(VisitTestCase):
+    def setUp(self):
+        super().setUp()
+        self.other = User.objects.create_user('other', 'other@example.com', 'pw')
+        now = timezone.now()
+        with self.captureOnCommitCallbacks(execute=True):
+            for host, days_ago in ((self.host, 0), (self.host, 3), (self.other, 0)):
+                visits = self.create_visits(4, scheduled_time=now - timedelta(days=days_ago), host=host)
+                self.check_in(visits[0], check_out=True)
+                self.check_in(visits[1])
+                visits[2].status = 'no_show'
+                visits[2].save()
+            moved = VisitRequest.objects.filter(employee=self.other).first()
+            moved.employee = self.host
+            moved.save()
+            VisitLog.objects.filter(visit_request__employee=self.other).delete()
+
+    def raw_cells(self):
+        """Cells counted row by row from the visits and their visit logs"""
+        cells = Counter()
+        for visit in VisitRequest.objects.all():
+            key = (timezone.localdate(visit.scheduled_time), visit.employee_id, visit.visit_type, visit.status)
+            log = VisitLog.objects.filter(visit_request=visit).first()
+            cells[key + ('visit_count',)] += 1
+            cells[key + ('checked_in_count',)] += bool(log and log.check_in_time)
+            cells[key + ('checked_out_count',)] += bool(log and log.check_out_time)
+        return +cells
+
+    def rollup_cells(self):
+        cells = Counter()
+        for cell in DailyVisitStats.objects.all():
+            key = (cell.date, cell.employee_id, cell.visit_type, cell.status)
+            for field in ('visit_count', 'checked_in_count', 'checked_out_count'):
+                cells[key + (field,)] += getattr(cell, field)
+        return +cells
+
+    def test_incremental_refresh_matches_raw_visit_logs(self):
+        self.assertEqual(self.rollup_cells(), self.raw_cells())
+
+    def test_rebuild_and_migration_backfill_match_raw_visit_logs(self):
+        raw = self.raw_cells()
+        today = timezone.localdate()
+        DailyVisitStats.objects.all().delete()
+        rebuild_daily_stats(today - timedelta(days=7), today)
+        self.assertEqual(self.rollup_cells(), raw)
+
+        DailyVisitStats.objects.all().delete()
+        migration = importlib.import_module('core.migrations.0010_daily_visit_stats')
+        migration.backfill_daily_stats(django_apps, None)
+        self.assertEqual(self.rollup_cells(), raw)
+
+    def test_reports_use_the_rollup_with_raw_totals(self):
+        today = str(timezone.localdate())
+        data = self.lobby_client.get(f'/api/generate-reports/?start_date={today}&end_date={today}').json()
+        self.assertEqual(
+            [data[key] for key in ('totalVisitors', 'checkedInVisitors', 'checkedOutVisitors', 'noShowVisitors', 'pendingVisitors')],
+            [8, 1, 1, 2, 4]
+        )
+
+    def test_host_pending_count_skips_visits_without_visitor_details(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            VisitRequest.objects.create(employee=self.host, purpose='Form not sent back', scheduled_time=timezone.now(), status='approved')
+
+        metrics = {metric['label']: metric['value'] for metric in self.host_client.get('/api/dashboard-metrics/').json()}
+        self.assertEqual(metrics['Total Visit Requests'], 10)
+        self.assertEqual(metrics['Pending Check-in'], 3)
+        self.assertEqual(metrics['Active Visitors'], 2)
+
+
+class DashboardAnalyticsQueryTests(VisitTestCase):
+    def create_day(self, host, count):
+        """Visits two hours ago, half of them checked out, with the rollup refreshed"""
+        scheduled_time = timezone.now() - timedelta(hours=2)
+        with self.captureOnCommitCallbacks(execute=True):
+            visits = self.create_visits(count, scheduled_time=scheduled_time, host=host)
+            for visit in visits[:count // 2]:
+                VisitLog.objects.create(
+                    visitor=visit.visitor,
+                    visit_request=visit,
+                    check_in_time=scheduled_time + timedelta(minutes=5),
+                    check_out_time=scheduled_time + timedelta(hours=1)
+                )
+
+    def test_query_count_does_not_grow_with_employees(self):
+        self.create_day(self.host, 2)
+
+        def grow():
+            for number in range(3):
+                other = User.objects.create_user(f'host{number}', f'host{number}@example.com', 'pw')
+                self.create_day(other, 4)
+
+        response = self.assertConstantQueries(self.lobby_client, '/api/dashboard-analytics/', grow)
+        self.assertGreater(DailyVisitStats.objects.values('employee').distinct().count(), 1)
+        data = response.json()
+        self.assertEqual(data['totalVisitRequests'], 14)
+        self.assertEqual(data['checkedOutVisitors'], 7)
+        self.assertEqual(len(data['topEmployees']), 4)
+        self.assertEqual(data['averageCheckInTime'], '5 min late')
+        self.assertEqual(data['averageDwellTime'], '55 min')
+
+
+class ActivityTimelineTests(VisitTestCase):
+    def test_cursor_pages_cover_rows_with_equal_timestamps_once(self):
+        moment = timezone.now() - timedelta(hours=1)
+        for visit in self.create_visits(5, scheduled_time=moment):
+            VisitEvent.record(visit, 'checked_in', actor=self.attendant, at=moment)
+            VisitEvent.record(visit, 'checked_out', actor=self.attendant, at=moment)
+
+        seen = []
+        cursor = None
+        while True:
+            params = {'page_size': 3, **({'cursor': cursor} if cursor else {})}
+            data = self.lobby_client.get('/api/recent-activities/', params).json()
+            seen += [activity['id'] for activity in data['results']]
+            cursor = data['next_cursor']
+            if cursor is None:
+                break
+
+        self.assertEqual(len(seen), 10)
+        self.assertEqual(len(set(seen)), 10)
+        # Same time: kind descending, then id descending
+        def event_ids(event_type):
+            return sorted(VisitEvent.objects.filter(event_type=event_type).values_list('id', flat=True), reverse=True)
+        self.assertEqual(seen, [f'checkout_{id}' for id in event_ids('checked_out')] + [f'checkin_{id}' for id in event_ids('checked_in')])
+
+    def test_malformed_cursor_is_rejected(self):
+        response = self.lobby_client.get('/api/recent-activities/', {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 400)
+
+
+class VisitEventTests(VisitTestCase):
+    def events(self, visit):
+        return list(visit.events.order_by('id').values_list('event_type', 'actor__username'))
+
+    def test_approval_and_lobby_transitions_append_events(self):
+        visit = self.create_visits(1, status='pending')[0]
+
+        self.host_client.post(f'/api/visit-requests/{visit.id}/approve/')
+        self.lobby_client.post('/api/lobby/checkin/', {'visitor_id': visit.visitor_id}, format='json')
+        self.lobby_client.post('/api/lobby/checkout/', {'visitor_id': visit.visitor_id}, format='json')
+
+        self.assertEqual(self.events(visit), [
+            ('approved', 'host'),
+            ('checked_in', 'attendant'),
+            ('checked_out', 'attendant'),
+        ])
+        self.assertEqual(set(visit.events.values_list('host_id', flat=True)), {self.host.id})
+
+    def test_sweeper_logs_exactly_the_expired_rows(self):
+        overdue = self.create_visits(3, scheduled_time=timezone.now() - timedelta(hours=1), status='pending')
+        self.create_visits(1, status='pending')
+
+        call_command('expire_visit_requests', '--batch-size', '2', stdout=io.StringIO())
+
+        expired = VisitEvent.objects.filter(event_type='expired')
+        self.assertEqual(sorted(expired.values_list('visit_id', flat=True)), [visit.id for visit in overdue])
+        self.assertFalse(expired.filter(actor__isnull=False).exists())
+
+    def test_history_outlives_the_visit(self):
+        visit = self.create_visits(1, status='pending')[0]
+        self.host_client.post(f'/api/visit-requests/{visit.id}/reject/')
+        visit_id = visit.id
+        visit.delete()
+
+        self.assertEqual(list(VisitEvent.objects.filter(visit_id=visit_id).values_list('event_type', flat=True)), ['rejected'])
+
+
+class LobbyEventStreamTests(VisitTestCase):
+    def test_ticket_is_issued_to_lobby_attendants_only(self):
+        self.assertEqual(self.host_client.post('/api/lobby/events/ticket/').status_code, 403)
+
+        response = self.lobby_client.post('/api/lobby/events/ticket/')
+        self.assertEqual(response.json()['expires_in'], STREAM_TICKET_MAX_AGE)
+        request = RequestFactory().get('/api/lobby/events/', {'ticket': response.json()['ticket']})
+        user, expires_at = authenticate_stream(request)
+        self.assertEqual(user, self.attendant)
+        self.assertGreater(expires_at, timezone.now())
+
+    def test_access_tokens_and_stale_tickets_are_refused(self):
+        access = str(RefreshToken.for_user(self.attendant).access_token)
+        stale = issue_stream_ticket(self.attendant)
+        forged = signing.TimestampSigner().sign(str(self.attendant.pk))
+
+        for params in ({'token': access}, {'ticket': access}, {'ticket': forged}):
+            with self.assertRaises(AuthenticationFailed):
+                authenticate_stream(RequestFactory().get('/api/lobby/events/', params))
+        with mock.patch('core.streams.STREAM_TICKET_MAX_AGE', -1), self.assertRaises(AuthenticationFailed):
+            authenticate_stream(RequestFactory().get('/api/lobby/events/', {'ticket': stale}))
+
+    async def test_stream_rejects_a_missing_ticket(self):
+        response = await AsyncClient().get('/api/lobby/events/')
+        self.assertEqual(response.status_code, 401)
+
+
+class DeltaSyncTests(VisitTestCase):
+    url = '/api/visit-requests/pending-approvals/'
+
+    def test_delta_returns_changes_removals_and_tombstones(self):
+        approved, deleted, untouched = self.create_visits(3, status='pending')
+        watermark = self.host_client.get(self.url)['X-Watermark']
+        VisitRequest.objects.update(updated_at=timezone.now() - timedelta(minutes=1))
+
+        self.host_client.post(f'/api/visit-requests/{approved.id}/approve/')
+        self.assertEqual(self.host_client.delete(f'/api/visit-requests/{deleted.id}/').status_code, 204)
+        created = self.create_visits(1, status='pending')[0]
+
+        data = self.host_client.get(self.url, {'since': watermark}).json()
+        self.assertEqual([row['id'] for row in data['changed']], [created.id])
+        self.assertEqual(data['removed'], sorted([approved.id, deleted.id]))
+        self.assertNotIn(untouched.id, [row['id'] for row in data['changed']] + data['removed'])
+        self.assertIn('watermark', data)
+
+    def test_since_overlaps_the_watermark(self):
+        inside, outside = self.create_visits(2, status='pending')
+        watermark = timezone.now()
+        VisitRequest.objects.filter(id=inside.id).update(updated_at=watermark - timedelta(seconds=3))
+        VisitRequest.objects.filter(id=outside.id).update(updated_at=watermark - timedelta(seconds=10))
+
+        data = self.host_client.get(self.url, {'since': format_watermark(watermark)}).json()
+        self.assertEqual([row['id'] for row in data['changed']], [inside.id])
+
+    def test_invalid_watermark_is_rejected(self):
+        response = self.host_client.get(self.url, {'since': '2024-01-01T00:00:00'})
+        self.assertEqual(response.status_code, 400)
+
+
+class ConditionalGetTests(VisitTestCase):
+    def revalidate(self, client, url, etag):
+        return client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+    def test_board_revalidates_until_a_visit_changes(self):
+        url = '/api/lobby/today-visitors/'
+        visit = self.create_visits(2)[0]
+        etag = self.lobby_client.get(url)['ETag']
+
+        response = self.revalidate(self.lobby_client, url, etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+
+        self.lobby_client.post('/api/lobby/checkin/', {'visitor_id': visit.visitor_id}, format='json')
+        response = self.revalidate(self.lobby_client, url, etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(self.revalidate(self.lobby_client, url, response['ETag']).status_code, 304)
+
+    def test_employee_list_revalidates_after_a_rename(self):
+        url = '/api/employees/'
+        self.host.groups.add(Group.objects.create(name='employee'))
+        self.create_visits(1)
+        etag = self.lobby_client.get(url)['ETag']
+        self.assertEqual(self.revalidate(self.lobby_client, url, etag).status_code, 304)
+
+        User.objects.filter(id=self.host.id).update(last_name='Hostile')
+        response = self.revalidate(self.lobby_client, url, etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()[0]['display_name'], 'Hannah Hostile (host)')
+
+
+class RoleClaimTests(VisitTestCase):
+    def refresh(self, refresh_token):
+        response = APIClient().post('/api/token/refresh/', {'refresh': str(refresh_token)}, format='json')
+        self.assertEqual(response.status_code, 200)
+        return AccessToken(response.json()['access'])
+
+    def test_refreshed_access_tokens_carry_current_roles(self):
+        refresh = RoleRefreshToken.for_user(self.attendant)
+        self.assertEqual(refresh['roles'], ['lobby_attendant'])
+        self.assertEqual(self.refresh(refresh)['roles'], ['lobby_attendant'])
+
+        self.attendant.groups.clear()
+        self.assertEqual(self.refresh(RoleRefreshToken.for_user(self.host))['roles'], [])
+        self.assertEqual(self.refresh(refresh)['roles'], [])
+
+    def test_lobby_permission_reads_the_claim_without_a_group_query(self):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {RoleRefreshToken.for_user(self.attendant).access_token}')
+
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get('/api/lobby/today-visitors/')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse([query for query in queries if 'auth_group' in query['sql']])
+
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {RoleRefreshToken.for_user(self.host).access_token}')
+        self.assertEqual(client.get('/api/lobby/today-visitors/').status_code, 403)
+
+
+class StatelessAuthenticationTests(VisitTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {RoleRefreshToken.for_user(self.host).access_token}')
+
+    def test_reads_skip_the_user_row(self):
+        self.create_visits(2)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/my-visitors/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()), 2)
+        self.assertFalse([query for query in queries if 'FROM "auth_user"' in query['sql']])
+
+    def test_writes_are_refused(self):
+        for method in ('post', 'put', 'delete'):
+            response = getattr(self.client, method)('/api/my-visitors/')
+            self.assertEqual(response.status_code, 403)
+
+        # Regular endpoints still authenticate the same token against the database
+        visit = self.create_visits(1, status='pending')[0]
+        self.assertEqual(self.client.post(f'/api/visit-requests/{visit.id}/approve/').status_code, 200)
+
+
+class BulkActionTests(VisitTestCase):
+    def post(self, client, url, visit_ids):
+        response = client.post(url, {'visit_ids': visit_ids}, format='json')
+        return response.status_code, response.json()
+
+    def results(self, data):
+        return {row['visit_id']: row['result'] for row in data['results']}
+
+    def test_bulk_approve_reports_partial_failures(self):
+        pending, done = self.create_visits(2, status='pending')
+        done.status = 'rejected'
+        done.save()
+        incomplete = VisitRequest.objects.create(employee=self.host, purpose='Interview', scheduled_time=timezone.now(), status='pending')
+
+        status_code, data = self.post(self.host_client, '/api/visit-requests/bulk/approve/', [pending.id, done.id, incomplete.id, 999999])
+        self.assertEqual(status_code, 200)
+        self.assertEqual(data['updated'], 1)
+        self.assertEqual(self.results(data), {
+            pending.id: 'ok',
+            done.id: 'already rejected',
+            incomplete.id: 'visitor information not completed',
+            999999: 'not_found',
+        })
+        self.assertEqual(list(VisitRequest.objects.filter(status='approved').values_list('id', flat=True)), [pending.id])
+        self.assertEqual(OutboundEmail.objects.count(), 1)
+
+    def test_bulk_no_show_skips_visitors_who_checked_in(self):
+        absent, present, left = self.create_visits(3, scheduled_time=timezone.now() - timedelta(hours=1))
+        self.check_in(present)
+        self.check_in(left, check_out=True)
+
+        status_code, data = self.post(self.lobby_client, '/api/visit-requests/bulk/no-show/', [absent.id, present.id, left.id])
+        self.assertEqual(self.results(data), {absent.id: 'ok', present.id: 'already checked in', left.id: 'already checked in'})
+        self.assertEqual(list(VisitRequest.objects.filter(status='no_show').values_list('id', flat=True)), [absent.id])
+
+    def test_bulk_check_in_and_out(self):
+        first, second = self.create_visits(2)
+        self.check_in(second)
+
+        status_code, data = self.post(self.lobby_client, '/api/lobby/bulk/checkin/', [first.id, second.id])
+        self.assertEqual(self.results(data), {first.id: 'ok', second.id: 'already checked in'})
+        status_code, data = self.post(self.lobby_client, '/api/lobby/bulk/checkout/', [first.id, second.id])
+        self.assertEqual(data['updated'], 2)
+        self.assertEqual(VisitLog.objects.filter(check_out_time__isnull=False).count(), 2)
+
+    def test_id_list_is_validated_and_capped(self):
+        url = '/api/visit-requests/bulk/no-show/'
+        self.assertEqual(self.post(self.lobby_client, url, [])[0], 400)
+        self.assertEqual(self.post(self.lobby_client, url, ['x'])[0], 400)
+        self.assertEqual(self.post(self.lobby_client, url, list(range(1, BULK_MAX_IDS + 1)))[0], 200)
+
+        status_code, data = self.post(self.lobby_client, url, list(range(1, BULK_MAX_IDS + 2)))
+        self.assertEqual(status_code, 400)
+        self.assertIn(str(BULK_MAX_IDS), data['error'])
+
+
+class VisitorImportTests(VisitTestCase):
+    url = '/api/visit-requests/import/'
+
+    def setUp(self):
+        super().setUp()
+        self.skip_email_dns()
+
+    def post(self, visitors, query='', **params):
+        return self.host_client.post(self.url + query, {
+            'visitors': visitors,
+            'scheduled_time': (timezone.now() + timedelta(minutes=10)).isoformat(),
+            'purpose': 'Training day',
+            **params,
+        }, format='json')
+
+    def test_import_returns_check_in_tokens_and_emails_them(self):
+        response = self.post([{'full_name': 'Ann Lee', 'email': 'ann@example.com'}], send_invitations=True)
+        self.assertEqual(response.status_code, 201, response.content)
+        row = response.json()['visits'][0]
+
+        visit = VisitRequest.objects.select_related('visitor').get(pk=row['visit_id'])
+        self.assertEqual(row['checkin_token'], str(visit.token))
+        self.assertEqual((visit.status, visit.visitor.full_name), ('approved', 'Ann Lee'))
+        self.assertEqual(sorted(visit.events.values_list('event_type', flat=True)), ['approved', 'created'])
+        self.assertIn(f'Your check-in code: {visit.token}', OutboundEmail.objects.get().body)
+
+    def test_invalid_rows_import_nothing(self):
+        response = self.post([{'full_name': 'Ann Lee', 'email': 'ann@example.com'}, {'full_name': 'No Mail', 'email': 'nope'}])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([error['row'] for error in response.json()['details']], [2])
+        self.assertFalse(Visitor.objects.exists())
+
+    def test_ids_are_read_back_when_bulk_insert_returns_none(self):
+        rows = [
+            {'full_name': 'Ann Lee', 'email': 'ann@example.com'},
+            {'full_name': 'Bob Ray', 'email': 'bob@example.com'},
+            {'full_name': 'Ann Lee', 'email': 'ann@example.com'},
+        ]
+        no_returning = mock.PropertyMock(return_value=False)
+        with mock.patch.object(type(connection.features), 'can_return_rows_from_bulk_insert', no_returning):
+            response = self.post(rows, query='?format=csv')
+        self.assertEqual(response.status_code, 201, response.content)
+
+        lines = list(csv.reader(io.StringIO(response.content.decode())))
+        self.assertEqual(lines[0][-1], 'Check-in Token')
+        for line in lines[1:]:
+            visit = VisitRequest.objects.select_related('visitor').get(pk=line[1])
+            self.assertEqual((str(visit.token), visit.visitor.email), (line[-1], line[3]))
+        self.assertEqual(len({line[1] for line in lines[1:]}), 3)
+
+    def test_concurrent_import_for_the_same_host_is_refused(self):
+        held = mock.MagicMock()
+        held.return_value.__enter__.return_value = False
+        with mock.patch('core.imports.advisory_lock', held):
+            response = self.post([{'full_name': 'Ann Lee', 'email': 'ann@example.com'}])
+        self.assertEqual(response.status_code, 409)
+        held.assert_called_once_with(f'gpp.import_visitors.{self.host.id}', timeout=IMPORT_LOCK_TIMEOUT)
+        self.assertFalse(Visitor.objects.exists())
+
+
+class VisitorSearchTests(VisitTestCase):
+    url = '/api/lobby/visitors/search/'
+
+    def search(self, q):
+        return self.lobby_client.get(self.url, {'q': q}).json()
+
+    def test_prefix_search_merges_rows_of_returning_visitors(self):
+        Visitor.objects.create(full_name='Ann Lee', email='ann@example.com', contact='09170000001')
+        latest = Visitor.objects.create(full_name='Ann Lee', email='ann@example.com', contact='09170000002')
+        annabel = Visitor.objects.create(full_name='Annabel Cruz', email='cruz@example.com')
+        by_email = Visitor.objects.create(full_name='Bob Ray', email='ann.ray@example.com')
+        Visitor.objects.create(full_name='Joanne Ng', email='joanne@example.com')
+
+        results = self.search('ANN')
+        self.assertEqual([row['id'] for row in results], [latest.id, annabel.id, by_email.id])
+        self.assertEqual(results[0]['contact'], '09170000002')
+        self.assertEqual([row['id'] for row in self.search('0917')], [latest.id])
+        self.assertEqual(self.search('a'), [])
+
+    def test_walk_in_reuses_an_unchanged_returning_visitor(self):
+        self.skip_email_dns()
+        returning = Visitor.objects.create(full_name='Ann Lee', email='ann@example.com', contact='09171234567', address='Manila')
+
+        def walk_in(**details):
+            response = self.lobby_client.post('/api/lobby/walkin/', {
+                'visitor_id': returning.id,
+                'host_name': 'Hannah Host',
+                'purpose': 'Delivery',
+                **details,
+            }, format='json')
+            self.assertEqual(response.status_code, 201, response.content)
+            return VisitRequest.objects.get(pk=response.json()['visit_id']).visitor_id
+
+        self.assertEqual(walk_in(), returning.id)
+        edited = walk_in(contact='09181234567')
+        self.assertNotEqual(edited, returning.id)
+        returning.refresh_from_db()
+        self.assertEqual(returning.contact, '09171234567')
+
+
+class VisitSearchTests(VisitTestCase):
+    def search(self, query):
+        response = self.lobby_client.get('/api/visits/search/', {'q': query})
+        self.assertEqual(response.status_code, 200, response.content)
+        return [row['visit_id'] for row in response.json()]
+
+    def test_words_may_match_different_fields(self):
+        visit = self.create_visits(1, purpose='Budget meeting')[0]
+        Visitor.objects.filter(pk=visit.visitor_id).update(full_name='John Smith')
+        self.create_visits(1, purpose='Team meeting')
+
+        self.assertEqual(self.search('john meeting'), [visit.id])
+        self.assertEqual(self.search('hannah john budg'), [visit.id])
+        self.assertEqual(self.search('john lunch'), [])
+
+    def test_words_mysql_cannot_index_are_matched_with_like(self):
+        visit = self.create_visits(1, purpose='Meeting with the board')[0]
+        Visitor.objects.filter(pk=visit.visitor_id).update(full_name='Al Ng', email='al@example.com')
+        self.create_visits(1, purpose='Board review')
+
+        with mock.patch.object(connection, 'vendor', 'mysql'):
+            self.assertFalse(fulltext_indexed('the'))
+            self.assertFalse(fulltext_indexed('al'))
+            self.assertTrue(fulltext_indexed('board'))
+            queryset = search_visits(VisitRequest.objects.all(), 'al with com')
+            sql = str(queryset.query)
+        self.assertNotIn('MATCH', sql)
+        # Evaluated outside the patch, so SQLite runs the LIKE fallback
+        self.assertEqual(list(queryset.values_list('id', flat=True)), [visit.id])
+
+
+class ScanCheckInTests(VisitTestCase):
+    def scan(self, token):
+        return self.lobby_client.post(f'/api/lobby/scan/{token}/')
+
+    def test_scan_checks_in_once(self):
+        visit = self.create_visits(1)[0]
+
+        response = self.scan(visit.token)
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.json()['visit_id'], visit.id)
+        self.assertEqual(VisitLog.objects.get(visit_request=visit).checked_in_by, self.attendant)
+
+        response = self.scan(visit.token)
+        self.assertEqual((response.status_code, response.json()['code']), (400, 'ALREADY_CHECKED_IN'))
+        self.assertEqual(self.scan('00000000-0000-0000-0000-000000000000').status_code, 404)
+
+    def test_visitor_check_in_never_picks_a_visit_outside_the_window(self):
+        visit = self.create_visits(1, scheduled_time=timezone.now() - timedelta(days=5))[0]
+
+        response = self.lobby_client.post('/api/lobby/checkin/', {'visitor_id': visit.visitor_id}, format='json')
+        self.assertEqual((response.status_code, response.json()['code']), (404, 'NO_VISIT_IN_WINDOW'))
+        self.assertFalse(VisitLog.objects.exists())
+
+    def test_imported_visit_is_checked_in_with_its_token(self):
+        self.skip_email_dns()
+        response = self.host_client.post('/api/visit-requests/import/', {
+            'visitors': [{'full_name': 'Ann Lee', 'email': 'ann@example.com'}],
+            'scheduled_time': (timezone.now() + timedelta(minutes=10)).isoformat(),
+            'purpose': 'Training day',
+        }, format='json')
+        row = response.json()['visits'][0]
+
+        self.assertEqual(self.scan(row['checkin_token']).status_code, 200)
+        self.assertTrue(VisitLog.objects.filter(visit_request_id=row['visit_id'], check_in_time__isnull=False).exists())
+
+
+class TransitionTests(VisitTestCase):
+    def test_transition_applies_once(self):
+        visit = self.create_visits(1, status='pending')[0]
+
+        moved = transition(visit.id, ['pending'], 'approved', self.host)
+        self.assertEqual(moved.status, 'approved')
+        with self.assertRaisesMessage(TransitionRefused, 'already approved'):
+            transition(visit.id, ['pending'], 'approved', self.host)
+        self.assertEqual(VisitEvent.objects.filter(visit=visit, event_type='approved').count(), 1)
+
+    def test_refusal_reasons(self):
+        other_host = User.objects.create_user('other', 'other@example.com', 'pw')
+        foreign = self.create_visits(1, host=other_host, status='pending')[0]
+        unfilled = VisitRequest.objects.create(employee=self.host, purpose='Interview', scheduled_time=timezone.now(), status='pending')
+        own = VisitRequest.objects.filter(employee=self.host)
+
+        with self.assertRaisesMessage(TransitionRefused, NOT_FOUND):
+            transition(foreign.id, ['pending'], 'approved', self.host, scope=own)
+        with self.assertRaisesMessage(TransitionRefused, 'visitor information not completed'):
+            transition(unfilled.id, ['pending'], 'approved', self.host, scope=own, require_visitor=True)
+        self.assertFalse(VisitEvent.objects.exists())
+
+    def test_second_approval_is_refused(self):
+        visit = self.create_visits(1, status='pending')[0]
+
+        self.assertEqual(self.host_client.post(f'/api/visit-requests/{visit.id}/approve/').status_code, 200)
+        response = self.host_client.post(f'/api/visit-requests/{visit.id}/approve/')
+        self.assertEqual((response.status_code, response.json()['error']), (400, 'Visit is already approved.'))
+        self.assertEqual(OutboundEmail.objects.count(), 1)
+
+    def test_admin_action_moves_only_visits_still_in_the_source_status(self):
+        admin_user = User.objects.create_superuser('admin', 'admin@example.com', 'pw')
+        pending = self.create_visits(2, status='pending')
+        rejected = self.create_visits(1, status='rejected')[0]
+        self.client.force_login(admin_user)
+
+        response = self.client.post('/admin/core/visitrequest/', {
+            'action': 'approve_visits',
+            '_selected_action': [visit.id for visit in pending] + [rejected.id],
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(VisitRequest.objects.filter(id__in=[visit.id for visit in pending], status='approved').count(), 2)
+        rejected.refresh_from_db()
+        self.assertEqual(rejected.status, 'rejected')
+        events = VisitEvent.objects.filter(event_type='approved')
+        self.assertEqual(sorted(events.values_list('visit_id', flat=True)), [visit.id for visit in pending])
+        self.assertTrue(all(event.actor_id == admin_user.id for event in events))
+
+
+class CheckInTests(VisitTestCase):
+    def test_repeat_scan_after_window_is_already_checked_in(self):
+        visit = self.create_visits(1, scheduled_time=timezone.now() - timedelta(hours=2), visit_type='scheduled')[0]
+        self.check_in(visit)
+
+        response = self.lobby_client.post(f'/api/lobby/scan/{visit.token}/')
+        self.assertEqual((response.status_code, response.json()['code']), (400, 'ALREADY_CHECKED_IN'))
+
+    def test_scan_after_window_is_expired(self):
+        visit = self.create_visits(1, scheduled_time=timezone.now() - timedelta(hours=2), visit_type='scheduled')[0]
+
+        response = self.lobby_client.post(f'/api/lobby/scan/{visit.token}/')
+        self.assertEqual(response.json()['code'], 'EXPIRED')
+
+    def test_check_in_by_visit_id(self):
+        visit = self.create_visits(2)[1]
+
+        response = self.lobby_client.post('/api/lobby/checkin/', {'visit_id': visit.id}, format='json')
+        self.assertEqual((response.status_code, response.json()['visit_id']), (200, visit.id))
+        response = self.lobby_client.post('/api/lobby/checkin/', {'visit_id': visit.id}, format='json')
+        self.assertEqual((response.status_code, response.json()['code']), (400, 'ALREADY_CHECKED_IN'))
+
+
+class ConcurrentCheckInTests(TransactionTestCase):
+    THREADS = 4
+
+    def setUp(self):
+        self.attendant = User.objects.create_user('attendant', 'attendant@example.com', 'pw')
+        self.visits = [
+            VisitRequest.objects.create(
+                visitor=Visitor.objects.create(full_name=f'Visitor {number}', email=f'visitor{number}@example.com'),
+                employee=self.attendant,
+                purpose='Business meeting',
+                scheduled_time=timezone.now() + timedelta(minutes=10),
+                status='approved'
+            )
+            for number in range(3)
+        ]
+
+    def race(self, operation):
+        """Run operation(visit_id) on THREADS threads per visit at once; returns {visit_id: successes}"""
+        successes = {visit.id: 0 for visit in self.visits}
+        lock = threading.Lock()
+        barrier = threading.Barrier(self.THREADS * len(self.visits))
+
+        def worker(visit_id):
+            try:
+                barrier.wait()
+                for retry in range(20):
+                    try:
+                        operation(visit_id)
+                    except TransitionRefused:
+                        return
+                    except OperationalError:
+                        # SQLite reports a held write lock as "database is locked"
+                        time.sleep(random.uniform(0, 0.005 * 2 ** min(retry, 6)))
+                        continue
+                    with lock:
+                        successes[visit_id] += 1
+                    return
+            finally:
+                connection.close()
+
+        threads = [
+            threading.Thread(target=worker, args=(visit.id,))
+            for visit in self.visits for _ in range(self.THREADS)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return successes
+
+    def test_racing_check_ins_and_check_outs_succeed_once(self):
+        checked_in = self.race(lambda visit_id: check_in(self.attendant, id=visit_id))
+        checked_out = self.race(lambda visit_id: check_out(visit_id, self.attendant))
+
+        for visit in self.visits:
+            self.assertEqual((checked_in[visit.id], checked_out[visit.id]), (1, 1))
+            log = VisitLog.objects.get(visit_request=visit)
+            self.assertIsNotNone(log.check_in_time)
+            self.assertIsNotNone(log.check_out_time)
+            for event_type in ('checked_in', 'checked_out'):
+                self.assertEqual(VisitEvent.objects.filter(visit=visit, event_type=event_type).count(), 1)
+
+
+class NoShowSweeperTests(VisitTestCase):
+    def sweep(self, *args):
+        out = io.StringIO()
+        call_command('mark_no_shows', *args, stdout=out)
+        return out.getvalue()
+
+    def test_sweep_marks_overdue_visits_in_skip_locked_batches(self):
+        overdue = self.create_visits(5, scheduled_time=timezone.now() - timedelta(hours=1), visit_type='scheduled')
+        arrived, walk_in = self.create_visits(2, scheduled_time=timezone.now() - timedelta(hours=1), visit_type='scheduled')
+        walk_in.visit_type = 'walkin'
+        walk_in.save()
+        upcoming = self.create_visits(1, visit_type='scheduled')[0]
+        self.check_in(arrived)
+
+        select_for_update = QuerySet.select_for_update
+        with mock.patch.object(QuerySet, 'select_for_update', autospec=True, side_effect=select_for_update) as locked, \
+                CaptureQueriesContext(connection) as queries:
+            self.sweep('--batch-size', '2')
+        batches = [call for call in locked.call_args_list if call.args[0].model is VisitRequest]
+        self.assertEqual(len(batches), 3)
+        self.assertTrue(all(call.kwargs == {'skip_locked': True} for call in batches))
+        update = f'UPDATE {connection.ops.quote_name(VisitRequest._meta.db_table)}'
+        self.assertEqual(len([query for query in queries if query['sql'].startswith(update)]), 3)
+
+        self.assertEqual(VisitRequest.objects.filter(id__in=[visit.id for visit in overdue], status='no_show').count(), 5)
+        self.assertEqual(VisitRequest.objects.filter(id__in=[arrived.id, walk_in.id, upcoming.id], status='approved').count(), 3)
+        self.assertEqual(VisitEvent.objects.filter(event_type='no_show', actor__isnull=True).count(), 5)
+        self.assertEqual(OutboundEmail.objects.count(), 5)
+        self.assertIn('marked 5 visits as no-shows', self.sweep('--status'))
+
+    def test_sweep_only_rescans_visits_since_the_previous_run(self):
+        JobWatermark.record('mark_no_shows', 0, run_at=timezone.now() - timedelta(minutes=10))
+        recent = self.create_visits(1, scheduled_time=timezone.now() - timedelta(hours=1), visit_type='scheduled')[0]
+        stale = self.create_visits(1, scheduled_time=timezone.now() - timedelta(days=3), visit_type='scheduled')[0]
+
+        self.sweep('--no-notify')
+        recent.refresh_from_db()
+        stale.refresh_from_db()
+        self.assertEqual((recent.status, stale.status), ('no_show', 'approved'))
+        self.assertFalse(OutboundEmail.objects.exists())
+
+        self.sweep('--full', '--no-notify')
+        stale.refresh_from_db()
+        self.assertEqual(stale.status, 'no_show')
+
+    @override_settings(MANUAL_NO_SHOW_MINUTES=10, NO_SHOW_GRACE_MINUTES=20)
+    def test_lobby_rows_carry_the_manual_and_automatic_no_show_times(self):
+        scheduled_time = timezone.now().replace(microsecond=0) - timedelta(minutes=5)
+        waiting, arrived = self.create_visits(2, scheduled_time=scheduled_time, visit_type='scheduled')
+        walk_in = self.create_visits(1, scheduled_time=scheduled_time, visit_type='walkin')[0]
+        self.check_in(arrived)
+
+        def at(minutes):
+            return (scheduled_time + timedelta(minutes=minutes)).isoformat().replace('+00:00', 'Z')
+
+        for url in ('/api/lobby/today-visitors/', '/api/lobby/today-all-visits/'):
+            rows = {row['visit_id']: (row['mark_no_show_after'], row['no_show_at']) for row in self.lobby_client.get(url).json()}
+            self.assertEqual(rows[waiting.id], (at(10), at(20)))
+            self.assertEqual(rows[walk_in.id], (at(10), None))
+            self.assertEqual(rows[arrived.id], (None, None))
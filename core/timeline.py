@@ -0,0 +1,154 @@
+from datetime import datetime
+from django.db import connection
+from django.db.models import CharField, F, Q, Value
+import base64
+import binascii
+import json
+
+
+# Columns every timeline branch projects, in UNION order
+TIMELINE_COLUMNS = (
+    'kind',
+    'time',
+    'row_id',
+    'visitor_ref',
+    'visitor_name',
+    'host_first_name',
+    'host_last_name',
+    'host_username',
+    'visit_purpose',
+)
+
+# kind: (message, details, fallback visitor name, icon, color)
+ACTIVITY_FORMATS = {
+    'checkin': ("Checked in visitor {visitor}", "Host: {host}", 'Unknown', 'UserGroupIcon', 'green'),
+    'checkout': ("Checked out visitor {visitor}", "Host: {host}", 'Unknown', 'ClockIcon', 'gray'),
+    'walkin': ("Registered walk-in visitor {visitor}", "Purpose: {purpose}", 'Unknown', 'PlusIcon', 'blue'),
+    'request': ("Created visit request for {visitor}", "Purpose: {purpose}", 'pending visitor', 'PlusIcon', 'blue'),
+    'approval': ("Approved visit for {visitor}", "Purpose: {purpose}", 'Unknown', 'CheckCircleIcon', 'green'),
+    'registration': ("Visitor {visitor} completed registration", "Purpose: {purpose}", 'Unknown', 'UserGroupIcon', 'green'),
+    'rejection': ("Rejected visit for {visitor}", "Purpose: {purpose}", 'Unknown', 'XCircleIcon', 'red'),
+}
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+class TimelineBranch:
+    """
+    One source of timeline rows: a queryset, the kind of activity it yields
+    and the datetime field that orders it.
+
+    `prefix` is the lookup path from the queryset's model to VisitRequest
+    ('' for VisitRequest itself, 'visit__' for VisitEvent).
+    """
+
+    def __init__(self, kind, queryset, time_field, prefix=''):
+        self.kind = kind
+        self.queryset = queryset
+        self.time_field = time_field
+        self.prefix = prefix
+
+    def after(self, cursor):
+        """
+        Restrict the branch to rows strictly after the cursor in the feed's
+        (time, kind, id) descending order.
+
+        The kind is constant within a branch, so the tuple comparison reduces
+        to a plain range predicate on the indexed time column.
+        """
+        if cursor is None:
+            return self.queryset
+        cursor_time, cursor_kind, cursor_id = cursor
+        if self.kind < cursor_kind:
+            return self.queryset.filter(**{f'{self.time_field}__lte': cursor_time})
+        if self.kind > cursor_kind:
+            return self.queryset.filter(**{f'{self.time_field}__lt': cursor_time})
+        return self.queryset.filter(
+            Q(**{f'{self.time_field}__lt': cursor_time}) |
+            Q(**{self.time_field: cursor_time, 'id__lt': cursor_id})
+        )
+
+    def rows(self, cursor, limit):
+        prefix = self.prefix
+        queryset = self.after(cursor).annotate(
+            kind=Value(self.kind, output_field=CharField()),
+            time=F(self.time_field),
+            row_id=F('id'),
+            visitor_ref=F(f'{prefix}visitor_id'),
+            visitor_name=F(f'{prefix}visitor__full_name'),
+            host_first_name=F(f'{prefix}employee__first_name'),
+            host_last_name=F(f'{prefix}employee__last_name'),
+            host_username=F(f'{prefix}employee__username'),
+            visit_purpose=F(f'{prefix}purpose'),
+        ).values(*TIMELINE_COLUMNS).order_by()
+        if limit is not None and connection.features.supports_slicing_ordering_in_compound:
+            # Let each branch stop after its own top rows (one index range
+            # scan each) instead of materializing its whole time window.
+            queryset = queryset.order_by('-time', '-row_id')[:limit]
+        return queryset
+
+
+def merged_timeline(branches, cursor=None, limit=None):
+    """UNION ALL of the branch rows ordered newest first, in a single query"""
+    first, *rest = [branch.rows(cursor, limit) for branch in branches]
+    combined = first.union(*rest, all=True) if rest else first
+    return combined.order_by('-time', '-kind', '-row_id')
+
+
+def timeline_page(branches, page_size, cursor=None):
+    """
+    Return one page of the merged feed and the cursor of the next page.
+
+    The next cursor is None once the feed is exhausted.
+    """
+    rows = list(merged_timeline(branches, cursor, page_size + 1)[:page_size + 1])
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        last = rows[-1]
+        next_cursor = encode_cursor((last['time'], last['kind'], last['row_id']))
+    return rows, next_cursor
+
+
+def encode_cursor(position):
+    """Opaque, URL-safe token for a (time, kind, id) feed position"""
+    time, kind, row_id = position
+    payload = json.dumps([time.isoformat(), kind, row_id], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token):
+    """Inverse of encode_cursor(); raises InvalidCursor on malformed tokens"""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        time, kind, row_id = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        time = datetime.fromisoformat(time)
+        if time.tzinfo is None or kind not in ACTIVITY_FORMATS:
+            raise ValueError('bad cursor')
+        return time, kind, int(row_id)
+    except (ValueError, TypeError, binascii.Error, UnicodeError):
+        raise InvalidCursor('Invalid cursor')
+
+
+def render_activity(row):
+    """Turn a timeline row into the activity dict returned by the API"""
+    message, details, fallback_name, icon, color = ACTIVITY_FORMATS[row['kind']]
+    full_name = f"{row['host_first_name'] or ''} {row['host_last_name'] or ''}".strip()
+    values = {
+        'visitor': row['visitor_name'] or fallback_name,
+        'host': full_name or row['host_username'],
+        'purpose': row['visit_purpose'],
+    }
+    # Registrations are keyed by the visitor, everything else by its own row
+    key = row['visitor_ref'] if row['kind'] == 'registration' else row['row_id']
+    return {
+        'id': f"{row['kind']}_{key}",
+        'type': row['kind'],
+        'message': message.format(**values),
+        'details': details.format(**values),
+        'time': row['time'],
+        'icon': icon,
+        'color': color
+    }
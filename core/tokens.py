@@ -0,0 +1,74 @@
+from django.contrib.auth.models import Group
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken, Token
+
+
+# Claim carrying the user's group names in refresh and access tokens
+ROLES_CLAIM = 'roles'
+
+# User fields copied into tokens so read-only endpoints can skip the user row
+# (see core.authentication.StatelessJWTAuthentication)
+PROFILE_CLAIMS = ('username', 'first_name', 'last_name')
+
+LOBBY_ATTENDANT = 'lobby_attendant'
+
+
+def roles_for_user_id(user_id):
+    return sorted(Group.objects.filter(user__id=user_id).values_list('name', flat=True))
+
+
+class RoleRefreshToken(RefreshToken):
+    """
+    Refresh token embedding the user's roles and profile, copied into every
+    access token.
+
+    Roles are read once at login and again on each refresh, so a group change
+    reaches clients within one access token lifetime. Profile claims are only
+    set at login.
+    """
+
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        token[ROLES_CLAIM] = roles_for_user_id(user.pk)
+        for claim in PROFILE_CLAIMS:
+            token[claim] = getattr(user, claim)
+        return token
+
+    @property
+    def access_token(self):
+        if self.token is not None:
+            # Decoded from a client's refresh request rather than just issued
+            self[ROLES_CLAIM] = roles_for_user_id(self[api_settings.USER_ID_CLAIM])
+        return super().access_token
+
+
+class RoleTokenRefreshSerializer(TokenRefreshSerializer):
+    token_class = RoleRefreshToken
+
+
+def request_roles(request):
+    """
+    Roles of the requesting user.
+
+    Read from the validated access token when it carries them; otherwise
+    (session auth, tokens issued before the claim existed) from one query,
+    memoized on the request.
+    """
+    token = getattr(request, 'auth', None)
+    if isinstance(token, Token) and ROLES_CLAIM in token:
+        return frozenset(token[ROLES_CLAIM])
+
+    user = request.user
+    if not user or not user.is_authenticated:
+        return frozenset()
+    roles = getattr(request, '_roles', None)
+    if roles is None:
+        roles = frozenset(roles_for_user_id(user.pk))
+        request._roles = roles
+    return roles
+
+
+def is_lobby_attendant(request):
+    return LOBBY_ATTENDANT in request_roles(request)
@@ -0,0 +1,459 @@
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+from .models import VisitRequest, VisitLog, VisitEvent
+from .emails import no_show_email
+from .outbox import enqueue_emails
+from .rollups import mark_visits_dirty
+
+
+# Largest id list a bulk endpoint accepts in one request
+BULK_MAX_IDS = 200
+
+# Scheduled visits may be checked in up to this long after their slot
+CHECK_IN_GRACE = timedelta(minutes=30)
+
+OK = 'ok'
+NOT_FOUND = 'not_found'
+
+
+class BulkResult:
+    """
+    Outcome of a bulk transition: a status per requested id (OK, NOT_FOUND
+    or a short reason) and the ids that actually moved.
+    """
+
+    def __init__(self, ids):
+        self.results = {visit_id: NOT_FOUND for visit_id in ids}
+        self.moved = []
+
+    def succeed(self, visit_id):
+        self.results[visit_id] = OK
+        self.moved.append(visit_id)
+
+    def fail(self, visit_id, reason):
+        self.results[visit_id] = reason
+
+    def as_payload(self):
+        return {
+            'updated': len(self.moved),
+            'results': [
+                {'visit_id': visit_id, 'result': result}
+                for visit_id, result in self.results.items()
+            ],
+        }
+
+
+def checked_in_logs():
+    """Visit logs with a check-in, open or completed, correlated to the outer visit"""
+    return VisitLog.objects.filter(visit_request=OuterRef('pk'), check_in_time__isnull=False)
+
+
+def checked_in_visit_ids(ids):
+    return set(
+        VisitLog.objects.filter(visit_request_id__in=ids, check_in_time__isnull=False)
+        .values_list('visit_request_id', flat=True)
+    )
+
+
+class TransitionRefused(Exception):
+    """
+    A single-visit transition that did not apply. The message is the reason:
+    NOT_FOUND, 'visitor information not completed' or 'already <status>'.
+    """
+
+
+def refusal_reason(scope, visit_id, require_visitor=False):
+    """Explain, after a conditional UPDATE matched nothing, why the visit did not move"""
+    row = scope.filter(id=visit_id).values_list('status', 'visitor_id').first()
+    if row is None:
+        return NOT_FOUND
+    status, visitor_id = row
+    if require_visitor and visitor_id is None:
+        return 'visitor information not completed'
+    return f'already {status}'
+
+
+def transition(visit_id, from_states, to_state, actor, scope=None, require_visitor=False):
+    """
+    Move one visit to `to_state` if it is currently in one of `from_states`.
+
+    A single UPDATE ... WHERE id = ? AND status IN (...) writes only status
+    and updated_at, and its affected-row count decides the outcome, so two
+    concurrent clicks cannot both transition the visit. On success the event
+    is appended and the visit is returned with its visitor and host loaded;
+    otherwise TransitionRefused is raised. `scope` restricts which visits the
+    actor may touch (e.g. their own).
+    """
+    scope = scope if scope is not None else VisitRequest.objects.all()
+    with transaction.atomic():
+        now = timezone.now()
+        candidates = scope.filter(id=visit_id, status__in=from_states)
+        if require_visitor:
+            candidates = candidates.filter(visitor__isnull=False)
+        if not candidates.update(status=to_state, updated_at=now):
+            raise TransitionRefused(refusal_reason(scope, visit_id, require_visitor))
+
+        visit = VisitRequest.objects.select_related('visitor', 'employee').get(id=visit_id)
+        VisitEvent.record(visit, to_state, actor=actor, at=now)
+        # The UPDATE bypasses post_save, so refresh the rollup explicitly
+        mark_visits_dirty([(visit.scheduled_time, visit.employee_id)])
+    return visit
+
+
+def bulk_status_change(ids, from_status, to_status, actor, scope=None, require_visitor=False, require_no_check_in=False):
+    """
+    Move many visits from one status to another in a single transaction.
+
+    The candidate rows are locked, filtered in Python for per-id reasons, then
+    moved with one conditional UPDATE; events are appended with one INSERT.
+    `scope` restricts which visits the actor may touch (e.g. their own), and
+    `require_no_check_in` skips visits whose visitor has checked in.
+    """
+    scope = scope if scope is not None else VisitRequest.objects.all()
+    outcome = BulkResult(ids)
+    with transaction.atomic():
+        rows = list(
+            scope.select_for_update()
+            .filter(id__in=ids)
+            .values_list('id', 'status', 'visitor_id', 'scheduled_time', 'employee_id')
+        )
+        checked_in = checked_in_visit_ids([row[0] for row in rows]) if require_no_check_in else set()
+        eligible = []
+        for visit_id, status, visitor_id, scheduled_time, employee_id in rows:
+            if status != from_status:
+                outcome.fail(visit_id, f'already {status}')
+            elif require_visitor and visitor_id is None:
+                outcome.fail(visit_id, 'visitor information not completed')
+            elif visit_id in checked_in:
+                outcome.fail(visit_id, 'already checked in')
+            else:
+                eligible.append((visit_id, scheduled_time, employee_id))
+        if not eligible:
+            return outcome
+
+        now = timezone.now()
+        moving = VisitRequest.objects.filter(
+            id__in=[visit_id for visit_id, _, _ in eligible],
+            status=from_status
+        )
+        if require_no_check_in:
+            moving = moving.exclude(Exists(checked_in_logs()))
+        moving.update(status=to_status, updated_at=now)
+        for visit_id, _, _ in eligible:
+            outcome.succeed(visit_id)
+
+        VisitEvent.record_many(
+            ((visit_id, employee_id) for visit_id, _, employee_id in eligible),
+            to_status,
+            actor=actor,
+            at=now
+        )
+        # Bulk UPDATEs bypass post_save, so refresh the rollup explicitly
+        mark_visits_dirty((scheduled_time, employee_id) for _, scheduled_time, employee_id in eligible)
+    return outcome
+
+
+def check_in_refusal(status, visitor_id, check_in_time, visit_type, scheduled_time, now):
+    """Why a visit cannot be checked in at `now`, or None when it can"""
+    if status != 'approved':
+        return f'visit is {status}'
+    if visitor_id is None:
+        return 'visitor information not completed'
+    if check_in_time is not None:
+        return 'already checked in'
+    if visit_type == 'scheduled' and now > scheduled_time + CHECK_IN_GRACE:
+        return 'expired'
+    return None
+
+
+class CheckInRefused(TransitionRefused):
+    """A scanned visit that cannot be checked in; the message says why"""
+
+
+def check_in(actor, **lookup):
+    """
+    Check in the single visit matching `lookup` (e.g. id=..., token=...).
+
+    The visit and its log, if any, are read with one locking SELECT and the
+    time window checked in Python, so a repeat scan is refused as already
+    checked in even after the window has closed. The log row is then
+    inserted if missing (INSERT IGNORE-style, so a concurrent insert for the
+    same visit is not an error) and stamped with a conditional UPDATE ...
+    WHERE check_in_time IS NULL; its affected-row count decides the outcome,
+    so racing check-ins succeed exactly once.
+    Returns the final visit log, or None when no visit matches.
+    """
+    with transaction.atomic():
+        visit = VisitRequest.objects.select_for_update().select_related('visitor', 'visitlog').filter(**lookup).first()
+        if visit is None:
+            return None
+
+        now = timezone.now()
+        existing_log = getattr(visit, 'visitlog', None)
+        reason = check_in_refusal(
+            visit.status,
+            visit.visitor_id,
+            existing_log.check_in_time if existing_log else None,
+            visit.visit_type,
+            visit.scheduled_time,
+            now
+        )
+        if reason:
+            raise CheckInRefused(reason)
+
+        VisitLog.objects.bulk_create(
+            [VisitLog(visit_request_id=visit.id, visitor_id=visit.visitor_id)],
+            ignore_conflicts=True
+        )
+        stamped = VisitLog.objects.filter(visit_request_id=visit.id, check_in_time__isnull=True).update(
+            check_in_time=now, checked_in_by=actor, updated_at=now
+        )
+        if not stamped:
+            raise CheckInRefused('already checked in')
+
+        VisitEvent.record(visit, 'checked_in', actor=actor, at=now)
+        # Neither statement fires post_save, so refresh the rollup explicitly
+        mark_visits_dirty([(visit.scheduled_time, visit.employee_id)])
+        visit_log = VisitLog.objects.get(visit_request_id=visit.id)
+        visit_log.visit_request = visit
+    return visit_log
+
+
+def check_in_by_token(token, actor):
+    """Check in the visit whose invitation token was scanned at the lobby"""
+    return check_in(actor, token=token)
+
+
+def check_out(visit_id, actor):
+    """
+    Check out a checked-in visit, keyed on the visit rather than the visitor
+    (returning visitors can have several logs).
+
+    One conditional UPDATE ... WHERE check_out_time IS NULL stamps the log and
+    its affected-row count decides the outcome. Returns the final visit log.
+    """
+    with transaction.atomic():
+        now = timezone.now()
+        stamped = VisitLog.objects.filter(
+            visit_request_id=visit_id,
+            check_in_time__isnull=False,
+            check_out_time__isnull=True
+        ).update(check_out_time=now, checked_out_by=actor, updated_at=now)
+
+        visit_log = (
+            VisitLog.objects.select_related('visitor', 'visit_request')
+            .filter(visit_request_id=visit_id)
+            .first()
+        )
+        if not stamped:
+            if visit_log is None:
+                exists = VisitRequest.objects.filter(id=visit_id).exists()
+                raise TransitionRefused('not checked in' if exists else NOT_FOUND)
+            raise TransitionRefused('not checked in' if visit_log.check_in_time is None else 'already checked out')
+
+        visit = visit_log.visit_request
+        VisitEvent.record(visit, 'checked_out', actor=actor, at=now)
+        mark_visits_dirty([(visit.scheduled_time, visit.employee_id)])
+    return visit_log
+
+
+def bulk_check_in(ids, actor):
+    """
+    Check in many approved visits at once.
+
+    Visits without a visit log get one from a single bulk_create; logs that
+    exist but were never checked in are stamped with one conditional UPDATE.
+    """
+    outcome = BulkResult(ids)
+    with transaction.atomic():
+        rows = list(
+            VisitRequest.objects.select_for_update()
+            .filter(id__in=ids)
+            .values_list('id', 'status', 'visitor_id', 'scheduled_time', 'employee_id', 'visit_type')
+        )
+        logs = dict(
+            VisitLog.objects.filter(visit_request_id__in=[row[0] for row in rows])
+            .values_list('visit_request_id', 'check_in_time')
+        )
+
+        now = timezone.now()
+        eligible = []
+        for visit_id, status, visitor_id, scheduled_time, employee_id, visit_type in rows:
+            reason = check_in_refusal(status, visitor_id, logs.get(visit_id), visit_type, scheduled_time, now)
+            if reason:
+                outcome.fail(visit_id, reason)
+            else:
+                eligible.append((visit_id, visitor_id, scheduled_time, employee_id))
+        if not eligible:
+            return outcome
+
+        VisitLog.objects.bulk_create([
+            VisitLog(
+                visit_request_id=visit_id,
+                visitor_id=visitor_id,
+                check_in_time=now,
+                checked_in_by=actor
+            )
+            for visit_id, visitor_id, _, _ in eligible
+            if visit_id not in logs
+        ])
+        VisitLog.objects.filter(
+            visit_request_id__in=[visit_id for visit_id, _, _, _ in eligible if visit_id in logs],
+            check_in_time__isnull=True
+        ).update(check_in_time=now, checked_in_by=actor, updated_at=now)
+        for visit_id, _, _, _ in eligible:
+            outcome.succeed(visit_id)
+
+        VisitEvent.record_many(
+            ((visit_id, employee_id) for visit_id, _, _, employee_id in eligible),
+            'checked_in',
+            actor=actor,
+            at=now
+        )
+        mark_visits_dirty((scheduled_time, employee_id) for _, _, scheduled_time, employee_id in eligible)
+    return outcome
+
+
+def bulk_check_out(ids, actor):
+    """Check out many checked-in visits with one conditional UPDATE of their logs"""
+    outcome = BulkResult(ids)
+    with transaction.atomic():
+        rows = list(
+            VisitLog.objects.select_for_update()
+            .filter(visit_request_id__in=ids)
+            .values_list(
+                'visit_request_id', 'check_in_time', 'check_out_time',
+                'visit_request__scheduled_time', 'visit_request__employee_id'
+            )
+        )
+        eligible = []
+        for visit_id, check_in_time, check_out_time, scheduled_time, employee_id in rows:
+            if check_in_time is None:
+                outcome.fail(visit_id, 'not checked in')
+            elif check_out_time is not None:
+                outcome.fail(visit_id, 'already checked out')
+            else:
+                eligible.append((visit_id, scheduled_time, employee_id))
+        # Visits without a log exist but were never checked in
+        known = {row[0] for row in rows}
+        for visit_id in VisitRequest.objects.filter(id__in=set(ids) - known).values_list('id', flat=True):
+            outcome.fail(visit_id, 'not checked in')
+        if not eligible:
+            return outcome
+
+        now = timezone.now()
+        VisitLog.objects.filter(
+            visit_request_id__in=[visit_id for visit_id, _, _ in eligible],
+            check_out_time__isnull=True
+        ).update(check_out_time=now, checked_out_by=actor, updated_at=now)
+        for visit_id, _, _ in eligible:
+            outcome.succeed(visit_id)
+
+        VisitEvent.record_many(
+            ((visit_id, employee_id) for visit_id, _, employee_id in eligible),
+            'checked_out',
+            actor=actor,
+            at=now
+        )
+        mark_visits_dirty((scheduled_time, employee_id) for _, scheduled_time, employee_id in eligible)
+    return outcome
+
+
+def no_show_grace():
+    return timedelta(minutes=settings.NO_SHOW_GRACE_MINUTES)
+
+
+def no_show_deadline(status, visit_type, check_in_time, scheduled_time, grace=None):
+    """When the sweeper marks a visit as a no-show (see overdue_visits), or None if it never will"""
+    if status != 'approved' or visit_type != 'scheduled' or check_in_time is not None:
+        return None
+    return scheduled_time + (grace if grace is not None else no_show_grace())
+
+
+def manual_no_show_after(status, check_in_time, scheduled_time):
+    """
+    When the lobby may mark a visit as a no-show by hand, or None if it
+    cannot. Applies to walk-ins too, and opens MANUAL_NO_SHOW_MINUTES after
+    the scheduled time, well before the sweeper's deadline.
+    """
+    if status != 'approved' or check_in_time is not None:
+        return None
+    return scheduled_time + timedelta(minutes=settings.MANUAL_NO_SHOW_MINUTES)
+
+
+def overdue_visits(now, grace=None, since=None):
+    """
+    Approved scheduled visits never checked in and more than `grace` past
+    their slot. Checked-in visits stay approved, so sweeps pass `since` to
+    bound the scan to recently scheduled visits.
+    """
+    grace = grace if grace is not None else no_show_grace()
+    visits = VisitRequest.objects.filter(
+        status='approved',
+        visit_type='scheduled',
+        scheduled_time__lt=now - grace
+    ).exclude(Exists(checked_in_logs()))
+    if since is not None:
+        visits = visits.filter(scheduled_time__gte=since)
+    return visits
+
+
+def mark_no_shows(batch_size=500, now=None, grace=None, since=None, notify=True):
+    """
+    Mark overdue visits scheduled at or after `since` as no-shows (see
+    overdue_visits).
+
+    Rows are moved in bounded batches of primary keys, each in its own
+    transaction with its events and, when `notify` is set, its no-show
+    emails queued with one INSERT. Returns the number of visits marked.
+    """
+    now = now or timezone.now()
+    grace = grace if grace is not None else no_show_grace()
+    marked_by = f'the visitor system, as there was no check-in within {int(grace.total_seconds() // 60)} minutes'
+    total = 0
+    while True:
+        with transaction.atomic():
+            # Lock the batch so exactly these rows are moved and notified
+            batch = list(
+                overdue_visits(now, grace, since).select_for_update(skip_locked=True)
+                .order_by('scheduled_time')
+                .values_list('id', 'scheduled_time', 'employee_id')[:batch_size]
+            )
+            if not batch:
+                break
+            marked_at = timezone.now()
+            ids = [visit_id for visit_id, _, _ in batch]
+            total += VisitRequest.objects.filter(id__in=ids, status='approved').update(
+                status='no_show',
+                updated_at=marked_at
+            )
+            VisitEvent.record_many(
+                ((visit_id, employee_id) for visit_id, _, employee_id in batch),
+                'no_show',
+                at=marked_at
+            )
+            # Bulk UPDATEs bypass post_save, so refresh the rollup explicitly
+            mark_visits_dirty(row[1:] for row in batch)
+            if notify:
+                enqueue_emails(
+                    no_show_email(visit, marked_by)
+                    for visit in VisitRequest.objects.filter(id__in=ids).select_related('visitor', 'employee')
+                )
+        if len(batch) < batch_size:
+            break
+    return total
+
+
+def next_no_show_deadline(now=None, grace=None):
+    """When the next approved, not yet overdue scheduled visit becomes overdue"""
+    now = now or timezone.now()
+    grace = grace if grace is not None else no_show_grace()
+    scheduled_time = VisitRequest.objects.filter(
+        status='approved',
+        visit_type='scheduled',
+        scheduled_time__gte=now - grace
+    ).order_by('scheduled_time').values_list('scheduled_time', flat=True).first()
+    return scheduled_time + grace if scheduled_time else None
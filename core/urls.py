@@ -1,5 +1,6 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
+from .streams import lobby_events
 from .views import (
     VisitRequestViewSet, 
     VisitLogViewSet, 
@@ -12,11 +13,13 @@ from .views import (
     LogoutAPIView,
     UserInfoAPIView,
     VisitLogCheckInAPIView,
+    ScanCheckInAPIView,
     TodayVisitorsAPIView,
     TodayAllVisitsAPIView,  # <-- add
     VisitLogCheckOutAPIView,
     CreateWalkInVisitAPIView,
     ConvertScheduledToWalkInAPIView,
+    LobbyEventTicketAPIView,
     MyVisitorsAPIView,
     DashboardMetricsView,
     DashboardAnalyticsView,
@@ -25,7 +28,18 @@ from .views import (
     NoShowVisitAPIView,  # <-- add
     ReportsAPIView,
     ReportsDownloadAPIView,
+    ReportExportAPIView,
+    ReportExportDetailAPIView,
+    ReportExportDownloadAPIView,
     EmployeeListAPIView,
+    BulkApproveVisitsAPIView,
+    BulkRejectVisitsAPIView,
+    BulkNoShowVisitsAPIView,
+    BulkCheckInAPIView,
+    BulkCheckOutAPIView,
+    VisitorImportAPIView,
+    VisitorSearchAPIView,
+    VisitSearchAPIView,
 )
 
 router = DefaultRouter()
@@ -36,7 +50,11 @@ urlpatterns = [
     # Reports endpoints (moved to top to avoid conflicts)
     path('download-reports/', ReportsDownloadAPIView.as_view(), name='reports-download'),
     path('generate-reports/', ReportsAPIView.as_view(), name='reports'),
+    path('report-exports/', ReportExportAPIView.as_view(), name='report-exports'),
+    path('report-exports/<uuid:job_id>/', ReportExportDetailAPIView.as_view(), name='report-export-detail'),
+    path('report-exports/<uuid:job_id>/download/', ReportExportDownloadAPIView.as_view(), name='report-export-download'),
     path('employees/', EmployeeListAPIView.as_view(), name='employee-list'),
+    path('visits/search/', VisitSearchAPIView.as_view(), name='visit-search'),
     
     path('visitor-form/<uuid:token>/', CompleteVisitorInfoAPIView.as_view(), name='visitor-form'),
     path('visit-requests/pending/', PendingVisitsAPIView.as_view(), name='pending-visits'),
@@ -45,6 +63,10 @@ urlpatterns = [
     path('visit-requests/<int:pk>/reject/', RejectVisitAPIView.as_view(), name='reject-visit'),
     path('visit-requests/<int:pk>/cancel/', CancelVisitAPIView.as_view(), name='cancel-visit'),  # <-- add
     path('visit-requests/<int:pk>/no-show/', NoShowVisitAPIView.as_view(), name='no-show-visit'),  # <-- add
+    path('visit-requests/bulk/approve/', BulkApproveVisitsAPIView.as_view(), name='bulk-approve-visits'),
+    path('visit-requests/bulk/reject/', BulkRejectVisitsAPIView.as_view(), name='bulk-reject-visits'),
+    path('visit-requests/import/', VisitorImportAPIView.as_view(), name='visitor-import'),
+    path('visit-requests/bulk/no-show/', BulkNoShowVisitsAPIView.as_view(), name='bulk-no-show-visits'),
     
     # Authentication endpoints
     path('auth/login/', LoginAPIView.as_view(), name='login'),
@@ -54,9 +76,15 @@ urlpatterns = [
     # Lobby attendant endpoints
     path('lobby/today-visitors/', TodayVisitorsAPIView.as_view(), name='today-visitors'),
     path('lobby/checkin/', VisitLogCheckInAPIView.as_view(), name='visit-log-checkin'),
+    path('lobby/scan/<uuid:token>/', ScanCheckInAPIView.as_view(), name='scan-checkin'),
     path('lobby/checkout/', VisitLogCheckOutAPIView.as_view(), name='visit-log-checkout'),
+    path('lobby/bulk/checkin/', BulkCheckInAPIView.as_view(), name='bulk-checkin'),
+    path('lobby/bulk/checkout/', BulkCheckOutAPIView.as_view(), name='bulk-checkout'),
+    path('lobby/visitors/search/', VisitorSearchAPIView.as_view(), name='visitor-search'),
     path('lobby/walkin/', CreateWalkInVisitAPIView.as_view(), name='create-walkin-visit'),
     path('lobby/convert-to-walkin/<int:visit_id>/', ConvertScheduledToWalkInAPIView.as_view(), name='convert-to-walkin'),
+    path('lobby/events/', lobby_events, name='lobby-events'),
+    path('lobby/events/ticket/', LobbyEventTicketAPIView.as_view(), name='lobby-event-ticket'),
     path('my-visitors/', MyVisitorsAPIView.as_view(), name='my-visitors'),
     path('dashboard-metrics/', DashboardMetricsView.as_view(), name='dashboard-metrics'),
     path('dashboard-analytics/', DashboardAnalyticsView.as_view(), name='dashboard-analytics'),
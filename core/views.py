@@ -2,29 +2,187 @@ from rest_framework import viewsets, status, serializers
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, BasePermission
-from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework.negotiation import DefaultContentNegotiation
 from django.contrib.auth import authenticate
-from django.core.mail import send_mail
+from django.db import transaction
 from django.conf import settings
+from django.urls import reverse
 from django.utils import timezone
 from datetime import timedelta
 from datetime import datetime, timedelta
-from .models import Visitor, VisitRequest, VisitLog
+from .models import Visitor, VisitRequest, VisitLog, VisitEvent, ReportExport, DailyVisitStats
 from .serializers import VisitorSerializer, VisitRequestSerializer, VisitLogSerializer, DashboardMetricSerializer
+from .outbox import enqueue_email, enqueue_emails
+from .emails import approval_email, rejection_email, no_show_email
+from .transitions import (
+    BULK_MAX_IDS, NOT_FOUND, CheckInRefused, TransitionRefused, transition, bulk_status_change,
+    bulk_check_in, bulk_check_out, check_in, check_in_by_token, check_out,
+    manual_no_show_after, no_show_deadline
+)
+from .imports import IMPORT_MAX_ROWS, ImportInProgress, read_csv_rows, validate_import, import_visitors, write_checkin_csv
+from .search import SEARCH_LIMIT, search_visitors, search_visits
+from .deltas import WATERMARK_HEADER, new_watermark, format_watermark, parse_watermark, visit_delta
+from .conditional import conditional_get, visit_state
+from .tokens import RoleRefreshToken, request_roles, is_lobby_attendant
+from .authentication import STATELESS_AUTHENTICATION
+from .rollups import local_day_bounds, rollup_counters
+from .timeline import (
+    TimelineBranch, InvalidCursor, merged_timeline, timeline_page,
+    encode_cursor, decode_cursor, render_activity,
+)
+from .reports import (
+    report_filters, report_queryset, stream_csv, write_xlsx,
+    normalize_report_filters, export_cache_key, export_path, report_rollup_cells, stale_export_cutoff,
+)
+from .streams import issue_stream_ticket, STREAM_TICKET_MAX_AGE
 from django.contrib.auth.models import Group
 from django.db.models import Count, Q, Avg
-from django.http import HttpResponse
+from django.db.models.functions import ExtractHour
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from rest_framework.utils.encoders import JSONEncoder
 import csv
+import hashlib
 import json
 from io import StringIO
 import logging
-from django.db.models import Count, Q, Avg
+import os
+import tempfile
+from django.db.models import Count, Q, Avg, Sum, Max, F, DurationField, ExpressionWrapper
 from django.contrib.auth.models import User
 
 
 # Set up logger
 logger = logging.getLogger(__name__)
 
+XLSX_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+# Columns needed to render a visit row on the lobby and host boards. Reading
+# them with .values() joins visitor, host and the reverse visit log in one query.
+LOBBY_ROW_FIELDS = (
+    'id',
+    'visitor_id',
+    'visitor__full_name',
+    'visitor__email',
+    'employee__first_name',
+    'employee__last_name',
+    'employee__username',
+    'purpose',
+    'scheduled_time',
+    'visit_type',
+    'status',
+    'visitlog__check_in_time',
+    'visitlog__check_out_time',
+)
+
+
+def display_name(first_name, last_name, username):
+    """Same result as User.get_full_name() or username, from projected columns"""
+    full_name = f"{first_name or ''} {last_name or ''}".strip()
+    return full_name or username
+
+
+def visit_status_counters(queryset):
+    """Compute the report status counters with one conditional aggregate"""
+    return queryset.aggregate(
+        total=Count('id'),
+        checked_in=Count('id', filter=Q(visitlog__check_in_time__isnull=False, visitlog__check_out_time__isnull=True)),
+        checked_out=Count('id', filter=Q(visitlog__check_out_time__isnull=False)),
+        no_show=Count('id', filter=Q(status='no_show')),
+        pending=Count('id', filter=Q(status='approved', visitlog__check_in_time__isnull=True)),
+    )
+
+
+def hourly_histogram(queryset):
+    """Return {hour: count} for all 24 local hours using a single GROUP BY"""
+    histogram = dict.fromkeys(range(24), 0)
+    rows = queryset.annotate(
+        hour=ExtractHour('scheduled_time')
+    ).values('hour').annotate(count=Count('id')).order_by('hour')
+    for row in rows:
+        histogram[row['hour']] = row['count']
+    return histogram
+
+
+def visit_timing_averages(queryset):
+    """
+    Average lateness (check-in minus scheduled time) and dwell time (check-out
+    minus check-in) as timedeltas, both computed by the database in one query.
+    """
+    lateness = ExpressionWrapper(
+        F('visitlog__check_in_time') - F('scheduled_time'),
+        output_field=DurationField()
+    )
+    dwell = ExpressionWrapper(
+        F('visitlog__check_out_time') - F('visitlog__check_in_time'),
+        output_field=DurationField()
+    )
+    return queryset.aggregate(
+        lateness=Avg(lateness, filter=Q(visitlog__check_in_time__isnull=False)),
+        dwell=Avg(dwell, filter=Q(visitlog__check_in_time__isnull=False, visitlog__check_out_time__isnull=False)),
+    )
+
+
+def format_lateness(value):
+    """Render an average lateness as e.g. 4 min late, 2 min early or On time"""
+    if value is None:
+        return "N/A"
+    minutes = round(value.total_seconds() / 60)
+    if minutes == 0:
+        return "On time"
+    return f"{abs(minutes)} min {'late' if minutes > 0 else 'early'}"
+
+
+def format_duration(value):
+    """Render an average duration as e.g. 45 min or 1h 20m"""
+    if value is None:
+        return "N/A"
+    minutes = max(0, round(value.total_seconds() / 60))
+    if minutes < 60:
+        return f"{minutes} min"
+    return f"{minutes // 60}h {minutes % 60}m"
+
+
+def peak_hour_label(histogram):
+    """Busiest hour of an hourly_histogram() result, or "N/A" when it is empty"""
+    peak_hour = max(histogram, key=histogram.get)
+    return f"{peak_hour}:00" if histogram[peak_hour] else "N/A"
+
+
+def visitor_report_rows(queryset, limit=100):
+    """Most recent visits as report rows (visitor, host and visit log joined)"""
+    rows = []
+    for row in queryset.order_by('-scheduled_time').values(*LOBBY_ROW_FIELDS)[:limit]:
+        check_in_time = row['visitlog__check_in_time']
+        check_out_time = row['visitlog__check_out_time']
+        rows.append({
+            'visit_id': row['id'],
+            'visitor_name': row['visitor__full_name'] or 'Unknown',
+            'employee_name': row['employee__username'],
+            'scheduled_time': row['scheduled_time'].isoformat(),
+            'status': row['status'],
+            'check_in_time': check_in_time.isoformat() if check_in_time else None,
+            'check_out_time': check_out_time.isoformat() if check_out_time else None,
+            'purpose': row['purpose'],
+            'visit_type': row['visit_type']
+        })
+    return rows
+
+
+def stream_json_array(items, batch_size=500):
+    """Encode an iterable as a JSON array piece by piece for StreamingHttpResponse"""
+    yield '['
+    batch = []
+    first = True
+    for item in items:
+        batch.append(json.dumps(item, cls=JSONEncoder))
+        if len(batch) >= batch_size:
+            yield ('' if first else ',') + ','.join(batch)
+            first = False
+            batch = []
+    if batch:
+        yield ('' if first else ',') + ','.join(batch)
+    yield ']'
+
 class LoginAPIView(APIView):
     def post(self, request):
         try:
@@ -54,7 +212,7 @@ class LoginAPIView(APIView):
                     'code': 'ACCOUNT_INACTIVE'
                 }, status=status.HTTP_401_UNAUTHORIZED)
             
-            refresh = RefreshToken.for_user(user)
+            refresh = RoleRefreshToken.for_user(user)
             
             logger.info(f"Successful login for user: {username} from IP: {request.META.get('REMOTE_ADDR', 'unknown')}")
             
@@ -98,7 +256,7 @@ class UserInfoAPIView(APIView):
     
     def get(self, request):
         user = request.user
-        groups = list(user.groups.values_list('name', flat=True))
+        groups = sorted(request_roles(request))
         return Response({
             'id': user.id,
             'username': user.username,
@@ -115,11 +273,8 @@ class VisitRequestViewSet(viewsets.ModelViewSet):
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
-        # Automatically expire pending requests that are past their scheduled time
-        expired_count = VisitRequest.expire_pending_requests()
-        if expired_count > 0:
-            logger.info(f"Expired {expired_count} pending visit requests")
-        
+        # Overdue pending requests are expired by the `expire_visit_requests`
+        # sweeper, so reads here never write to the table.
         now = timezone.now()
         return VisitRequest.objects.filter(
             Q(employee=self.request.user) | Q(original_employee=self.request.user),
@@ -135,12 +290,13 @@ class VisitRequestViewSet(viewsets.ModelViewSet):
                 'scheduled_time': 'Cannot create a visit request for a time that has already passed.'
             })
         
-        visit = serializer.save(employee=self.request.user)
+        with transaction.atomic():
+            visit = serializer.save(employee=self.request.user)
+            VisitEvent.record(visit, 'created', actor=self.request.user, at=visit.created_at)
+            if visit.visit_type == 'scheduled':
+                self.send_invite_link(visit)
         logger.info(f"User {self.request.user.username} created visit request {visit.id} for {scheduled_time}")
         
-        if visit.visit_type == 'scheduled':
-            self.send_invite_link(visit)
-        
         # Add invitation link to response for easy sharing
         serializer.instance.invitation_link = f"{settings.FRONTEND_URL}/visitor-form/{visit.token}"
 
@@ -151,19 +307,23 @@ class VisitRequestViewSet(viewsets.ModelViewSet):
         original_time = original_visit.scheduled_time
         
         # Save the updated visit request
-        visit = serializer.save()
+        with transaction.atomic():
+            visit = serializer.save()
+
+            # Check if purpose or scheduled_time changed (rescheduling)
+            if (original_purpose != visit.purpose or original_time != visit.scheduled_time) and visit.visitor:
+                self.send_reschedule_notification(visit, original_purpose, original_time)
         logger.info(f"User {self.request.user.username} updated visit request {visit.id}")
         
-        # Check if purpose or scheduled_time changed (rescheduling)
-        if (original_purpose != visit.purpose or original_time != visit.scheduled_time) and visit.visitor:
-            self.send_reschedule_notification(visit, original_purpose, original_time)
-        
         # Add invitation link to response for easy sharing
         serializer.instance.invitation_link = f"{settings.FRONTEND_URL}/visitor-form/{visit.token}"
 
     def perform_destroy(self, instance):
         logger.info(f"User {self.request.user.username} deleted visit request {instance.id}")
-        super().perform_destroy(instance)
+        with transaction.atomic():
+            # Tombstone for delta-sync clients; the event outlives the visit
+            VisitEvent.record(instance, 'deleted', actor=self.request.user)
+            super().perform_destroy(instance)
 
     def send_reschedule_notification(self, visit_request, original_purpose, original_time):
         subject = f"Visit Rescheduled - {visit_request.visitor.full_name}"
@@ -184,12 +344,8 @@ Please note the changes and plan accordingly.
 
 Thank you.
         """
-        try:
-            send_mail(subject, message, settings.DEFAULT_FROM_EMAIL, [visit_request.visitor.email])
-            logger.info(f"Reschedule notification sent for visit request {visit_request.id}")
-        except Exception as e:
-            logger.error(f"Failed to send reschedule notification for visit request {visit_request.id}: {str(e)}")
-            print(f"Failed to send reschedule email: {e}")
+        enqueue_email(subject, message, [visit_request.visitor.email])
+        logger.info(f"Reschedule notification queued for visit request {visit_request.id}")
 
     def send_invite_link(self, visit_request):
         link = f"{settings.FRONTEND_URL}/visitor-form/{visit_request.token}"
@@ -212,15 +368,8 @@ Please complete this form before your scheduled visit time. After submission, yo
 
 Thank you.
         """
-        try:
-            send_mail(subject, message, settings.DEFAULT_FROM_EMAIL, ["placeholder@email.com"])
-            logger.info(f"Invitation email sent for visit request {visit_request.id}")
-        except Exception as e:
-            logger.error(f"Failed to send invitation email for visit request {visit_request.id}: {str(e)}")
-            # Log the error but don't fail the request
-            print(f"Failed to send email: {e}")
-            # In development, you might want to print the link to console
-            print(f"Visit invitation link: {link}")
+        enqueue_email(subject, message, ["placeholder@email.com"])
+        logger.info(f"Invitation email queued for visit request {visit_request.id}")
 
 
 class CompleteVisitorInfoAPIView(APIView):
@@ -248,8 +397,10 @@ class CompleteVisitorInfoAPIView(APIView):
         if visit.scheduled_time < timezone.now():
             # Automatically mark as expired if it's past scheduled time
             if visit.status == 'pending':
-                visit.status = 'expired'
-                visit.save()
+                with transaction.atomic():
+                    visit.status = 'expired'
+                    visit.save()
+                    VisitEvent.record(visit, 'expired')
                 logger.info(f"Visit request expired: {visit.id}")
             return Response({
                 'error': 'This visit request has expired. Please contact your host to reschedule.',
@@ -307,9 +458,11 @@ class CompleteVisitorInfoAPIView(APIView):
         serializer = VisitorSerializer(data=request.data)
         if serializer.is_valid():
             try:
-                visitor = serializer.save(created_by=visit.employee)
-                visit.visitor = visitor
-                visit.save()
+                with transaction.atomic():
+                    visitor = serializer.save(created_by=visit.employee)
+                    visit.visitor = visitor
+                    visit.save()
+                    VisitEvent.record(visit, 'registered')
                 
                 logger.info(f"Visitor info completed for visit: {visit.id}, visitor: {visitor.full_name}")
                 
@@ -333,26 +486,31 @@ class CompleteVisitorInfoAPIView(APIView):
         }, status=400)
 
 
+def refused_response(refusal, messages=None, default=None):
+    """Error response for a TransitionRefused raised by a single-visit action"""
+    reason = str(refusal)
+    if reason == NOT_FOUND:
+        return Response({'error': 'Visit not found.'}, status=404)
+    message = (messages or {}).get(reason) or default or f'Visit is {reason}.'
+    return Response({'error': message}, status=400)
+
+
 class ApproveVisitAPIView(APIView):
     permission_classes = [IsAuthenticated]
     
     def post(self, request, pk):
-        try:
-            visit = VisitRequest.objects.get(pk=pk, employee=request.user)
-        except VisitRequest.DoesNotExist:
-            return Response({'error': 'Visit not found.'}, status=404)
-
-        if not visit.visitor:
-            return Response({'error': 'Visitor information not completed yet.'}, status=400)
-
-        if visit.status != 'pending':
-            return Response({'error': f'Visit is already {visit.status}.'}, status=400)
+        with transaction.atomic():
+            try:
+                visit = transition(
+                    pk, ['pending'], 'approved', request.user,
+                    scope=VisitRequest.objects.filter(employee=request.user),
+                    require_visitor=True
+                )
+            except TransitionRefused as e:
+                return refused_response(e, {'visitor information not completed': 'Visitor information not completed yet.'})
 
-        visit.status = 'approved'
-        visit.save()
-        
-        # Send approval email
-        self.send_approval_email(visit)
+            # Queue approval email
+            self.send_approval_email(visit)
         
         return Response({
             'message': 'Visit approved successfully.',
@@ -360,76 +518,30 @@ class ApproveVisitAPIView(APIView):
         })
 
     def send_approval_email(self, visit_request):
-        subject = f"Visit Approved - {visit_request.visitor.full_name}"
-        message = f"""
-Dear {visit_request.visitor.full_name},
-
-Your visit request has been approved!
-
-Visit Details:
-- Host: {visit_request.employee.get_full_name() or visit_request.employee.username}
-- Purpose: {visit_request.purpose}
-- Scheduled Time: {visit_request.scheduled_time.strftime('%Y-%m-%d %H:%M')}
-- Status: Approved
-
-Please check in at the reception desk when you arrive. You will need to provide your name and the purpose of your visit.
-
-Thank you for your cooperation.
-
-Best regards,
-{visit_request.employee.get_full_name() or visit_request.employee.username}
-        """
-        try:
-            send_mail(subject, message, settings.DEFAULT_FROM_EMAIL, [visit_request.visitor.email])
-        except Exception as e:
-            print(f"Failed to send approval email: {e}")
+        enqueue_email(*approval_email(visit_request))
 
 
 class RejectVisitAPIView(APIView):
     permission_classes = [IsAuthenticated]
     
     def post(self, request, pk):
-        try:
-            visit = VisitRequest.objects.get(pk=pk, employee=request.user)
-        except VisitRequest.DoesNotExist:
-            return Response({'error': 'Visit not found.'}, status=404)
-
-        if visit.status != 'pending':
-            return Response({'error': f'Visit is already {visit.status}.'}, status=400)
+        with transaction.atomic():
+            try:
+                visit = transition(
+                    pk, ['pending'], 'rejected', request.user,
+                    scope=VisitRequest.objects.filter(employee=request.user)
+                )
+            except TransitionRefused as e:
+                return refused_response(e)
 
-        visit.status = 'rejected'
-        visit.save()
-        
-        # Send rejection email only if visitor info exists
-        if visit.visitor:
-            self.send_rejection_email(visit)
+            # Queue rejection email only if visitor info exists
+            if visit.visitor:
+                self.send_rejection_email(visit)
         
         return Response({'message': 'Visit rejected and notification sent to visitor.'})
 
     def send_rejection_email(self, visit_request):
-        subject = f"Visit Request Update - {visit_request.visitor.full_name}"
-        message = f"""
-Dear {visit_request.visitor.full_name},
-
-We regret to inform you that your visit request has been declined.
-
-Visit Details:
-- Host: {visit_request.employee.get_full_name() or visit_request.employee.username}
-- Purpose: {visit_request.purpose}
-- Scheduled Time: {visit_request.scheduled_time.strftime('%Y-%m-%d %H:%M')}
-- Status: Rejected
-
-Please contact {visit_request.employee.get_full_name() or visit_request.employee.username} for more information.
-
-Thank you for your understanding.
-
-Best regards,
-{visit_request.employee.get_full_name() or visit_request.employee.username}
-        """
-        try:
-            send_mail(subject, message, settings.DEFAULT_FROM_EMAIL, [visit_request.visitor.email])
-        except Exception as e:
-            print(f"Failed to send rejection email: {e}")
+        enqueue_email(*rejection_email(visit_request))
 
 
 class PendingVisitsAPIView(APIView):
@@ -438,9 +550,6 @@ class PendingVisitsAPIView(APIView):
     def get(self, request):
         """Get all pending visits for the authenticated employee"""
         try:
-            print(f"User: {request.user.username}")
-            print(f"User authenticated: {request.user.is_authenticated}")
-            
             # Get approved visits that haven't been checked in yet (consistent with reports)
             pending_visits = VisitRequest.objects.filter(
                 status='approved',
@@ -449,38 +558,54 @@ class PendingVisitsAPIView(APIView):
             ).filter(
                 Q(employee=request.user) | Q(original_employee=request.user)
             ).select_related('visitor').order_by('-created_at')
-            
-            print(f"Found {pending_visits.count()} pending visits")
-            
+
             serializer = VisitRequestSerializer(pending_visits, many=True)
             return Response(serializer.data)
         except Exception as e:
-            print(f"Error in PendingVisitsAPIView: {e}")
+            logger.error(f"Error in PendingVisitsAPIView: {str(e)}", exc_info=True)
             return Response({'error': str(e)}, status=500)
 
 
 class PendingApprovalsAPIView(APIView):
+    authentication_classes = STATELESS_AUTHENTICATION
     permission_classes = [IsAuthenticated]
     
     def get(self, request):
-        """Get all visit requests that are pending approval (status='pending')"""
+        """
+        Get all visit requests that are pending approval (status='pending').
+
+        With ?since=<watermark> only the changes since that watermark are
+        returned (see core.deltas.visit_delta).
+        """
         try:
-            print(f"User: {request.user.username}")
-            print(f"User authenticated: {request.user.is_authenticated}")
-            
+            watermark = new_watermark()
+            since = request.query_params.get('since')
+            try:
+                since = parse_watermark(since) if since else None
+            except ValueError as e:
+                return Response({'error': f'Invalid watermark: {str(e)}'}, status=400)
+
             # Get visits that are pending approval (including converted walk-ins)
-            pending_approvals = VisitRequest.objects.filter(
+            hosted = VisitRequest.objects.filter(
+                Q(employee=request.user.id) | Q(original_employee=request.user.id)
+            )
+            pending_approvals = hosted.filter(
                 status='pending'
-            ).filter(
-                Q(employee=request.user) | Q(original_employee=request.user)
             ).select_related('visitor').order_by('-created_at')
-            
-            print(f"Found {pending_approvals.count()} pending approvals")
-            
-            serializer = VisitRequestSerializer(pending_approvals, many=True)
-            return Response(serializer.data)
+
+            def render(queryset):
+                return VisitRequestSerializer(queryset, many=True).data
+
+            if since is not None:
+                payload = visit_delta(hosted, pending_approvals, since, render, key='id', host=request.user.id)
+                payload['watermark'] = format_watermark(watermark)
+                return Response(payload)
+
+            response = Response(render(pending_approvals))
+            response[WATERMARK_HEADER] = format_watermark(watermark)
+            return response
         except Exception as e:
-            print(f"Error in PendingApprovalsAPIView: {e}")
+            logger.error(f"Error in PendingApprovalsAPIView: {str(e)}", exc_info=True)
             return Response({'error': str(e)}, status=500)
 
 
@@ -491,7 +616,8 @@ class VisitLogViewSet(viewsets.ModelViewSet):
 
 class IsLobbyAttendant(BasePermission):
     def has_permission(self, request, view):
-        return request.user and request.user.is_authenticated and request.user.groups.filter(name='lobby_attendant').exists()
+        # Roles come from the access token claim, so this costs no query
+        return bool(request.user and request.user.is_authenticated and is_lobby_attendant(request))
 
 
 class ConvertScheduledToWalkInAPIView(APIView):
@@ -543,7 +669,9 @@ class ConvertScheduledToWalkInAPIView(APIView):
             
             visit.purpose = full_purpose
             visit.scheduled_time = timezone.now()  # Update to current time
-            visit.save()
+            with transaction.atomic():
+                visit.save()
+                VisitEvent.record(visit, 'converted', actor=request.user, at=visit.scheduled_time)
             
             return Response({
                 'message': 'Scheduled visit successfully converted to walk-in.',
@@ -559,12 +687,23 @@ class ConvertScheduledToWalkInAPIView(APIView):
                 'error': 'Visit not found.'
             }, status=status.HTTP_404_NOT_FOUND)
         except Exception as e:
-            print(f"Error converting scheduled visit to walk-in: {e}")
+            logger.error(f"Error converting scheduled visit to walk-in: {str(e)}", exc_info=True)
             return Response({
                 'error': 'Failed to convert scheduled visit to walk-in.'
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+class LobbyEventTicketAPIView(APIView):
+    """Issue a one-minute ticket that opens the lobby event stream."""
+    permission_classes = [IsAuthenticated, IsLobbyAttendant]
+
+    def post(self, request):
+        return Response({
+            'ticket': issue_stream_ticket(request.user),
+            'expires_in': STREAM_TICKET_MAX_AGE,
+        })
+
+
 class CreateWalkInVisitAPIView(APIView):
     permission_classes = [IsAuthenticated, IsLobbyAttendant]
     
@@ -589,6 +728,21 @@ class CreateWalkInVisitAPIView(APIView):
                 'visit_type': 'walkin',
             }
             
+            # A returning visitor picked from the visitor search
+            returning = None
+            visitor_id = request.data.get('visitor_id')
+            if visitor_id:
+                try:
+                    returning = Visitor.objects.get(pk=visitor_id)
+                except (Visitor.DoesNotExist, ValueError, TypeError):
+                    return Response({
+                        'error': 'Returning visitor not found.'
+                    }, status=status.HTTP_400_BAD_REQUEST)
+                # Fields left out of the form keep the stored details
+                for field, value in visitor_data.items():
+                    if value is None:
+                        visitor_data[field] = getattr(returning, field)
+
             # Validate required fields
             if not visitor_data['full_name'] or not visitor_data['email']:
                 return Response({
@@ -608,7 +762,15 @@ class CreateWalkInVisitAPIView(APIView):
                     'details': visitor_serializer.errors
                 }, status=status.HTTP_400_BAD_REQUEST)
             
-            visitor = visitor_serializer.save(created_by=request.user)
+            if returning and all(
+                (getattr(returning, field) or '') == value
+                for field, value in visitor_serializer.validated_data.items()
+            ):
+                visitor = returning
+            else:
+                # New or edited details get their own row, so earlier visits
+                # keep the details they were recorded with
+                visitor = visitor_serializer.save(created_by=request.user)
             
             # Create visit request (approved immediately for walk-ins)
             # Ensure proper timezone handling for scheduled_time
@@ -626,14 +788,16 @@ class CreateWalkInVisitAPIView(APIView):
             if purpose and purpose != 'Walk-in visit':
                 full_purpose = f"{purpose} - Visiting {host_name}"
             
-            visit_request = VisitRequest.objects.create(
-                employee=request.user,  # Lobby attendant becomes the host for tracking
-                visitor=visitor,
-                purpose=full_purpose,
-                scheduled_time=scheduled_time,
-                status='approved',  # Walk-ins are approved immediately
-                visit_type='walkin'
-            )
+            with transaction.atomic():
+                visit_request = VisitRequest.objects.create(
+                    employee=request.user,  # Lobby attendant becomes the host for tracking
+                    visitor=visitor,
+                    purpose=full_purpose,
+                    scheduled_time=scheduled_time,
+                    status='approved',  # Walk-ins are approved immediately
+                    visit_type='walkin'
+                )
+                VisitEvent.record(visit_request, 'created', actor=request.user, at=visit_request.created_at)
             
             return Response({
                 'message': 'Walk-in visit created successfully.',
@@ -646,17 +810,74 @@ class CreateWalkInVisitAPIView(APIView):
             }, status=status.HTTP_201_CREATED)
             
         except Exception as e:
-            print(f"Error creating walk-in visit: {e}")
+            logger.error(f"Error creating walk-in visit: {str(e)}", exc_info=True)
             return Response({
                 'error': 'Failed to create walk-in visit.'
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
-class TodayVisitorsAPIView(APIView):
+class VisitorSearchAPIView(APIView):
+    authentication_classes = STATELESS_AUTHENTICATION
     permission_classes = [IsAuthenticated, IsLobbyAttendant]
-    
+
+    # Upper bound of ?limit=
+    MAX_LIMIT = 25
+
     def get(self, request):
-        """Get all approved visitors for today"""
+        """Prefix search of returning visitors to prefill the walk-in form"""
+        try:
+            limit = min(max(int(request.query_params.get('limit', SEARCH_LIMIT)), 1), self.MAX_LIMIT)
+        except ValueError:
+            return Response({'error': 'limit must be an integer.'}, status=400)
+        return Response(search_visitors(request.query_params.get('q', ''), limit))
+
+
+class VisitSearchAPIView(APIView):
+    authentication_classes = STATELESS_AUTHENTICATION
+    permission_classes = [IsAuthenticated, IsLobbyAttendant]
+
+    MAX_LIMIT = 100
+
+    def get(self, request):
+        """Full-text search over visit purposes, visitors and hosts, most relevant first"""
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            return Response({'error': 'q is required.'}, status=400)
+        try:
+            limit = min(max(int(request.query_params.get('limit', 50)), 1), self.MAX_LIMIT)
+        except ValueError:
+            return Response({'error': 'limit must be an integer.'}, status=400)
+
+        visits = search_visits(VisitRequest.objects.all(), query, rank=True).values(
+            'id', 'visitor__full_name', 'visitor__email', 'employee__first_name', 'employee__last_name',
+            'employee__username', 'purpose', 'scheduled_time', 'status', 'visit_type', 'relevance'
+        )[:limit]
+        return Response([
+            {
+                'visit_id': row['id'],
+                'visitor_name': row['visitor__full_name'],
+                'visitor_email': row['visitor__email'],
+                'host_name': display_name(row['employee__first_name'], row['employee__last_name'], row['employee__username']),
+                'purpose': row['purpose'],
+                'scheduled_time': row['scheduled_time'],
+                'status': row['status'],
+                'visit_type': row['visit_type'],
+                'relevance': row['relevance'],
+            }
+            for row in visits
+        ])
+
+
+def today_visitors_state(view, request):
+    return visit_state(view.get_queryset())
+
+
+class TodayVisitorsAPIView(APIView):
+    authentication_classes = STATELESS_AUTHENTICATION
+    permission_classes = [IsAuthenticated, IsLobbyAttendant]
+
+    @staticmethod
+    def get_queryset():
         today = timezone.now().date()
         
         # Get all approved visits for today
@@ -665,128 +886,134 @@ class TodayVisitorsAPIView(APIView):
         today_end = timezone.make_aware(datetime.combine(today, datetime.max.time()))
         
         # Get all approved visits for today (use range for robust timezone handling)
-        today_visits = VisitRequest.objects.filter(
+        return VisitRequest.objects.filter(
             status='approved',
             scheduled_time__range=(today_start, today_end),
             visitor__isnull=False
-        ).select_related('visitor', 'employee')
+        )
+
+    @conditional_get(today_visitors_state)
+    def get(self, request):
+        """Get all approved visitors for today"""
+        # Visitor, host and visit log columns come from one joined query
+        today_visits = self.get_queryset().values(*LOBBY_ROW_FIELDS)
         
         visitors_data = []
-        for visit in today_visits:
-            # Get visit log if it exists
-            try:
-                visit_log = VisitLog.objects.get(visit_request=visit)
-                is_checked_in = visit_log.check_in_time is not None
-                check_in_time = visit_log.check_in_time
-                is_checked_out = visit_log.check_out_time is not None
-                check_out_time = visit_log.check_out_time
-            except VisitLog.DoesNotExist:
-                is_checked_in = False
-                check_in_time = None
-                is_checked_out = False
-                check_out_time = None
-            
+        for row in today_visits:
             visitors_data.append({
-                'visit_id': visit.id,
-                'visitor_id': visit.visitor.id,
-                'visitor_name': visit.visitor.full_name,
-                'visitor_email': visit.visitor.email,
-                'host_name': visit.employee.get_full_name() or visit.employee.username,
-                'purpose': visit.purpose,
-                'scheduled_time': visit.scheduled_time,
-                'visit_type': visit.visit_type,
-                'status': visit.status,  # Add status field
-                'is_checked_in': is_checked_in,
-                'check_in_time': check_in_time,
-                'is_checked_out': is_checked_out,
-                'check_out_time': check_out_time,
+                'visit_id': row['id'],
+                'visitor_id': row['visitor_id'],
+                'visitor_name': row['visitor__full_name'],
+                'visitor_email': row['visitor__email'],
+                'host_name': display_name(row['employee__first_name'], row['employee__last_name'], row['employee__username']),
+                'purpose': row['purpose'],
+                'scheduled_time': row['scheduled_time'],
+                'visit_type': row['visit_type'],
+                'status': row['status'],  # Add status field
+                'is_checked_in': row['visitlog__check_in_time'] is not None,
+                'check_in_time': row['visitlog__check_in_time'],
+                'is_checked_out': row['visitlog__check_out_time'] is not None,
+                'check_out_time': row['visitlog__check_out_time'],
+                'mark_no_show_after': manual_no_show_after(
+                    row['status'], row['visitlog__check_in_time'], row['scheduled_time']
+                ),
+                'no_show_at': no_show_deadline(
+                    row['status'], row['visit_type'], row['visitlog__check_in_time'], row['scheduled_time']
+                ),
             })
         
         return Response(visitors_data)
 
 
+# User-facing messages for check-in refusals (see transitions.check_in_refusal)
+CHECK_IN_MESSAGES = {
+    'visitor information not completed': 'The visitor has not completed their information yet.',
+    'already checked in': 'Visitor already checked in.',
+    'expired': 'Visit has expired. Check-in is only allowed within 30 minutes of scheduled time.',
+}
+
+
+def check_in_refused_response(refusal):
+    reason = str(refusal)
+    return Response({
+        'error': CHECK_IN_MESSAGES.get(reason, f'Cannot check in: {reason}.'),
+        'code': reason.upper().replace(' ', '_')
+    }, status=400)
+
+
+def checked_in_payload(visit_log, user):
+    visit = visit_log.visit_request
+    return {
+        'message': 'Visitor checked in successfully.',
+        'visit_id': visit.id,
+        'visitor_name': visit.visitor.full_name,
+        'check_in_time': visit_log.check_in_time,
+        'checked_in_by': user.username
+    }
+
+
 class VisitLogCheckInAPIView(APIView):
     permission_classes = [IsAuthenticated, IsLobbyAttendant]
 
     def post(self, request):
+        visit_id = request.data.get('visit_id')
         visitor_id = request.data.get('visitor_id')
-        if not visitor_id:
+        if not visit_id and not visitor_id:
             return Response({'error': 'Visitor ID is required.'}, status=400)
-        
+
+        if not visit_id:
+            # Most recent approved visit for this visitor from yesterday to
+            # tomorrow (local time), which covers walk-ins created around
+            # midnight. A range on the raw column keeps the index usable.
+            today = timezone.localdate()
+            window_start, _ = local_day_bounds(today - timedelta(days=1))
+            _, window_end = local_day_bounds(today + timedelta(days=1))
+            visit_id = (
+                VisitRequest.objects.filter(
+                    visitor_id=visitor_id, status='approved',
+                    scheduled_time__gte=window_start, scheduled_time__lt=window_end
+                ).order_by('-scheduled_time').values_list('id', flat=True).first()
+            )
+            if not visit_id:
+                # Visits outside the window are never guessed at: they are either
+                # long expired or not due yet, and belong to another day's board
+                logger.info(f"Check-in failed: no approved visit in the check-in window for visitor {visitor_id}")
+                return Response({
+                    'error': 'No approved visit for this visitor is scheduled between yesterday and tomorrow.',
+                    'code': 'NO_VISIT_IN_WINDOW'
+                }, status=404)
+
         try:
-            # Find the approved visit for this visitor
-            # For walk-ins, we need to be more flexible with the time range
-            today = timezone.now().date()
-            from datetime import timedelta
-            
-            # First, try to find any approved visit for this visitor from the last 24 hours
-            # This handles walk-ins that might have timezone issues
-            yesterday = today - timedelta(days=1)
-            tomorrow = today + timedelta(days=1)
-            
-            # Debug logging
-            print(f"Looking for visitor_id: {visitor_id}")
-            print(f"Date range: {yesterday} to {tomorrow}")
-            
-            visit = VisitRequest.objects.filter(
-                visitor_id=visitor_id,
-                status='approved',
-                scheduled_time__date__gte=yesterday,
-                scheduled_time__date__lte=tomorrow
-            ).order_by('-scheduled_time').first()  # Get the most recent one
-            
-            # If not found with date filtering, try to find any approved visit for this visitor
-            if not visit:
-                print(f"No visit found with date filtering, trying broader search...")
-                visit = VisitRequest.objects.filter(
-                    visitor_id=visitor_id,
-                    status='approved'
-                ).order_by('-scheduled_time').first()
-            
-            if not visit:
-                # Debug: Let's see what visits exist for this visitor
-                all_visits = VisitRequest.objects.filter(visitor_id=visitor_id)
-                print(f"All visits for visitor {visitor_id}: {list(all_visits.values('id', 'status', 'scheduled_time', 'visit_type'))}")
-                
-                return Response({'error': 'No approved visit found for this visitor.'}, status=404)
-            else:
-                print(f"Found visit: {visit.id}, scheduled_time: {visit.scheduled_time}, visit_type: {visit.visit_type}")
-                
-        except VisitRequest.DoesNotExist:
-            return Response({'error': 'No approved visit found for this visitor.'}, status=404)
-
-        # Check if already checked in
-        if VisitLog.objects.filter(visit_request=visit, check_in_time__isnull=False).exists():
-            return Response({'error': 'Visitor already checked in.'}, status=400)
-
-        # Check if visit has expired (only for scheduled visits, not walk-ins)
-        # Allow check-ins within 30 minutes after scheduled time for scheduled visits
-        if visit.visit_type == 'scheduled':
-            from datetime import timedelta
-            # Allow check-in up to 30 minutes after scheduled time
-            latest_checkin_time = visit.scheduled_time + timedelta(minutes=30)
-            if timezone.now() > latest_checkin_time:
-                return Response({'error': 'Visit has expired. Check-in is only allowed within 30 minutes of scheduled time.'}, status=400)
-
-        # Create or get visit log entry
-        visit_log, created = VisitLog.objects.get_or_create(
-            visit_request=visit,
-            defaults={'visitor': visit.visitor}
-        )
+            visit_log = check_in(request.user, id=visit_id)
+        except CheckInRefused as e:
+            return check_in_refused_response(e)
+        if visit_log is None:
+            return Response({'error': 'Visit not found.'}, status=404)
+
+        logger.info(f"Visitor {visit_log.visit_request.visitor.full_name} checked in by {request.user.username} for visit {visit_id}")
+        return Response(checked_in_payload(visit_log, request.user))
 
-        # Log the check-in
-        visit_log.check_in_time = timezone.now()
-        visit_log.checked_in_by = request.user
-        visit_log.save()
-        
-        logger.info(f"Visitor {visit.visitor.full_name} checked in by {request.user.username} for visit {visit.id}")
 
+class ScanCheckInAPIView(APIView):
+    permission_classes = [IsAuthenticated, IsLobbyAttendant]
+
+    def post(self, request, token):
+        """Check in the visit whose invitation QR code was scanned"""
+        try:
+            visit_log = check_in_by_token(token, request.user)
+        except CheckInRefused as e:
+            return check_in_refused_response(e)
+        if visit_log is None:
+            logger.warning(f"Unknown visit token scanned: {token} by {request.user.username}")
+            return Response({'error': 'This QR code does not match any visit.', 'code': 'INVALID_TOKEN'}, status=404)
+
+        visit = visit_log.visit_request
+        logger.info(f"Visitor {visit.visitor.full_name} checked in by scan by {request.user.username} for visit {visit.id}")
         return Response({
-            'message': 'Visitor checked in successfully.',
-            'visit_id': visit.id,
-            'visitor_name': visit.visitor.full_name,
-            'check_in_time': visit_log.check_in_time,
-            'checked_in_by': request.user.username
+            **checked_in_payload(visit_log, request.user),
+            'purpose': visit.purpose,
+            'scheduled_time': visit.scheduled_time,
+            'visit_type': visit.visit_type,
         })
 
 
@@ -794,112 +1021,134 @@ class VisitLogCheckOutAPIView(APIView):
     permission_classes = [IsAuthenticated, IsLobbyAttendant]
 
     def post(self, request):
+        visit_id = request.data.get('visit_id')
         visitor_id = request.data.get('visitor_id')
-        if not visitor_id:
+        if not visit_id and not visitor_id:
             return Response({'error': 'Visitor ID is required.'}, status=400)
-        
-        try:
-            # Find the visit log for this visitor
-            visit_log = VisitLog.objects.get(
+
+        if not visit_id:
+            # A returning visitor can have several logs; take the open one
+            # checked in most recently
+            visit_id = VisitLog.objects.filter(
                 visitor_id=visitor_id,
                 check_in_time__isnull=False,
                 check_out_time__isnull=True
-            )
-        except VisitLog.DoesNotExist:
-            return Response({'error': 'No active visit found for this visitor.'}, status=404)
+            ).order_by('-check_in_time').values_list('visit_request_id', flat=True).first()
+            if not visit_id:
+                return Response({'error': 'No active visit found for this visitor.'}, status=404)
 
-        # Log the check-out
-        visit_log.check_out_time = timezone.now()
-        visit_log.checked_out_by = request.user
-        visit_log.save()
-        
-        logger.info(f"Visitor {visit_log.visitor.full_name} checked out by {request.user.username} for visit {visit_log.visit_request.id}")
+        try:
+            visit_log = check_out(visit_id, request.user)
+        except TransitionRefused as e:
+            if str(e) == NOT_FOUND:
+                return Response({'error': 'Visit not found.'}, status=404)
+            return Response({'error': f'Visitor {e}.', 'code': str(e).upper().replace(' ', '_')}, status=400)
+
+        logger.info(f"Visitor {visit_log.visitor.full_name} checked out by {request.user.username} for visit {visit_id}")
 
         return Response({
             'message': 'Visitor checked out successfully.',
-            'visit_id': visit_log.visit_request.id,
+            'visit_id': visit_log.visit_request_id,
             'visitor_name': visit_log.visitor.full_name,
             'check_out_time': visit_log.check_out_time,
             'checked_out_by': request.user.username
         })
 
 
+def my_visitors_state(view, request):
+    # Covers the delta form too: removals move a hosted visit's updated_at
+    # and deletions drop the row count
+    return visit_state(view.get_queryset(request.user))
+
+
 class MyVisitorsAPIView(APIView):
+    authentication_classes = STATELESS_AUTHENTICATION
     permission_classes = [IsAuthenticated]
 
+    @staticmethod
+    def get_queryset(user):
+        # Every visit hosted by this employee (including converted walk-ins)
+        return VisitRequest.objects.filter(
+            Q(employee=user.id) | Q(original_employee=user.id)
+        )
+
+    @conditional_get(my_visitors_state)
     def get(self, request):
+        watermark = new_watermark()
+        since = request.query_params.get('since')
+        try:
+            since = parse_watermark(since) if since else None
+        except ValueError as e:
+            return Response({'error': f'Invalid watermark: {str(e)}'}, status=400)
+
         # Get all approved visits for this employee (including converted walk-ins)
-        visits = VisitRequest.objects.filter(
+        hosted = self.get_queryset(request.user)
+        visits = hosted.filter(
             status='approved',
             visitor__isnull=False
-        ).filter(
-            Q(employee=request.user) | Q(original_employee=request.user)
-        ).select_related('visitor')
+        )
 
-        data = []
-        for visit in visits:
-            try:
-                visit_log = VisitLog.objects.get(visit_request=visit)
-                is_checked_in = visit_log.check_in_time is not None
-                check_in_time = visit_log.check_in_time
-                is_checked_out = visit_log.check_out_time is not None
-                check_out_time = visit_log.check_out_time
-            except VisitLog.DoesNotExist:
-                is_checked_in = False
-                check_in_time = None
-                is_checked_out = False
-                check_out_time = None
+        if since is not None:
+            payload = visit_delta(hosted, visits, since, self.build_rows, host=request.user.id)
+            payload['watermark'] = format_watermark(watermark)
+            return Response(payload)
+
+        response = Response(self.build_rows(visits))
+        response[WATERMARK_HEADER] = format_watermark(watermark)
+        return response
 
+    @staticmethod
+    def build_rows(queryset):
+        data = []
+        for row in queryset.values(*LOBBY_ROW_FIELDS):
             data.append({
-                'visit_id': visit.id,
-                'visitor_name': visit.visitor.full_name,
-                'visitor_email': visit.visitor.email,
-                'employee_name': visit.employee.username,  # Use username for consistent comparison
-                'purpose': visit.purpose,
-                'scheduled_time': visit.scheduled_time,
-                'is_checked_in': is_checked_in,
-                'check_in_time': check_in_time,
-                'is_checked_out': is_checked_out,
-                'check_out_time': check_out_time,
-                'status': visit.status,
+                'visit_id': row['id'],
+                'visitor_name': row['visitor__full_name'],
+                'visitor_email': row['visitor__email'],
+                'employee_name': row['employee__username'],  # Use username for consistent comparison
+                'purpose': row['purpose'],
+                'scheduled_time': row['scheduled_time'],
+                'is_checked_in': row['visitlog__check_in_time'] is not None,
+                'check_in_time': row['visitlog__check_in_time'],
+                'is_checked_out': row['visitlog__check_out_time'] is not None,
+                'check_out_time': row['visitlog__check_out_time'],
+                'status': row['status'],
             })
-        return Response(data)
+        return data
+
+
+def dashboard_metrics_state(view, request):
+    """Rollup cells behind the metrics; refreshing a cell rewrites its updated_at"""
+    today = timezone.localdate()
+    if is_lobby_attendant(request):
+        cells = DailyVisitStats.objects.filter(date=today, status='approved')
+    else:
+        cells = DailyVisitStats.objects.filter(employee=request.user.id)
+    state = cells.aggregate(cells=Count('id'), updated=Max('updated_at'), visits=Sum('visit_count'))
+    state['date'] = today
+    return state
 
 
 class DashboardMetricsView(APIView):
+    authentication_classes = STATELESS_AUTHENTICATION
     permission_classes = [IsAuthenticated]
 
+    @conditional_get(dashboard_metrics_state)
     def get(self, request):
         try:
             user = request.user
-            today = timezone.now().date()
+            today = timezone.localdate()
             
-            if user.groups.filter(name='lobby_attendant').exists():
-                # Lobby attendant metrics
-                total_visitors = VisitRequest.objects.filter(
-                    status='approved',
-                    scheduled_time__date=today
-                ).count()
-                
-                checked_in = VisitLog.objects.filter(
-                    visit_request__status='approved',
-                    visit_request__scheduled_time__date=today,
-                    check_in_time__isnull=False,
-                    check_out_time__isnull=True
-                ).count()
-                
-                pending_checkin = VisitRequest.objects.filter(
-                    status='approved',
-                    scheduled_time__date=today
-                ).exclude(
-                    visitlog__isnull=False
-                ).count()
-                
-                checked_out = VisitLog.objects.filter(
-                    visit_request__status='approved',
-                    visit_request__scheduled_time__date=today,
-                    check_out_time__isnull=False
-                ).count()
+            if is_lobby_attendant(request):
+                # Lobby attendant metrics, summed from today's approved rollup cells
+                counters = rollup_counters(DailyVisitStats.objects.filter(
+                    date=today,
+                    status='approved'
+                ))
+                total_visitors = counters['total']
+                checked_in = counters['checked_in']
+                pending_checkin = counters['pending']
+                checked_out = counters['checked_out']
                 
                 metrics = [
                     {
@@ -928,28 +1177,26 @@ class DashboardMetricsView(APIView):
                     },
                 ]
             else:
-                # Employee metrics (including converted walk-ins)
-                total_requests = VisitRequest.objects.filter(
-                    Q(employee=user) | Q(original_employee=user)
-                ).count()
+                # Employee metrics from the host's rollup cells. Converting a
+                # visit to a walk-in keeps its host, so converted walk-ins are
+                # still counted under the employee.
+                host_cells = DailyVisitStats.objects.filter(employee=user.id)
+                total_requests = rollup_counters(host_cells)['total']
                 
                 # Count approved visits that haven't been checked in yet (consistent with reports)
-                pending_checkins = VisitRequest.objects.filter(
+                # Visits still waiting for the visitor's details are left out,
+                # which the rollup cells cannot tell apart, so these two come
+                # from one conditional aggregate over the host's approved rows
+                approved_counters = VisitRequest.objects.filter(
+                    Q(employee=user) | Q(original_employee=user),
                     status='approved',
-                    visitor__isnull=False,
-                    visitlog__check_in_time__isnull=True
-                ).filter(
-                    Q(employee=user) | Q(original_employee=user)
-                ).count()
-                
-                active_visitors = VisitRequest.objects.filter(
-                    status='approved',
-                    visitor__isnull=False,
-                    visitlog__check_in_time__isnull=False,
-                    visitlog__check_out_time__isnull=True
-                ).filter(
-                    Q(employee=user) | Q(original_employee=user)
-                ).count()
+                    visitor__isnull=False
+                ).aggregate(
+                    pending=Count('id', filter=Q(visitlog__check_in_time__isnull=True)),
+                    active=Count('id', filter=Q(visitlog__check_in_time__isnull=False, visitlog__check_out_time__isnull=True)),
+                )
+                pending_checkins = approved_counters['pending']
+                active_visitors = approved_counters['active']
                 
                 metrics = [
                     {
@@ -1003,22 +1250,32 @@ class DashboardAnalyticsView(APIView):
             except ValueError as e:
                 return Response({'error': f'Invalid date format: {str(e)}'}, status=400)
 
-            # Base queryset - filter by user role
-            if user.groups.filter(name='lobby_attendant').exists():
-                queryset = VisitRequest.objects.filter(
-                    scheduled_time__gte=start_datetime,
-                    scheduled_time__lte=end_datetime
-                )
-            else:
-                queryset = VisitRequest.objects.filter(
-                    scheduled_time__gte=start_datetime,
-                    scheduled_time__lte=end_datetime
-                ).filter(
+            # Rollup cells for the local dates in range - filter by user role.
+            # end_datetime is exclusive midnight for explicit end dates and
+            # "now" otherwise, in which case today's cells are included.
+            first_day = timezone.localdate(start_datetime)
+            last_day = timezone.localdate(end_datetime)
+            if end_date:
+                last_day -= timedelta(days=1)
+            cells = DailyVisitStats.objects.filter(
+                date__gte=first_day,
+                date__lte=last_day
+            )
+            # Raw visits over the same whole local days, for the figures the
+            # rollup does not carry (timings, hours, purposes, visitor list)
+            queryset = VisitRequest.objects.filter(
+                scheduled_time__gte=local_day_bounds(first_day)[0],
+                scheduled_time__lt=local_day_bounds(last_day)[1]
+            )
+            if not is_lobby_attendant(request):
+                cells = cells.filter(employee=user)
+                queryset = queryset.filter(
                     Q(employee=user) | Q(original_employee=user)
                 )
+            counters = rollup_counters(cells)
 
             # If no data, return zeroed metrics
-            if not queryset.exists():
+            if not counters['total']:
                 return Response({
                     'totalVisitors': 0,
                     'totalVisitRequests': 0,
@@ -1027,6 +1284,7 @@ class DashboardAnalyticsView(APIView):
                     'noShowVisitors': 0,
                     'pendingVisitors': 0,
                     'averageCheckInTime': "N/A",
+                    'averageDwellTime': "N/A",
                     'peakHours': "N/A",
                     'topEmployees': [],
                     'topPurposes': [],
@@ -1034,12 +1292,26 @@ class DashboardAnalyticsView(APIView):
                 })
 
             # Calculate metrics
-            total_visit_requests = queryset.count()
-            total_visitors = queryset.filter(visitlog__check_out_time__isnull=False).count()
-            checked_in_visitors = queryset.filter(visitlog__check_in_time__isnull=False, visitlog__check_out_time__isnull=True).count()
-            checked_out_visitors = queryset.filter(visitlog__check_out_time__isnull=False).count()
-            no_show_visitors = queryset.filter(status='no_show').count()
-            pending_visitors = queryset.filter(status='approved', visitlog__check_in_time__isnull=True).count()
+            total_visit_requests = counters['total']
+            total_visitors = counters['checked_out']
+            checked_in_visitors = counters['checked_in']
+            checked_out_visitors = counters['checked_out']
+            no_show_visitors = counters['no_show']
+            pending_visitors = counters['pending']
+
+            # Average lateness and dwell time, computed in the database
+            timing = visit_timing_averages(queryset)
+
+            # Peak hour from a single GROUP BY over the local hour of day
+            peak_hours = peak_hour_label(hourly_histogram(queryset))
+
+            # Top hosts from the rollup, top purposes from the raw rows
+            top_employees = cells.values('employee__username').annotate(
+                visitor_count=Sum('visit_count')
+            ).order_by('-visitor_count')[:5]
+            top_purposes = queryset.values('purpose').annotate(
+                purpose_count=Count('id')
+            ).order_by('-purpose_count')[:5]
             
             return Response({
                 'totalVisitors': total_visitors,
@@ -1048,11 +1320,18 @@ class DashboardAnalyticsView(APIView):
                 'checkedOutVisitors': checked_out_visitors,
                 'noShowVisitors': no_show_visitors,
                 'pendingVisitors': pending_visitors,
-                'averageCheckInTime': "Calculated from check-in data",
-                'peakHours': "10:00",
-                'topEmployees': [],
-                'topPurposes': [],
-                'visitors': []
+                'averageCheckInTime': format_lateness(timing['lateness']),
+                'averageDwellTime': format_duration(timing['dwell']),
+                'peakHours': peak_hours,
+                'topEmployees': [
+                    {'name': item['employee__username'], 'visitors': item['visitor_count']}
+                    for item in top_employees
+                ],
+                'topPurposes': [
+                    {'purpose': item['purpose'], 'count': item['purpose_count']}
+                    for item in top_purposes
+                ],
+                'visitors': visitor_report_rows(queryset)
             })
             
         except Exception as e:
@@ -1063,7 +1342,16 @@ class DashboardAnalyticsView(APIView):
 
 
 class RecentActivityView(APIView):
+    """
+    Time-ordered activity feed for the current user.
+
+    All activity sources are merged and ordered by the database in a single
+    UNION query. Pass the returned `next_cursor` back as `cursor` to continue;
+    each page is a range scan from the cursor position, however deep the
+    user scrolls. The legacy `page`/`page_size` parameters are still honoured.
+    """
     permission_classes = [IsAuthenticated]
+    MAX_PAGE_SIZE = 100
 
     def get(self, request):
         try:
@@ -1073,175 +1361,57 @@ class RecentActivityView(APIView):
             start_date = request.query_params.get('start_date')
             end_date = request.query_params.get('end_date')
             
-            # Convert dates with timezone awareness
-            if start_date:
-                start_datetime = timezone.make_aware(datetime.strptime(start_date, '%Y-%m-%d'))
-            else:
-                start_datetime = timezone.now() - timedelta(days=7)
-                
-            if end_date:
-                end_datetime = timezone.make_aware(datetime.strptime(end_date, '%Y-%m-%d') + timedelta(days=1))
-            else:
-                end_datetime = timezone.now()
-            
-            activities = []
-            
-            if user.groups.filter(name='lobby_attendant').exists():
-                # Lobby attendant activities - use the specified time period
-                # Recent check-ins
-                recent_checkins = VisitLog.objects.filter(
-                    check_in_time__gte=start_datetime,
-                    check_in_time__lte=end_datetime,
-                    checked_in_by=user
-                ).select_related('visit_request__visitor', 'visit_request__employee').order_by('-check_in_time')[:5]
-                
-                for checkin in recent_checkins:
-                    activities.append({
-                        'id': f"checkin_{checkin.id}",
-                        'type': 'checkin',
-                        'message': f"Checked in visitor {checkin.visit_request.visitor.full_name}",
-                        'details': f"Host: {checkin.visit_request.employee.get_full_name() or checkin.visit_request.employee.username}",
-                        'time': checkin.check_in_time,
-                        'icon': 'UserGroupIcon',
-                        'color': 'green'
-                    })
-                
-                # Recent check-outs
-                recent_checkouts = VisitLog.objects.filter(
-                    check_out_time__gte=start_datetime,
-                    check_out_time__lte=end_datetime,
-                    checked_out_by=user
-                ).select_related('visit_request__visitor', 'visit_request__employee').order_by('-check_out_time')[:5]
-                
-                for checkout in recent_checkouts:
-                    activities.append({
-                        'id': f"checkout_{checkout.id}",
-                        'type': 'checkout',
-                        'message': f"Checked out visitor {checkout.visit_request.visitor.full_name}",
-                        'details': f"Host: {checkout.visit_request.employee.get_full_name() or checkout.visit_request.employee.username}",
-                        'time': checkout.check_out_time,
-                        'icon': 'ClockIcon',
-                        'color': 'gray'
-                    })
-                
-                # Recent walk-in registrations
-                recent_walkins = VisitRequest.objects.filter(
-                    visit_type='walkin',
-                    created_at__gte=start_datetime,
-                    created_at__lte=end_datetime,
-                    employee=user
-                ).select_related('visitor').order_by('-created_at')[:5]
-                
-                for walkin in recent_walkins:
-                    activities.append({
-                        'id': f"walkin_{walkin.id}",
-                        'type': 'walkin',
-                        'message': f"Registered walk-in visitor {walkin.visitor.full_name if walkin.visitor else 'Unknown'}",
-                        'details': f"Purpose: {walkin.purpose}",
-                        'time': walkin.created_at,
-                        'icon': 'PlusIcon',
-                        'color': 'blue'
-                    })
-                
+            try:
+                # Convert dates with timezone awareness
+                if start_date:
+                    start_datetime = timezone.make_aware(datetime.strptime(start_date, '%Y-%m-%d'))
+                else:
+                    start_datetime = timezone.now() - timedelta(days=7)
+                    
+                if end_date:
+                    end_datetime = timezone.make_aware(datetime.strptime(end_date, '%Y-%m-%d') + timedelta(days=1))
+                else:
+                    end_datetime = timezone.now()
+
+                page_size = min(max(int(request.query_params.get('page_size', 10)), 1), self.MAX_PAGE_SIZE)
+                cursor = request.query_params.get('cursor')
+                cursor = decode_cursor(cursor) if cursor else None
+                page = request.query_params.get('page')
+                page = max(int(page), 1) if page and cursor is None else None
+            except InvalidCursor as e:
+                return Response({'error': str(e)}, status=400)
+            except ValueError as e:
+                return Response({'error': f'Invalid parameter: {str(e)}'}, status=400)
+
+            branches = self.get_branches(user, is_lobby_attendant(request), start_datetime, end_datetime)
+
+            if page is None:
+                rows, next_cursor = timeline_page(branches, page_size, cursor)
+                activities = [render_activity(row) for row in rows]
+                payload = {'page_size': page_size, 'next_cursor': next_cursor}
             else:
-                # Employee activities - use the specified time period
-                # Recent visit requests created (including converted walk-ins)
-                recent_requests = VisitRequest.objects.filter(
-                    created_at__gte=start_datetime,
-                    created_at__lte=end_datetime
-                ).filter(
-                    Q(employee=user) | Q(original_employee=user)
-                ).select_related('visitor').order_by('-created_at')[:5]
-                
-                for visit_request in recent_requests:
-                    visitor_name = visit_request.visitor.full_name if visit_request.visitor else 'pending visitor'
-                    activities.append({
-                        'id': f"request_{visit_request.id}",
-                        'type': 'request',
-                        'message': f"Created visit request for {visitor_name}",
-                        'details': f"Purpose: {visit_request.purpose}",
-                        'time': visit_request.created_at,
-                        'icon': 'PlusIcon',
-                        'color': 'blue'
-                    })
-                
-                # Recent approvals (including converted walk-ins)
-                recent_approvals = VisitRequest.objects.filter(
-                    status='approved',
-                    updated_at__gte=start_datetime,
-                    updated_at__lte=end_datetime
-                ).filter(
-                    Q(employee=user) | Q(original_employee=user)
-                ).select_related('visitor').order_by('-updated_at')[:5]
-                
-                for approval in recent_approvals:
-                    visitor_name = approval.visitor.full_name if approval.visitor else 'Unknown'
-                    activities.append({
-                        'id': f"approval_{approval.id}",
-                        'type': 'approval',
-                        'message': f"Approved visit for {visitor_name}",
-                        'details': f"Purpose: {approval.purpose}",
-                        'time': approval.updated_at,
-                        'icon': 'CheckCircleIcon',
-                        'color': 'green'
-                    })
-                
-                # Recent visitor registrations (including converted walk-ins)
-                recent_registrations_qs = VisitRequest.objects.filter(
-                    visitor__isnull=False,
-                    visitor__created_at__gte=start_datetime,
-                    visitor__created_at__lte=end_datetime
-                ).filter(
-                    Q(employee=user) | Q(original_employee=user)
-                ).select_related('visitor').order_by('-visitor__created_at')[:5]
-
-                for registration in recent_registrations_qs:
-                    activities.append({
-                        'id': f"registration_{registration.visitor.id}",
-                        'type': 'registration',
-                        'message': f"Visitor {registration.visitor.full_name} completed registration",
-                        'details': f"Purpose: {registration.purpose}",
-                        'time': registration.visitor.created_at,
-                        'icon': 'UserGroupIcon',
-                        'color': 'green'
-                    })
-                
-                # Recent rejections (including converted walk-ins)
-                recent_rejections = VisitRequest.objects.filter(
-                    status='rejected',
-                    updated_at__gte=start_datetime,
-                    updated_at__lte=end_datetime
-                ).filter(
-                    Q(employee=user) | Q(original_employee=user)
-                ).select_related('visitor').order_by('-updated_at')[:5]
-                
-                for rejection in recent_rejections:
-                    visitor_name = rejection.visitor.full_name if rejection.visitor else 'Unknown'
-                    activities.append({
-                        'id': f"rejection_{rejection.id}",
-                        'type': 'rejection',
-                        'message': f"Rejected visit for {visitor_name}",
-                        'details': f"Purpose: {rejection.purpose}",
-                        'time': rejection.updated_at,
-                        'icon': 'XCircleIcon',
-                        'color': 'red'
-                    })
-            
-            # Sort all activities by time (most recent first)
-            activities.sort(key=lambda x: x['time'], reverse=True)
-
-            # Pagination
-            page = int(request.query_params.get('page', 1))
-            page_size = int(request.query_params.get('page_size', 10))
-            total_activities = len(activities)
-            total_pages = (total_activities + page_size - 1) // page_size
-            start = (page - 1) * page_size
-            end = start + page_size
-            paginated_activities = activities[start:end]
+                # Legacy offset pagination, still ordered and sliced in SQL
+                offset = (page - 1) * page_size
+                merged = merged_timeline(branches, limit=offset + page_size)
+                rows = list(merged[offset:offset + page_size])
+                activities = [render_activity(row) for row in rows]
+                total_activities = merged_timeline(branches).count()
+                next_cursor = None
+                if rows and offset + len(rows) < total_activities:
+                    last = rows[-1]
+                    next_cursor = encode_cursor((last['time'], last['kind'], last['row_id']))
+                payload = {
+                    'count': total_activities,
+                    'page': page,
+                    'page_size': page_size,
+                    'total_pages': (total_activities + page_size - 1) // page_size,
+                    'next_cursor': next_cursor,
+                }
 
             # Format time for display
-            for activity in paginated_activities:
-                time_diff = timezone.now() - activity['time']
+            now = timezone.now()
+            for activity in activities:
+                time_diff = now - activity['time']
                 if time_diff.days > 0:
                     activity['time_display'] = f"{time_diff.days} day{'s' if time_diff.days != 1 else ''} ago"
                 elif time_diff.seconds > 3600:
@@ -1253,13 +1423,8 @@ class RecentActivityView(APIView):
                 else:
                     activity['time_display'] = "Just now"
 
-            return Response({
-                'count': total_activities,
-                'page': page,
-                'page_size': page_size,
-                'total_pages': total_pages,
-                'results': paginated_activities
-            })
+            payload['results'] = activities
+            return Response(payload)
             
         except Exception as e:
             return Response({
@@ -1267,26 +1432,66 @@ class RecentActivityView(APIView):
                 'detail': str(e)
             }, status=500)
 
+    @staticmethod
+    def get_branches(user, lobby, start_datetime, end_datetime):
+        """
+        Activity sources of the feed, each bounded to the time period.
+
+        Every source is a slice of the VisitEvent log, read through its
+        (actor | host, event_type, created_at) indexes.
+        """
+        events = VisitEvent.objects.filter(
+            created_at__gte=start_datetime,
+            created_at__lte=end_datetime
+        )
+
+        def branch(kind, event_type, **filters):
+            return TimelineBranch(
+                kind,
+                events.filter(event_type=event_type, **filters),
+                'created_at',
+                prefix='visit__'
+            )
+
+        if lobby:
+            # Check-ins, check-outs and walk-in registrations by the attendant
+            return [
+                branch('checkin', 'checked_in', actor=user),
+                branch('checkout', 'checked_out', actor=user),
+                branch('walkin', 'created', actor=user, visit__visit_type='walkin'),
+            ]
+
+        # Employee activities on the visits they host
+        return [
+            branch('request', 'created', host=user),
+            branch('approval', 'approved', host=user),
+            branch('registration', 'registered', host=user),
+            branch('rejection', 'rejected', host=user),
+        ]
+
 
 class CancelVisitAPIView(APIView):
     permission_classes = [IsAuthenticated]
 
     def post(self, request, pk):
-        try:
-            visit = VisitRequest.objects.get(pk=pk, employee=request.user)
-        except VisitRequest.DoesNotExist:
-            return Response({'error': 'Visit not found.'}, status=404)
+        with transaction.atomic():
+            try:
+                visit = transition(
+                    pk, ['approved'], 'canceled', request.user,
+                    scope=VisitRequest.objects.filter(employee=request.user)
+                )
+            except TransitionRefused as e:
+                return refused_response(e, default='Only approved visits can be canceled.')
 
-        if visit.status != 'approved':
-            return Response({'error': 'Only approved visits can be canceled.'}, status=400)
+            # Queue cancellation email to visitor if exists
+            if visit.visitor:
+                self.send_cancellation_email(visit)
 
-        visit.status = 'canceled'
-        visit.save()
+        return Response({'message': 'Visit canceled successfully.'})
 
-        # Send cancellation email to visitor if exists
-        if visit.visitor:
-            subject = f"Visit Canceled - {visit.visitor.full_name}"
-            message = f"""
+    def send_cancellation_email(self, visit):
+        subject = f"Visit Canceled - {visit.visitor.full_name}"
+        message = f"""
 Dear {visit.visitor.full_name},
 
 Your visit scheduled for {visit.scheduled_time.strftime('%Y-%m-%d %H:%M')} has been canceled by {visit.employee.get_full_name() or visit.employee.username}.
@@ -1294,116 +1499,205 @@ Your visit scheduled for {visit.scheduled_time.strftime('%Y-%m-%d %H:%M')} has b
 If you have questions, please contact your host.
 
 Thank you.
-            """
-            try:
-                send_mail(subject, message, settings.DEFAULT_FROM_EMAIL, [visit.visitor.email])
-            except Exception as e:
-                print(f"Failed to send cancellation email: {e}")
-
-        return Response({'message': 'Visit canceled successfully.'})
+        """
+        enqueue_email(subject, message, [visit.visitor.email])
 
 class NoShowVisitAPIView(APIView):
     permission_classes = [IsAuthenticated, IsLobbyAttendant]
 
     def post(self, request, pk):
-        try:
-            visit = VisitRequest.objects.get(pk=pk)
-        except VisitRequest.DoesNotExist:
-            return Response({'error': 'Visit not found.'}, status=404)
+        with transaction.atomic():
+            try:
+                visit = transition(pk, ['approved'], 'no_show', request.user)
+            except TransitionRefused as e:
+                return refused_response(e, default='Only approved visits can be marked as no show.')
 
-        if visit.status != 'approved':
-            return Response({'error': 'Only approved visits can be marked as no show.'}, status=400)
+            # Queue no show email to employee and visitor if exists
+            self.send_no_show_email(visit)
 
-        visit.status = 'no_show'
-        visit.save()
+        return Response({'message': 'Visit marked as no show.'})
 
-        # Send no show email to employee and visitor if exists
-        subject = f"Visit Marked as No Show - {visit.purpose}"
-        message = f"""
-Dear {visit.employee.get_full_name() or visit.employee.username},
+    def send_no_show_email(self, visit):
+        enqueue_email(*no_show_email(visit))
 
-The visit scheduled for {visit.scheduled_time.strftime('%Y-%m-%d %H:%M')} with visitor {visit.visitor.full_name if visit.visitor else 'Unknown'} was marked as 'No Show' by the lobby attendant.
 
-If this is a mistake, please contact the lobby desk.
+class BulkVisitActionAPIView(APIView):
+    """
+    Base of the bulk transition endpoints.
 
-Thank you.
-        """
-        recipients = [visit.employee.email]
-        if visit.visitor:
-            recipients.append(visit.visitor.email)
+    POST {"visit_ids": [...]} applies the transition to every id in one
+    transaction and answers {"updated", "results": [{"visit_id", "result"}]},
+    where result is "ok", "not_found" or the reason the visit was skipped.
+    """
+    # Builds (subject, message, recipients) for each moved visit, if any
+    notification = None
+    # Whether the notification is only sent to visits with visitor details
+    notify_requires_visitor = True
+
+    def post(self, request):
+        visit_ids = request.data.get('visit_ids')
+        if not isinstance(visit_ids, list) or not visit_ids:
+            return Response({'error': 'visit_ids must be a non-empty list.'}, status=400)
         try:
-            send_mail(subject, message, settings.DEFAULT_FROM_EMAIL, recipients)
-        except Exception as e:
-            print(f"Failed to send no show email: {e}")
+            visit_ids = list(dict.fromkeys(int(visit_id) for visit_id in visit_ids))
+        except (TypeError, ValueError):
+            return Response({'error': 'visit_ids must contain integers.'}, status=400)
+        if len(visit_ids) > BULK_MAX_IDS:
+            return Response({'error': f'At most {BULK_MAX_IDS} visits can be updated at once.'}, status=400)
+
+        with transaction.atomic():
+            outcome = self.apply(request, visit_ids)
+            if self.notification and outcome.moved:
+                # One INSERT queues every notification with the state change
+                visits = VisitRequest.objects.filter(id__in=outcome.moved).select_related('visitor', 'employee')
+                enqueue_emails([
+                    self.notification(visit)
+                    for visit in visits
+                    if visit.visitor or not self.notify_requires_visitor
+                ])
 
-        return Response({'message': 'Visit marked as no show.'})
+        logger.info(f"{type(self).__name__}: {len(outcome.moved)} of {len(visit_ids)} visits updated by {request.user.username}")
+        return Response(outcome.as_payload())
+
+    def apply(self, request, visit_ids):
+        raise NotImplementedError
+
+
+class BulkApproveVisitsAPIView(BulkVisitActionAPIView):
+    permission_classes = [IsAuthenticated]
+    notification = staticmethod(approval_email)
+
+    def apply(self, request, visit_ids):
+        return bulk_status_change(
+            visit_ids, 'pending', 'approved', request.user,
+            scope=VisitRequest.objects.filter(employee=request.user),
+            require_visitor=True
+        )
+
+
+class BulkRejectVisitsAPIView(BulkVisitActionAPIView):
+    permission_classes = [IsAuthenticated]
+    notification = staticmethod(rejection_email)
+
+    def apply(self, request, visit_ids):
+        return bulk_status_change(
+            visit_ids, 'pending', 'rejected', request.user,
+            scope=VisitRequest.objects.filter(employee=request.user)
+        )
+
+
+class BulkNoShowVisitsAPIView(BulkVisitActionAPIView):
+    permission_classes = [IsAuthenticated, IsLobbyAttendant]
+    notification = staticmethod(no_show_email)
+    notify_requires_visitor = False
+
+    def apply(self, request, visit_ids):
+        # A visitor who checked in (and maybe out) did show up
+        return bulk_status_change(visit_ids, 'approved', 'no_show', request.user, require_no_check_in=True)
+
+
+class BulkCheckInAPIView(BulkVisitActionAPIView):
+    permission_classes = [IsAuthenticated, IsLobbyAttendant]
+
+    def apply(self, request, visit_ids):
+        return bulk_check_in(visit_ids, request.user)
+
+
+class BulkCheckOutAPIView(BulkVisitActionAPIView):
+    permission_classes = [IsAuthenticated, IsLobbyAttendant]
+
+    def apply(self, request, visit_ids):
+        return bulk_check_out(visit_ids, request.user)
 
 
 class TodayAllVisitsAPIView(APIView):
+    authentication_classes = STATELESS_AUTHENTICATION
     permission_classes = [IsAuthenticated, IsLobbyAttendant]
 
+    # Ranges wider than this are streamed instead of built in memory
+    STREAMING_THRESHOLD_DAYS = 7
+    CHUNK_SIZE = 500
+
     def get(self, request):
-        from datetime import datetime, timedelta
-        from django.utils import timezone
-        from django.db import models
-        import pytz
-
-        # Get query parameters - handle both DRF and regular Django requests
-        if hasattr(request, 'query_params'):
-            start_date_str = request.query_params.get('start_date')
-            end_date_str = request.query_params.get('end_date')
-        else:
-            start_date_str = request.GET.get('start_date')
-            end_date_str = request.GET.get('end_date')
+        watermark = new_watermark()
+        start_date_str = request.query_params.get('start_date')
+        end_date_str = request.query_params.get('end_date')
+        since = request.query_params.get('since')
 
         # Default to current week (Monday to Sunday)
-        now = timezone.now()
-        # Ensure aware datetime
-        if timezone.is_naive(now):
-            now = timezone.make_aware(now, timezone.get_current_timezone())
+        now = timezone.localtime()
         start_of_week = now - timedelta(days=now.weekday())
         start_of_week = start_of_week.replace(hour=0, minute=0, second=0, microsecond=0)
         end_of_week = start_of_week + timedelta(days=6, hours=23, minutes=59, seconds=59)
 
         # Parse custom dates if provided
-        if start_date_str:
-            start_of_week = datetime.strptime(start_date_str, '%Y-%m-%d')
-            start_of_week = timezone.make_aware(start_of_week, timezone.get_current_timezone())
-        if end_date_str:
-            end_of_week = datetime.strptime(end_date_str, '%Y-%m-%d') + timedelta(days=1)
-            end_of_week = timezone.make_aware(end_of_week, timezone.get_current_timezone())
+        try:
+            if start_date_str:
+                start_of_week = timezone.make_aware(datetime.strptime(start_date_str, '%Y-%m-%d'))
+            if end_date_str:
+                end_of_week = timezone.make_aware(datetime.strptime(end_date_str, '%Y-%m-%d') + timedelta(days=1))
+        except ValueError as e:
+            return Response({'error': f'Invalid date format: {str(e)}'}, status=400)
+        try:
+            since = parse_watermark(since) if since else None
+        except ValueError as e:
+            return Response({'error': f'Invalid watermark: {str(e)}'}, status=400)
 
         # Include all visits in the date range, including walk-ins
         # Also include visits created today regardless of scheduled time
-        visits = VisitRequest.objects.filter(
-            models.Q(scheduled_time__gte=start_of_week, scheduled_time__lt=end_of_week) |
-            models.Q(created_at__date=timezone.now().date())
+        today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
+        in_range = VisitRequest.objects.filter(
+            Q(scheduled_time__gte=start_of_week, scheduled_time__lt=end_of_week) |
+            Q(created_at__gte=today_start, created_at__lt=today_start + timedelta(days=1))
         )
-        
 
-        data = []
-        for visit in visits:
-            try:
-                visitlog = visit.visitlog
-            except Exception:
-                visitlog = None
+        if since is not None:
+            # Visits rescheduled out of the range come back as removed
+            payload = visit_delta(
+                VisitRequest.objects.all(),
+                in_range,
+                since,
+                lambda queryset: [self.build_row(row) for row in queryset.values(*LOBBY_ROW_FIELDS)]
+            )
+            payload['watermark'] = format_watermark(watermark)
+            return Response(payload)
 
-            data.append({
-                'visit_id': visit.id,
-                'visitor_id': visit.visitor.id if visit.visitor else None,
-                'visitor_name': visit.visitor.full_name if visit.visitor else '',
-                'visitor_email': visit.visitor.email if visit.visitor else '',
-                'employee_name': visit.employee.get_full_name() or visit.employee.username,
-                'purpose': visit.purpose,
-                'scheduled_time': visit.scheduled_time,
-                'visit_type': visit.visit_type,
-                'status': visit.status,
-                'is_checked_in': visitlog.check_in_time is not None if visitlog else False,
-                'check_in_time': visitlog.check_in_time if visitlog else None,
-                'is_checked_out': visitlog.check_out_time is not None if visitlog else False,
-                'check_out_time': visitlog.check_out_time if visitlog else None,
-            })
-        return Response(data)
+        visits = in_range.values(*LOBBY_ROW_FIELDS)
+
+        if (end_of_week - start_of_week).days > self.STREAMING_THRESHOLD_DAYS:
+            rows = (self.build_row(row) for row in visits.iterator(chunk_size=self.CHUNK_SIZE))
+            response = StreamingHttpResponse(
+                stream_json_array(rows, self.CHUNK_SIZE),
+                content_type='application/json'
+            )
+        else:
+            response = Response([self.build_row(row) for row in visits])
+        response[WATERMARK_HEADER] = format_watermark(watermark)
+        return response
+
+    @staticmethod
+    def build_row(row):
+        return {
+            'visit_id': row['id'],
+            'visitor_id': row['visitor_id'],
+            'visitor_name': row['visitor__full_name'] or '',
+            'visitor_email': row['visitor__email'] or '',
+            'employee_name': display_name(row['employee__first_name'], row['employee__last_name'], row['employee__username']),
+            'purpose': row['purpose'],
+            'scheduled_time': row['scheduled_time'],
+            'visit_type': row['visit_type'],
+            'status': row['status'],
+            'is_checked_in': row['visitlog__check_in_time'] is not None,
+            'check_in_time': row['visitlog__check_in_time'],
+            'is_checked_out': row['visitlog__check_out_time'] is not None,
+            'check_out_time': row['visitlog__check_out_time'],
+            'mark_no_show_after': manual_no_show_after(
+                row['status'], row['visitlog__check_in_time'], row['scheduled_time']
+            ),
+            'no_show_at': no_show_deadline(
+                row['status'], row['visit_type'], row['visitlog__check_in_time'], row['scheduled_time']
+            ),
+        }
 
 
 class ReportsAPIView(APIView):
@@ -1411,75 +1705,41 @@ class ReportsAPIView(APIView):
     
     def get(self, request):
         try:
-            # Get query parameters
-            start_date = request.query_params.get('start_date')
-            end_date = request.query_params.get('end_date')
-            status_filter = request.query_params.get('status', 'all')
-            employee_filter = request.query_params.get('employee', 'all')
-            visit_type_filter = request.query_params.get('visit_type', 'all')
-            
-            # Convert dates with timezone awareness
-            if start_date:
-                start_datetime = timezone.make_aware(datetime.strptime(start_date, '%Y-%m-%d'))
-            else:
-                start_datetime = timezone.now() - timedelta(days=7)
-                
-            if end_date:
-                end_datetime = timezone.make_aware(datetime.strptime(end_date, '%Y-%m-%d') + timedelta(days=1))
-            else:
-                end_datetime = timezone.now()
-            
-            # Base queryset
-            queryset = VisitRequest.objects.filter(
-                scheduled_time__gte=start_datetime,
-                scheduled_time__lte=end_datetime
-            )
-            
-            # Apply filters
-            if status_filter != 'all':
-                if status_filter == 'checked_in':
-                    queryset = queryset.filter(visitlog__check_in_time__isnull=False, visitlog__check_out_time__isnull=True)
-                elif status_filter == 'checked_out':
-                    queryset = queryset.filter(visitlog__check_out_time__isnull=False)
-                else:
-                    queryset = queryset.filter(status=status_filter)
-            
-            if employee_filter != 'all':
-                queryset = queryset.filter(employee__username=employee_filter)
-            
-            if visit_type_filter != 'all':
-                queryset = queryset.filter(visit_type=visit_type_filter)
+            filters = report_filters(request.query_params)
+            try:
+                queryset = report_queryset(filters)
+            except ValueError as e:
+                return Response({'error': f'Invalid date format: {str(e)}'}, status=400)
             
-            # Calculate metrics
-            total_visitors = queryset.count()
-            checked_in_visitors = queryset.filter(visitlog__check_in_time__isnull=False, visitlog__check_out_time__isnull=True).count()
-            checked_out_visitors = queryset.filter(visitlog__check_out_time__isnull=False).count()
-            no_show_visitors = queryset.filter(status='no_show').count()
+            # Calculate metrics: summed from the daily rollup when the filters
+            # map onto its cells, otherwise one conditional aggregate query
+            cells = report_rollup_cells(filters)
+            counters = rollup_counters(cells) if cells is not None else visit_status_counters(queryset)
+            total_visitors = counters['total']
+            checked_in_visitors = counters['checked_in']
+            checked_out_visitors = counters['checked_out']
+            no_show_visitors = counters['no_show']
             # Updated logic: approved but not checked in
-            pending_visitors = queryset.filter(status='approved', visitlog__check_in_time__isnull=True).count()
+            pending_visitors = counters['pending']
             
-            # Calculate average check-in time
-            checked_in_requests = queryset.filter(visitlog__check_in_time__isnull=False, visitlog__check_out_time__isnull=True)
-            if checked_in_requests.exists():
-                # This is a simplified calculation - in a real scenario you'd need more complex logic
-                average_check_in_time = "Calculated from check-in data"
-            else:
-                average_check_in_time = "N/A"
+            # Average lateness and dwell time, computed in the database
+            timing = visit_timing_averages(queryset)
+            average_check_in_time = format_lateness(timing['lateness'])
+            average_dwell_time = format_duration(timing['dwell'])
             
-            # Get peak hours
-            hourly_distribution = {}
-            for hour in range(24):
-                hourly_distribution[hour] = queryset.filter(
-                    scheduled_time__hour=hour
-                ).count()
-            
-            peak_hour = max(hourly_distribution, key=hourly_distribution.get)
-            peak_hours = f"{peak_hour}:00"
+            # Get peak hours from a single GROUP BY over the local hour of day
+            hourly_distribution = hourly_histogram(queryset)
+            peak_hours = peak_hour_label(hourly_distribution)
             
             # Top hosting employees
-            top_employees = queryset.values('employee__username').annotate(
-                visitor_count=Count('id')
-            ).order_by('-visitor_count')[:5]
+            if cells is not None:
+                top_employees = cells.values('employee__username').annotate(
+                    visitor_count=Sum('visit_count')
+                ).order_by('-visitor_count')[:5]
+            else:
+                top_employees = queryset.values('employee__username').annotate(
+                    visitor_count=Count('id')
+                ).order_by('-visitor_count')[:5]
             
             top_employees_list = [
                 {'name': item['employee__username'], 'visitors': item['visitor_count']}
@@ -1496,29 +1756,8 @@ class ReportsAPIView(APIView):
                 for item in top_purposes
             ]
             
-            # Get detailed visitor list
-            visitors_data = []
-            for visit in queryset.select_related('visitor', 'employee').order_by('-scheduled_time')[:100]:
-                # Get visit log if it exists
-                try:
-                    visit_log = VisitLog.objects.get(visit_request=visit)
-                    check_in_time = visit_log.check_in_time.isoformat() if visit_log.check_in_time else None
-                    check_out_time = visit_log.check_out_time.isoformat() if visit_log.check_out_time else None
-                except VisitLog.DoesNotExist:
-                    check_in_time = None
-                    check_out_time = None
-                
-                visitors_data.append({
-                    'visit_id': visit.id,
-                    'visitor_name': visit.visitor.full_name if visit.visitor else 'Unknown',
-                    'employee_name': visit.employee.username,
-                    'scheduled_time': visit.scheduled_time.isoformat(),
-                    'status': visit.status,
-                    'check_in_time': check_in_time,
-                    'check_out_time': check_out_time,
-                    'purpose': visit.purpose,
-                    'visit_type': visit.visit_type
-                })
+            # Get detailed visitor list (visitor, host and visit log joined)
+            visitors_data = visitor_report_rows(queryset)
             
             return Response({
                 'totalVisitors': total_visitors,
@@ -1528,7 +1767,12 @@ class ReportsAPIView(APIView):
                 'noShowVisitors': no_show_visitors,
                 'pendingVisitors': pending_visitors,
                 'averageCheckInTime': average_check_in_time,
+                'averageDwellTime': average_dwell_time,
                 'peakHours': peak_hours,
+                'hourlyDistribution': [
+                    {'hour': hour, 'count': count}
+                    for hour, count in hourly_distribution.items()
+                ],
                 'topEmployees': top_employees_list,
                 'topPurposes': top_purposes_list,
                 'visitors': visitors_data
@@ -1540,90 +1784,52 @@ class ReportsAPIView(APIView):
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+class ExportContentNegotiation(DefaultContentNegotiation):
+    """
+    Ignore DRF's ?format= renderer override.
+
+    The report download endpoints use `format` for the file type (csv, xlsx),
+    which DRF would otherwise treat as an unknown renderer and answer with 404.
+    """
+
+    def filter_renderers(self, renderers, format):
+        return renderers
+
+
 class ReportsDownloadAPIView(APIView):
     permission_classes = [IsAuthenticated, IsLobbyAttendant]
-    
+    content_negotiation_class = ExportContentNegotiation
     
     def get(self, request):
         try:
-            # Get query parameters
             format_type = request.query_params.get('format', 'csv')
-            start_date = request.query_params.get('start_date')
-            end_date = request.query_params.get('end_date')
-            status_filter = request.query_params.get('status', 'all')
-            employee_filter = request.query_params.get('employee', 'all')
-            visit_type_filter = request.query_params.get('visit_type', 'all')
-            
-            # Convert dates with timezone awareness
-            if start_date:
-                start_datetime = timezone.make_aware(datetime.strptime(start_date, '%Y-%m-%d'))
-            else:
-                start_datetime = timezone.now() - timedelta(days=7)
-                
-            if end_date:
-                end_datetime = timezone.make_aware(datetime.strptime(end_date, '%Y-%m-%d') + timedelta(days=1))
-            else:
-                end_datetime = timezone.now()
-            
-            # Base queryset
-            queryset = VisitRequest.objects.filter(
-                scheduled_time__gte=start_datetime,
-                scheduled_time__lte=end_datetime
-            ).select_related('visitor', 'employee')
-            
-            # Apply filters
-            if status_filter != 'all':
-                if status_filter == 'checked_in':
-                    queryset = queryset.filter(visitlog__check_in_time__isnull=False, visitlog__check_out_time__isnull=True)
-                elif status_filter == 'checked_out':
-                    queryset = queryset.filter(visitlog__check_out_time__isnull=False)
-                else:
-                    queryset = queryset.filter(status=status_filter)
-            
-            if employee_filter != 'all':
-                queryset = queryset.filter(employee__username=employee_filter)
-            
-            if visit_type_filter != 'all':
-                queryset = queryset.filter(visit_type=visit_type_filter)
+            filters = report_filters(request.query_params)
+            try:
+                queryset = report_queryset(filters)
+            except ValueError as e:
+                return Response({'error': f'Invalid date format: {str(e)}'}, status=400)
             
-            # Generate CSV/Excel file
+            # Stream the CSV row by row so large exports keep memory flat
             if format_type == 'csv':
-                response = HttpResponse(content_type='text/csv')
-                response['Content-Disposition'] = f'attachment; filename="visitor_report_{start_date}_to_{end_date}.csv"'
-                
-                writer = csv.writer(response)
-                writer.writerow([
-                    'Visitor Name',
-                    'Employee Name',
-                    'Scheduled Time',
-                    'Status',
-                    'Check-in Time',
-                    'Check-out Time',
-                    'Purpose',
-                    'Visit Type'
-                ])
-                
-                for visit in queryset:
-                    try:
-                        visit_log = VisitLog.objects.get(visit_request=visit)
-                        check_in_time = visit_log.check_in_time.strftime('%Y-%m-%d %H:%M:%S') if visit_log.check_in_time else ''
-                        check_out_time = visit_log.check_out_time.strftime('%Y-%m-%d %H:%M:%S') if visit_log.check_out_time else ''
-                    except VisitLog.DoesNotExist:
-                        check_in_time = ''
-                        check_out_time = ''
-                    
-                    writer.writerow([
-                        visit.visitor.full_name if visit.visitor else 'Unknown',
-                        visit.employee.username,
-                        visit.scheduled_time.strftime('%Y-%m-%d %H:%M:%S'),
-                        visit.status,
-                        check_in_time,
-                        check_out_time,
-                        visit.purpose,
-                        visit.visit_type
-                    ])
-                
+                filename = f"visitor_report_{filters['start_date']}_to_{filters['end_date']}.csv"
+                response = StreamingHttpResponse(
+                    stream_csv(queryset, label=filename),
+                    content_type='text/csv'
+                )
+                response['Content-Disposition'] = f'attachment; filename="{filename}"'
                 return response
+            elif format_type == 'xlsx':
+                filename = f"visitor_report_{filters['start_date']}_to_{filters['end_date']}.xlsx"
+                # The workbook is spooled to a temporary file and streamed from there
+                workbook_file = tempfile.TemporaryFile()
+                write_xlsx(queryset, workbook_file, label=filename)
+                workbook_file.seek(0)
+                return FileResponse(
+                    workbook_file,
+                    as_attachment=True,
+                    filename=filename,
+                    content_type=XLSX_CONTENT_TYPE
+                )
             else:
                 return Response({'error': 'Unsupported format'}, status=400)
                 
@@ -1633,17 +1839,127 @@ class ReportsDownloadAPIView(APIView):
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+def export_job_data(job):
+    data = {
+        'job_id': str(job.id),
+        'status': job.status,
+        'format': job.format,
+        'filters': job.filters,
+        'row_count': job.row_count,
+        'created_at': job.created_at,
+        'finished_at': job.finished_at,
+    }
+    if job.status == 'done':
+        data['download_url'] = reverse('report-export-download', args=[job.id])
+    if job.status == 'failed':
+        data['error'] = job.error
+    return data
+
+
+class ReportExportAPIView(APIView):
+    permission_classes = [IsAuthenticated, IsLobbyAttendant]
+
+    def post(self, request):
+        """Queue a report export, or reuse a cached artifact for identical data"""
+        format_type = request.data.get('format', 'csv')
+        if format_type not in ('csv', 'xlsx'):
+            return Response({'error': 'Unsupported format'}, status=400)
+
+        filters = normalize_report_filters(report_filters(request.data))
+        try:
+            cache_key = export_cache_key(filters, format_type)
+        except ValueError as e:
+            return Response({'error': f'Invalid date format: {str(e)}'}, status=400)
+
+        # Jobs belong to the attendant who requested them, since their filters
+        # (e.g. a single host) decide whose visits the file contains
+        own_jobs = ReportExport.objects.filter(requested_by=request.user, cache_key=cache_key)
+
+        # Serve a finished artifact for the same filters and data watermark
+        cached = own_jobs.filter(status='done').first()
+        if cached and cached.file_name and os.path.exists(export_path(cached.file_name)):
+            return Response(dict(export_job_data(cached), cached=True))
+
+        # Join an identical job that is queued, or running within its lease
+        job = own_jobs.filter(
+            Q(status='queued') | Q(status='running', started_at__gte=stale_export_cutoff())
+        ).first()
+        if job is None:
+            job = ReportExport.objects.create(
+                requested_by=request.user,
+                filters=filters,
+                format=format_type,
+                cache_key=cache_key,
+            )
+            logger.info(f"User {request.user.username} queued {format_type} report export {job.id}")
+
+        return Response(dict(export_job_data(job), cached=False), status=status.HTTP_202_ACCEPTED)
+
+
+class ReportExportDetailAPIView(APIView):
+    permission_classes = [IsAuthenticated, IsLobbyAttendant]
+
+    def get(self, request, job_id):
+        """Poll the status of a report export job"""
+        try:
+            job = ReportExport.objects.get(pk=job_id, requested_by=request.user)
+        except ReportExport.DoesNotExist:
+            return Response({'error': 'Export not found.'}, status=404)
+        return Response(export_job_data(job))
+
+
+class ReportExportDownloadAPIView(APIView):
+    permission_classes = [IsAuthenticated, IsLobbyAttendant]
+
+    def get(self, request, job_id):
+        """Download the file produced by a finished export job"""
+        try:
+            job = ReportExport.objects.get(pk=job_id, requested_by=request.user)
+        except ReportExport.DoesNotExist:
+            return Response({'error': 'Export not found.'}, status=404)
+
+        if job.status != 'done' or not job.file_name:
+            return Response({'error': f'Export is {job.status}.'}, status=409)
+
+        path = export_path(job.file_name)
+        if not os.path.exists(path):
+            return Response({'error': 'Export file is no longer available.'}, status=410)
+
+        start_date = job.filters.get('start_date')
+        end_date = job.filters.get('end_date')
+        return FileResponse(
+            open(path, 'rb'),
+            as_attachment=True,
+            filename=f"visitor_report_{start_date}_to_{end_date}.{job.format}",
+            content_type=XLSX_CONTENT_TYPE if job.format == 'xlsx' else 'text/csv'
+        )
+
+
+def employee_list_state(view, request):
+    # Users carry no updated_at, so hash the rendered columns themselves;
+    # the list is small and this skips building and serializing it
+    rows = view.get_queryset().distinct().values_list('id', 'username', 'first_name', 'last_name').order_by('id')
+    digest = hashlib.sha1(json.dumps(list(rows)).encode('utf-8')).hexdigest()
+    return {'users': digest}
+
+
 class EmployeeListAPIView(APIView):
+    authentication_classes = STATELESS_AUTHENTICATION
     permission_classes = [IsAuthenticated, IsLobbyAttendant]
-    
+
+    @staticmethod
+    def get_queryset():
+        # All users (employees and lobby attendants) who have hosted visitors
+        return User.objects.filter(
+            Q(groups__name='employee') | Q(groups__name='lobby_attendant'),
+            visitrequest__isnull=False  # Only users who have hosted visitors
+        )
+
+    @conditional_get(employee_list_state)
     def get(self, request):
         """Get list of employees and lobby attendants for reports filter dropdown"""
         try:
-            # Get all users (employees and lobby attendants) who have hosted visitors
-            users = User.objects.filter(
-                Q(groups__name='employee') | Q(groups__name='lobby_attendant'),
-                visitrequest__isnull=False  # Only users who have hosted visitors
-            ).distinct().values('id', 'username', 'first_name', 'last_name').order_by('first_name', 'last_name')
+            users = self.get_queryset().distinct().values('id', 'username', 'first_name', 'last_name').order_by('first_name', 'last_name')
             
             user_list = []
             for user in users:
@@ -1668,3 +1984,55 @@ class EmployeeListAPIView(APIView):
             return Response({
                 'error': f'Failed to fetch employee list: {str(e)}'
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+class VisitorImportAPIView(APIView):
+    """
+    Pre-register many visitors at once, e.g. for a conference or training day.
+
+    Accepts a CSV upload (`file`) or a JSON `visitors` list with the columns
+    full_name, email, contact, address, scheduled_time and purpose; request
+    level scheduled_time and purpose apply to rows that leave them out. All
+    rows are validated first and nothing is imported if any row fails.
+    """
+    permission_classes = [IsAuthenticated]
+    content_negotiation_class = ExportContentNegotiation
+
+    def post(self, request):
+        upload = request.FILES.get('file')
+        try:
+            rows = read_csv_rows(upload) if upload else request.data.get('visitors')
+        except (ValueError, UnicodeDecodeError, csv.Error) as e:
+            return Response({'error': f'Could not read the CSV file: {str(e)}'}, status=400)
+        if not isinstance(rows, list) or not rows or not all(isinstance(row, dict) for row in rows):
+            return Response({'error': 'Provide a CSV file or a non-empty visitors list.'}, status=400)
+        if len(rows) > IMPORT_MAX_ROWS:
+            return Response({'error': f'At most {IMPORT_MAX_ROWS} visitors can be imported at once.'}, status=400)
+
+        validated, errors = validate_import(rows, {
+            'scheduled_time': request.data.get('scheduled_time'),
+            'purpose': request.data.get('purpose'),
+        })
+        if errors:
+            return Response({
+                'error': 'Please correct the errors below and try again.',
+                'code': 'VALIDATION_ERROR',
+                'details': errors
+            }, status=400)
+
+        send_invitations = str(request.data.get('send_invitations', '')).lower() in ('1', 'true', 'yes')
+        try:
+            results = import_visitors(validated, request.user, send_invitations=send_invitations)
+        except ImportInProgress as e:
+            return Response({'error': str(e)}, status=status.HTTP_409_CONFLICT)
+
+        if request.query_params.get('format') == 'csv':
+            stream = StringIO()
+            write_checkin_csv(results, stream)
+            response = HttpResponse(stream.getvalue(), content_type='text/csv', status=201)
+            response['Content-Disposition'] = 'attachment; filename="checkin_tokens.csv"'
+            return response
+        return Response({
+            'created': len(results),
+            'visits': results
+        }, status=status.HTTP_201_CREATED)
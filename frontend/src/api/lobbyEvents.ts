@@ -0,0 +1,69 @@
+import { useEffect, useRef, useState } from 'react';
+import axiosInstance from './axiosInstance';
+
+// Visit changes pushed by /api/lobby/events/
+const EVENT_TYPES = ['approved', 'checked_in', 'checked_out', 'no_show', 'canceled', 'converted', 'walkin', 'deleted', 'resync'];
+
+// Delay before opening a new stream, doubled after each failure
+const RECONNECT_DELAY = 3000;
+const MAX_RECONNECT_DELAY = 60000;
+
+/**
+ * Subscribe to the lobby event stream.
+ *
+ * Each connection is opened with a fresh one-minute ticket, because EventSource
+ * cannot send the Authorization header. Returns whether the stream is open, so
+ * callers can fall back to polling while it is not (e.g. behind a WSGI server).
+ */
+export const useLobbyEvents = (onEvent: (type: string) => void): boolean => {
+  const [connected, setConnected] = useState(false);
+  const onEventRef = useRef(onEvent);
+  onEventRef.current = onEvent;
+
+  useEffect(() => {
+    let source: EventSource | null = null;
+    let retry: ReturnType<typeof setTimeout> | null = null;
+    let closed = false;
+    let delay = RECONNECT_DELAY;
+
+    const reconnect = () => {
+      source?.close();
+      source = null;
+      setConnected(false);
+      if (!closed) {
+        retry = setTimeout(connect, delay);
+        delay = Math.min(delay * 2, MAX_RECONNECT_DELAY);
+      }
+    };
+
+    const connect = async () => {
+      try {
+        const { data } = await axiosInstance.post('/api/lobby/events/ticket/');
+        if (closed) return;
+        const url = `${axiosInstance.defaults.baseURL}/api/lobby/events/?ticket=${encodeURIComponent(data.ticket)}`;
+        source = new EventSource(url);
+        source.onopen = () => {
+          delay = RECONNECT_DELAY;
+          setConnected(true);
+        };
+        // The ticket in the URL expires after a minute, so never let EventSource retry it
+        source.onerror = reconnect;
+        source.addEventListener('ticket_expired', reconnect);
+        EVENT_TYPES.forEach((type) => {
+          source?.addEventListener(type, () => onEventRef.current(type));
+        });
+      } catch (error) {
+        reconnect();
+      }
+    };
+
+    connect();
+    return () => {
+      closed = true;
+      if (retry) clearTimeout(retry);
+      source?.close();
+    };
+  }, []);
+
+  return connected;
+};
@@ -19,16 +19,8 @@ const BulkActions: React.FC<BulkActionsProps> = ({
   const [selectedVisitors, setSelectedVisitors] = useState<Set<number>>(new Set());
   const [showBulkActions, setShowBulkActions] = useState(false);
 
-  const eligibleForNoShow = visitors.filter(v => {
-    const nowUTC = new Date();
-    const scheduledUTC = new Date(v.scheduled_time);
-    
-    // Add a small buffer to prevent false positives due to timezone differences
-    const bufferMinutes = 1; // 1 minute buffer
-    const timeDiff = nowUTC.getTime() - scheduledUTC.getTime();
-    const minutesLate = timeDiff / (1000 * 60);
-    return !v.is_checked_in && v.status === 'approved' && minutesLate >= (15 + bufferMinutes);
-  });
+  // The server sends when each visit may be marked as a no-show
+  const eligibleForNoShow = visitors.filter(v => v.mark_no_show_after && new Date(v.mark_no_show_after) <= new Date());
 
   const eligibleForCheckIn = visitors.filter(v => !v.is_checked_in && v.status === 'approved');
   const eligibleForCheckOut = visitors.filter(v => v.is_checked_in && !v.is_checked_out);
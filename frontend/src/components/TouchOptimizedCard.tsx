@@ -112,18 +112,9 @@ const TouchOptimizedCard: React.FC<TouchOptimizedCardProps> = ({
     }
   };
 
+  // The server sends when the visit may be marked as a no-show
   const shouldShowNoShowButton = () => {
-    const nowUTC = new Date();
-    const scheduledUTC = new Date(visitor.scheduled_time);
-    
-    // Add a small buffer to prevent false positives due to timezone differences
-    const bufferMinutes = 1; // 1 minute buffer
-    const timeDiff = nowUTC.getTime() - scheduledUTC.getTime();
-    const minutesLate = timeDiff / (1000 * 60);
-
-    return !visitor.is_checked_in &&
-           visitor.status === 'approved' &&
-           minutesLate >= (15 + bufferMinutes);
+    return !!visitor.mark_no_show_after && new Date(visitor.mark_no_show_after) <= new Date();
   };
 
   return (
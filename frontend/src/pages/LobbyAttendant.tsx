@@ -1,6 +1,7 @@
 import React, { useState, useEffect } from 'react';
 import { useQuery, useQueryClient } from '@tanstack/react-query';
 import axiosInstance from '../api/axiosInstance';
+import { useLobbyEvents } from '../api/lobbyEvents';
 import { useNavigate } from 'react-router-dom';
 import { useRefresh } from '../components/RefreshContext';
 import { useVisitors } from '../components/VisitorContext';
@@ -20,6 +21,8 @@ interface Visitor {
   is_checked_out: boolean;
   check_out_time?: string;
   status: string;
+  mark_no_show_after?: string | null;
+  no_show_at?: string | null;
   notes?: string;
   updated_at?: string;
 }
@@ -29,6 +32,12 @@ const LobbyAttendant: React.FC = () => {
   const { refreshDashboard } = useRefresh();
   const { setVisitors: setContextVisitors } = useVisitors();
   const queryClient = useQueryClient();
+
+  // Refetch on pushed changes; poll only while the event stream is down
+  const streaming = useLobbyEvents(() => {
+    queryClient.invalidateQueries({ queryKey: ['lobby-today-visitors'] });
+    queryClient.invalidateQueries({ queryKey: ['lobby-all-visits'] });
+  });
   
   // Pagination state
   const [page, setPage] = useState(1);
@@ -103,7 +112,7 @@ const LobbyAttendant: React.FC = () => {
   } = useQuery<Visitor[]>({
     queryKey: ['lobby-today-visitors'],
     queryFn: fetchTodayVisitors,
-    refetchInterval: 30000, // 30 seconds
+    refetchInterval: streaming ? false : 30000, // 30 seconds without the event stream
     refetchIntervalInBackground: true,
     staleTime: 30000, // Consider data fresh for 30 seconds
     gcTime: 5 * 60 * 1000, // Cache for 5 minutes
@@ -115,7 +124,7 @@ const LobbyAttendant: React.FC = () => {
   } = useQuery<Visitor[]>({
     queryKey: ['lobby-all-visits'],
     queryFn: fetchAllVisitsForNotifications,
-    refetchInterval: 30000, // 30 seconds
+    refetchInterval: streaming ? false : 30000, // 30 seconds without the event stream
     refetchIntervalInBackground: true,
     staleTime: 30000,
     gcTime: 5 * 60 * 1000,
@@ -231,20 +240,9 @@ const LobbyAttendant: React.FC = () => {
     }
   };
 
-  // Robust UTC logic for no show - improved with better timezone handling
+  // The server sends when the visit may be marked as a no-show
   const shouldShowNoShowButton = (visitor: Visitor) => {
-    const nowUTC = new Date();
-    const scheduledUTC = new Date(visitor.scheduled_time);
-    
-    // Add a small buffer to prevent false positives due to timezone differences
-    const bufferMinutes = 1; // 1 minute buffer
-    const timeDiff = nowUTC.getTime() - scheduledUTC.getTime();
-    const minutesLate = timeDiff / (1000 * 60);
-    
-    // Only show no-show button if visitor is 15+ minutes late and not checked in
-    return !visitor.is_checked_in && 
-           visitor.status === 'approved' && 
-           minutesLate >= (15 + bufferMinutes);
+    return !!visitor.mark_no_show_after && new Date(visitor.mark_no_show_after) <= new Date();
   };
 
   // Format date and time
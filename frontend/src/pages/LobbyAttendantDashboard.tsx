@@ -1,6 +1,7 @@
 import React, { useState, useEffect, useCallback } from 'react';
 import { Link, useNavigate } from 'react-router-dom';
 import axiosInstance from '../api/axiosInstance';
+import { useLobbyEvents } from '../api/lobbyEvents';
 import { useVisitors } from '../components/VisitorContext';
 import { useQuery, QueryFunction, useQueryClient } from '@tanstack/react-query';
 import { 
@@ -50,6 +51,8 @@ interface Visitor {
   is_checked_out: boolean;
   check_out_time?: string;
   status: string;
+  mark_no_show_after?: string | null;
+  no_show_at?: string | null;
   notes?: string;
   updated_at?: string;
 }
@@ -57,6 +60,11 @@ interface Visitor {
 const LobbyAttendantDashboard: React.FC = () => {
   const navigate = useNavigate();
   const queryClient = useQueryClient();
+
+  // Refetch on pushed changes; poll only while the event stream is down
+  const streaming = useLobbyEvents(() => {
+    queryClient.invalidateQueries({ queryKey: ['lobby-visitors'] });
+  });
   const [markingNoShow, setMarkingNoShow] = useState<number | null>(null);
   const [searchTerm, setSearchTerm] = useState('');
   const [statusFilter, setStatusFilter] = useState<string>('all');
@@ -126,7 +134,7 @@ const LobbyAttendantDashboard: React.FC = () => {
   } = useQuery<Visitor[]>({
     queryKey: ['lobby-visitors', startDateStr, endDateStr],
     queryFn: fetchVisitorsForRange,
-    refetchInterval: 60000, // Increased to 60 seconds to reduce frequency
+    refetchInterval: streaming ? false : 60000, // 60 seconds without the event stream
     refetchIntervalInBackground: true,
     staleTime: 45000, // Consider data fresh for 45 seconds
     gcTime: 5 * 60 * 1000, // Cache for 5 minutes (renamed from cacheTime in React Query v4+)
@@ -203,19 +211,18 @@ const LobbyAttendantDashboard: React.FC = () => {
         throw new Error('No authentication token found. Please login.');
       }
 
-      // Process each visitor
-      for (const visitId of visitIds) {
-        await axiosInstance.post(`/api/visit-requests/${visitId}/no-show/`, {}, {
-          headers: {
-            'Authorization': `Bearer ${token}`,
-            'Content-Type': 'application/json',
-          },
-        });
-      }
+      // One request for the whole selection; results are reported per visit
+      const response = await axiosInstance.post('/api/visit-requests/bulk/no-show/', { visit_ids: visitIds }, {
+        headers: {
+          'Authorization': `Bearer ${token}`,
+          'Content-Type': 'application/json',
+        },
+      });
+      const updated = response.data.updated;
 
       // Invalidate and refetch visitors data
       await queryClient.invalidateQueries({ queryKey: ['lobby-visitors'] });
-      alert(`Successfully marked ${visitIds.length} visitors as no show!`);
+      alert(`Marked ${updated} of ${visitIds.length} visitors as no show.`);
     } catch (err: any) {
       console.error('Error in bulk no-show operation:', err);
       alert(err.response?.data?.error || 'Failed to mark visitors as no show');
@@ -231,19 +238,18 @@ const LobbyAttendantDashboard: React.FC = () => {
         throw new Error('No authentication token found. Please login.');
       }
 
-      // Process each visitor
-      for (const visitId of visitIds) {
-        await axiosInstance.post(`/api/visit-requests/${visitId}/check-in/`, {}, {
-          headers: {
-            'Authorization': `Bearer ${token}`,
-            'Content-Type': 'application/json',
-          },
-        });
-      }
+      // One request for the whole selection; results are reported per visit
+      const response = await axiosInstance.post('/api/lobby/bulk/checkin/', { visit_ids: visitIds }, {
+        headers: {
+          'Authorization': `Bearer ${token}`,
+          'Content-Type': 'application/json',
+        },
+      });
+      const updated = response.data.updated;
 
       // Invalidate and refetch visitors data
       await queryClient.invalidateQueries({ queryKey: ['lobby-visitors'] });
-      alert(`Successfully checked in ${visitIds.length} visitors!`);
+      alert(`Checked in ${updated} of ${visitIds.length} visitors.`);
     } catch (err: any) {
       console.error('Error in bulk check-in operation:', err);
       alert(err.response?.data?.error || 'Failed to check in visitors');
@@ -257,19 +263,18 @@ const LobbyAttendantDashboard: React.FC = () => {
         throw new Error('No authentication token found. Please login.');
       }
 
-      // Process each visitor
-      for (const visitId of visitIds) {
-        await axiosInstance.post(`/api/visit-requests/${visitId}/check-out/`, {}, {
-          headers: {
-            'Authorization': `Bearer ${token}`,
-            'Content-Type': 'application/json',
-          },
-        });
-      }
+      // One request for the whole selection; results are reported per visit
+      const response = await axiosInstance.post('/api/lobby/bulk/checkout/', { visit_ids: visitIds }, {
+        headers: {
+          'Authorization': `Bearer ${token}`,
+          'Content-Type': 'application/json',
+        },
+      });
+      const updated = response.data.updated;
 
       // Invalidate and refetch visitors data
       await queryClient.invalidateQueries({ queryKey: ['lobby-visitors'] });
-      alert(`Successfully checked out ${visitIds.length} visitors!`);
+      alert(`Checked out ${updated} of ${visitIds.length} visitors.`);
     } catch (err: any) {
       console.error('Error in bulk check-out operation:', err);
       alert(err.response?.data?.error || 'Failed to check out visitors');
@@ -165,6 +165,23 @@ if PRODUCTION_DOMAINS:
 # Frontend URL for invitation links
 FRONTEND_URL = os.getenv('FRONTEND_URL', 'http://localhost:3000')
 
+# Directory where asynchronous report exports are written
+REPORT_EXPORT_DIR = Path(os.getenv('REPORT_EXPORT_DIR', BASE_DIR / 'exports'))
+
+# Minutes after its scheduled time an approved, never checked-in visit is
+# marked as a no-show by the mark_no_shows sweeper
+NO_SHOW_GRACE_MINUTES = int(os.getenv('NO_SHOW_GRACE_MINUTES', '30'))
+
+# Minutes after its scheduled time the lobby may mark an approved, never
+# checked-in visit (walk-ins included) as a no-show by hand
+MANUAL_NO_SHOW_MINUTES = int(os.getenv('MANUAL_NO_SHOW_MINUTES', '15'))
+
+# Fan-out of lobby push events between workers. LocalFanout only reaches
+# clients connected to the same process; use core.broadcast.RedisFanout
+# (requires the redis package) when running several ASGI workers.
+LOBBY_BROADCAST_BACKEND = os.getenv('LOBBY_BROADCAST_BACKEND', 'core.broadcast.LocalFanout')
+LOBBY_BROADCAST_REDIS_URL = os.getenv('LOBBY_BROADCAST_REDIS_URL', '')
+
 # Allow all origins in development (remove in production)
 if DEBUG:
     CORS_ALLOW_ALL_ORIGINS = True
@@ -173,6 +190,10 @@ else:
 
 CORS_ALLOW_CREDENTIALS = True
 
+# Let the frontend read the delta-sync watermark and conditional GET
+# validators of list responses
+CORS_EXPOSE_HEADERS = ['X-Watermark', 'ETag', 'Last-Modified']
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -317,6 +338,9 @@ SIMPLE_JWT = {
     'AUTH_TOKEN_CLASSES': ('rest_framework_simplejwt.tokens.AccessToken',),
     'TOKEN_TYPE_CLAIM': 'token_type',
 
+    # Re-issue the roles claim on refresh (see core.tokens)
+    'TOKEN_REFRESH_SERIALIZER': 'core.tokens.RoleTokenRefreshSerializer',
+
     'JTI_CLAIM': 'jti',
     
     # Additional security settings